@@ -238,8 +238,8 @@ class CombinedTargetHeadFromRnn(torch.nn.Module):
 
     def forward(self, x):
         device = x[0].device if isinstance(x, tuple) else x.device
-        sum_logs2 = torch.tensor(x[2][:, None], device=device) if isinstance(x, tuple) and len(x) > 2 else 0
-        x, sum_logs1 = (x[0], torch.tensor(x[1][:, None], device=device)) if isinstance(x, tuple) else (x, 0)  # negative sum logs if len(x) == 3
+        sum_logs2 = torch.as_tensor(x[2], device=device)[:, None] if isinstance(x, tuple) and len(x) > 2 else 0
+        x, sum_logs1 = (x[0], torch.as_tensor(x[1], device=device)[:, None]) if isinstance(x, tuple) else (x, 0)  # negative sum logs if len(x) == 3
         if not self.neg and self.pos:
             sum_logs1, sum_logs2 = sum_logs2, sum_logs1
 
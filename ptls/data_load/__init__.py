@@ -554,6 +554,11 @@ class IterableChain:
     def __init__(self, *i_filters):
         self.i_filters = i_filters
 
+    def set_epoch(self, epoch: int):
+        for f in self.i_filters:
+            if callable(getattr(f, 'set_epoch', None)):
+                f.set_epoch(epoch)
+
     def __call__(self, seq):
         for f in self.i_filters:
             seq = f(seq)
@@ -0,0 +1,166 @@
+import warnings
+from typing import Dict
+
+import numpy as np
+import pyarrow as pa
+import torch
+
+from ptls.data_load.padded_batch import PaddedBatch
+
+
+def _arrow_to_numpy(arr: pa.Array) -> np.ndarray:
+    """Zero-copy (when possible) conversion of arrow array to numpy"""
+    return arr.to_numpy(zero_copy_only=False)
+
+
+def _numpy_to_torch(a: np.ndarray):
+    if a.dtype.kind not in ('i', 'u', 'f', 'b'):
+        return a
+    if a.dtype == np.uint16 or a.dtype == np.uint32:
+        a = a.astype(np.int64)
+    with warnings.catch_warnings():
+        # arrow buffers are read-only. Tensors are used as read-only views and are copied during collation
+        warnings.simplefilter('ignore', UserWarning)
+        return torch.from_numpy(a)
+
+
+def trans_time_features(date_batch: np.ndarray) -> Dict[str, np.ndarray]:
+    """Derived time features from `trans_time` column. Vectorized over flat array of timestamps.
+
+    Synchronized with `ptls.data_load.datasets.parquet_dataset.read_pyarrow_file`
+    """
+    date_batch = date_batch.astype('datetime64[s]')
+    date_day = date_batch.astype('datetime64[D]')
+    return {
+        'local_day': (date_day - date_batch).astype('datetime64[M]').astype(np.int16) + 1,
+        'local_month': date_batch.astype('datetime64[M]').astype(np.int16) / 12 + 1,
+        'local_weekday': (date_day.astype(np.int16) + 3) / 7,
+        'hour': ((date_batch - date_day).astype(np.int32) // 3600 + 1).astype(np.int16),
+    }
+
+
+class ColumnarBatch:
+    """Batch of clients in columnar format. This is a view over pyarrow `RecordBatch` buffers.
+
+    Each sequential feature is stored as a pair of flat `values` tensor with all events of all clients
+    and `offsets` tensor with shape (B + 1,). Events of client `i` are `values[offsets[i]:offsets[i + 1]]`.
+    Tensors are zero-copy views over arrow buffers when arrow column has no nulls.
+    Scalar features are stored as tensors (numeric types) or numpy arrays (other types) with shape (B,).
+
+    No per-client dict is created. Use `to_padded_batch` to get `PaddedBatch` directly.
+
+    Parameters:
+        seq_values:
+            dict with flat values of sequential features
+        seq_offsets:
+            dict with offsets of sequential features
+        scalars:
+            dict with scalar features
+
+    Examples:
+        >>> import pyarrow as pa
+        >>> rb = pa.RecordBatch.from_pydict({
+        >>>     'id': [1, 2],
+        >>>     'mcc': [[1, 2, 3], [4]],
+        >>> })
+        >>> pb = ColumnarBatch.from_record_batch(rb).to_padded_batch()
+        >>> torch.testing.assert_close(pb.payload['mcc'], torch.tensor([[1, 2, 3], [4, 0, 0]]))
+
+    """
+    def __init__(self,
+                 seq_values: Dict[str, torch.Tensor],
+                 seq_offsets: Dict[str, torch.Tensor],
+                 scalars: Dict[str, object],
+                 ):
+        self.seq_values = seq_values
+        self.seq_offsets = seq_offsets
+        self.scalars = scalars
+
+    @classmethod
+    def from_record_batch(cls, rb: pa.RecordBatch):
+        seq_values = {}
+        seq_offsets = {}
+        scalars = {}
+        for name, col in zip(rb.schema.names, rb.columns):
+            if pa.types.is_list(col.type) or pa.types.is_large_list(col.type):
+                offsets = _numpy_to_torch(_arrow_to_numpy(col.offsets)).long()
+                values = _arrow_to_numpy(col.values)
+                if name == 'trans_time':
+                    for k, v in trans_time_features(values).items():
+                        seq_values[k] = _numpy_to_torch(v)
+                        seq_offsets[k] = offsets
+                    continue
+                seq_values[name] = _numpy_to_torch(values)
+                seq_offsets[name] = offsets
+            else:
+                scalars[name] = _numpy_to_torch(_arrow_to_numpy(col))
+        return cls(seq_values, seq_offsets, scalars)
+
+    def __len__(self):
+        offsets = next(iter(self.seq_offsets.values()), None)
+        if offsets is not None:
+            return len(offsets) - 1
+        return len(next(iter(self.scalars.values())))
+
+    @property
+    def seq_lens(self):
+        """Lengths of sequences. Taken from `event_time` or from first sequential feature.
+        Synchronized with `ptls.data_load.feature_dict.FeatureDict.get_seq_len`
+        """
+        if 'event_time' in self.seq_offsets:
+            offsets = self.seq_offsets['event_time']
+        else:
+            offsets = next(iter(self.seq_offsets.values()))
+        return offsets[1:] - offsets[:-1]
+
+    def slice(self, start: int, stop: int):
+        """Returns a view with clients from `start` to `stop`. Flat values are not copied
+        """
+        return ColumnarBatch(
+            seq_values=self.seq_values,
+            seq_offsets={k: v[start:stop + 1] for k, v in self.seq_offsets.items()},
+            scalars={k: v[start:stop] for k, v in self.scalars.items()},
+        )
+
+    def iter_slices(self, batch_size: int):
+        for start in range(0, len(self), batch_size):
+            yield self.slice(start, min(start + batch_size, len(self)))
+
+    @staticmethod
+    def _pad(values, offsets):
+        lengths = offsets[1:] - offsets[:-1]
+        B = len(lengths)
+        T = int(lengths.max()) if B > 0 else 0
+        flat = values[int(offsets[0]):int(offsets[-1])]
+        if not isinstance(flat, torch.Tensor):
+            # non-numeric arrays are kept as list of arrays like `collate_feature_dict` does
+            return [values[s:e] for s, e in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+        mask = torch.arange(T).unsqueeze(0) < lengths.unsqueeze(1)
+        padded = flat.new_zeros((B, T))
+        padded[mask] = flat
+        return padded
+
+    def to_padded_batch(self):
+        """Collate columnar batch into `PaddedBatch`. One vectorized scatter per feature.
+        Output is the same as `ptls.data_load.utils.collate_feature_dict` for the same clients.
+        """
+        payload = {k: self._pad(v, self.seq_offsets[k]) for k, v in self.seq_values.items()}
+        for k, v in self.scalars.items():
+            if isinstance(v, torch.Tensor):
+                if v.dtype.is_floating_point:
+                    v = v.float()
+                elif v.dtype != torch.bool:
+                    v = v.long()
+            payload[k] = v
+        return PaddedBatch(payload, self.seq_lens)
+
+
+def collate_columnar_batch(batch):
+    """Collate function for `ParquetDataset(columnar=True)`.
+    Use with `DataLoader(batch_size=None)`, batching is made by dataset.
+    """
+    if isinstance(batch, list):
+        if len(batch) != 1:
+            raise ValueError('Columnar batches are already batched. Use `DataLoader(batch_size=None)`')
+        batch = batch[0]
+    return batch.to_padded_batch()
@@ -21,6 +21,7 @@ from ptls.data_load.iterable_processing import IterableShuffle, TargetJoin, Targ
 from ptls.data_load.iterable_processing import FeatureFilter, FeatureTypeCast
 from ptls.data_load.iterable_processing import SeqLenFilter, IdFilter
 from ptls.data_load.utils import collate_target
+from ptls.data_load.length_bucket_sampler import loader_batching_kwargs
 
 logger = logging.getLogger(__name__)
 
@@ -228,10 +229,14 @@ class ClsDataModuleTrain(pl.LightningDataModule):
         return DataLoader(
             dataset=self.train_dataset,
             collate_fn=padded_collate_distribution_target if self.distribution_target_task else padded_collate,
-            shuffle=False if self._type == 'iterable' else True,
             num_workers=self.train_conf.num_workers,
-            batch_size=self.train_conf.batch_size,
-            drop_last=self.train_conf.get('drop_last', False)
+            **loader_batching_kwargs(
+                self.train_dataset,
+                batch_size=self.train_conf.batch_size,
+                max_tokens=self.train_conf.get('max_tokens', None),
+                shuffle=False if self._type == 'iterable' else True,
+                drop_last=self.train_conf.get('drop_last', False),
+            ),
         )
 
     def setup_map(self):
@@ -25,6 +25,7 @@ from ptls.data_load.iterable_processing.filter_collection import CategorySizeCli
 from ptls.data_load.iterable_processing.iterable_shuffle import IterableShuffle
 from ptls.data_load.list_splitter import ListSplitter
 from ptls.data_load.partitioned_dataset import PartitionedDataset, PartitionedDataFiles
+from ptls.data_load.length_bucket_sampler import loader_batching_kwargs
 
 logger = logging.getLogger(__name__)
 
@@ -168,9 +169,13 @@ class CpcDataModuleTrain(pl.LightningDataModule):
         return DataLoader(
             dataset=self.train_dataset,
             collate_fn=cpc_collate_fn,
-            shuffle=False if self._type == 'iterable' else True,
             num_workers=self.train_conf.num_workers,
-            batch_size=self.train_conf.batch_size,
+            **loader_batching_kwargs(
+                self.train_dataset,
+                batch_size=self.train_conf.batch_size,
+                max_tokens=self.train_conf.get('max_tokens', None),
+                shuffle=False if self._type == 'iterable' else True,
+            ),
         )
 
     def val_dataloader(self) -> DataLoader:
@@ -27,6 +27,7 @@ from torch.utils.data import DataLoader
 
 from ptls.data_load.padded_batch import PaddedBatch
 from ptls.data_load.data_module.coles_data_module import ColesDataModuleTrain
+from ptls.data_load.length_bucket_sampler import loader_batching_kwargs
 
 import torch.multiprocessing
 torch.multiprocessing.set_sharing_strategy('file_system')
@@ -80,9 +81,13 @@ class CpcV2DataModuleTrain(ColesDataModuleTrain):
         return DataLoader(
             dataset=self.train_dataset,
             collate_fn=collate_fn,
-            shuffle=False if self._type == 'iterable' else True,
             num_workers=self.train_conf.num_workers,
-            batch_size=self.train_conf.batch_size,
+            **loader_batching_kwargs(
+                self.train_dataset,
+                batch_size=self.train_conf.batch_size,
+                max_tokens=self.train_conf.get('max_tokens', None),
+                shuffle=False if self._type == 'iterable' else True,
+            ),
         )
 
     def val_dataloader(self) -> DataLoader:
@@ -10,6 +10,7 @@ import glob
 
 from ptls.data_load import padded_collate_emb_valid
 from ptls.data_load.datasets.parquet_dataset import ParquetFiles, ParquetDataset
+from ptls.data_load.length_bucket_sampler import loader_batching_kwargs
 
 
 logger = logging.getLogger(__name__)
@@ -95,10 +96,14 @@ class EmbValidDataModule(pl.LightningDataModule):
         return DataLoader(
             dataset=self.train_dataset,
             collate_fn=padded_collate_emb_valid,
-            shuffle=False if self._type == 'iterable' else True,
             num_workers=self.train_conf.num_workers,
-            batch_size=self.train_conf.batch_size,
-            drop_last=self.train_conf.get('drop_last', False)
+            **loader_batching_kwargs(
+                self.train_dataset,
+                batch_size=self.train_conf.batch_size,
+                max_tokens=self.train_conf.get('max_tokens', None),
+                shuffle=False if self._type == 'iterable' else True,
+                drop_last=self.train_conf.get('drop_last', False),
+            ),
         )
 
     def test_dataloader(self) -> DataLoader:
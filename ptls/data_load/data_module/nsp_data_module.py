@@ -33,6 +33,7 @@ from ptls.data_load.iterable_processing import CategorySizeClip, SeqLenFilter
 from ptls.data_load.iterable_processing.iterable_shuffle import IterableShuffle
 from ptls.data_load.list_splitter import ListSplitter
 from ptls.data_load.partitioned_dataset import PartitionedDataset, PartitionedDataFiles
+from ptls.data_load.length_bucket_sampler import loader_batching_kwargs
 from ptls.frames.coles import split_strategy
 from ptls.metric_learn.dataset import nested_list_to_flat_with_collate
 from ptls.metric_learn.dataset.splitting_dataset import IterableSplittingDataset, MapSplittingDataset
@@ -203,9 +204,13 @@ class NspDataModuleTrain(pl.LightningDataModule):
         return DataLoader(
             dataset=self.train_dataset,
             collate_fn=nested_list_to_flat_with_collate(collate_nsp_pairs),
-            shuffle=False if self._type == 'iterable' else True,
             num_workers=self.train_conf.num_workers,
-            batch_size=self.train_conf.batch_size,
+            **loader_batching_kwargs(
+                self.train_dataset,
+                batch_size=self.train_conf.batch_size,
+                max_tokens=self.train_conf.get('max_tokens', None),
+                shuffle=False if self._type == 'iterable' else True,
+            ),
         )
 
     def val_dataloader(self):
@@ -11,6 +11,7 @@ from ptls.data_load.iterable_processing import FeatureFilter
 from ptls.data_load.iterable_processing import SeqLenFilter
 from ptls.data_load.iterable_processing.target_move import TargetMove
 from ptls.data_load.iterable_processing.to_torch_tensor import ToTorch
+from ptls.data_load.length_bucket_sampler import loader_batching_kwargs
 
 
 
@@ -24,6 +25,8 @@ class SeqToTargetDatamodule(pl.LightningDataModule):
       valid_size (float, optional): The proportion of the dataset to include in the validation split. Should be between 0.0 and 1.0. Defaults to 0.05.
       train_num_workers (int, optional): The number of workers for the training DataLoader. 0 means single-process loader. Defaults to 0.
       train_batch_size (int, optional): The number of samples in each batch during training. Defaults to 256.
+      train_max_tokens (int, optional): Token budget for padded train batch. When set, samples are grouped by length
+         with `LengthBucketBatchSampler` and `train_batch_size` limits number of samples in batch. Defaults to None.
       valid_num_workers (int, optional): The number of workers for the validation DataLoader. 0 means single-process loader. Defaults to 0.
       valid_batch_size (int, optional): The number of samples in each batch during validation. Defaults to 256.
       target_col (str, optional): The name of the target column. Defaults to 'target'.
@@ -37,6 +40,7 @@ class SeqToTargetDatamodule(pl.LightningDataModule):
                valid_size: float = 0.05,
                train_num_workers: int = 0,
                train_batch_size: int = 256,
+               train_max_tokens: int = None,
                valid_num_workers: int = 0,
                valid_batch_size: int = 256,
                target_col: str = 'target',
@@ -52,6 +56,7 @@ class SeqToTargetDatamodule(pl.LightningDataModule):
       self.min_seq_len = min_seq_len
       self.train_num_workers = train_num_workers
       self.train_batch_size = train_batch_size
+      self.train_max_tokens = train_max_tokens
       self.valid_num_workers = valid_num_workers
       self.valid_batch_size = valid_batch_size
       self.target_col = target_col
@@ -72,7 +77,11 @@ class SeqToTargetDatamodule(pl.LightningDataModule):
          dataset=self.dataset_train,
          collate_fn=padded_collate,
          num_workers=self.train_num_workers,
-         batch_size=self.train_batch_size
+         **loader_batching_kwargs(
+            self.dataset_train,
+            batch_size=self.train_batch_size,
+            max_tokens=self.train_max_tokens,
+         ),
       )
 
    def val_dataloader(self):
@@ -2,6 +2,9 @@ from .augmentation_dataset import AugmentationDataset, AugmentationIterableDatas
 from .persist_dataset import PersistDataset
 from .duckdb_dataset import DuckDbDataset
 from .memory_dataset import MemoryMapDataset, MemoryIterableDataset
+from .flat_array_dataset import FlatArrayDataset, FlatArrayWriter, save_flat_array_dataset, \
+    parquet_to_flat_array_dataset
 from .parquet_dataset import ParquetFiles, ParquetDataset, DistributedParquetDataset
 from .parquet_file_scan import parquet_file_scan
 from .dataloaders import inference_data_loader
+from .cached_dataset import CachedIterableDataset
@@ -0,0 +1,212 @@
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import os
+import shutil
+import uuid
+from typing import List
+
+import numpy as np
+import pandas as pd
+import torch
+import torch.distributed as dist
+
+from ptls.data_load.datasets.flat_array_dataset import FlatArrayDataset, FlatArrayWriter, SCHEMA_FILE
+
+logger = logging.getLogger(__name__)
+
+RECORD_TYPES_FILE = 'record_types.json'
+
+
+def _runtime_attributes(obj) -> set:
+    """Names from `runtime_attributes` of object class and its parents"""
+    return {name for cls in type(obj).__mro__ for name in cls.__dict__.get('runtime_attributes', ())}
+
+
+def _dir_fingerprint(path: str) -> str:
+    files = []
+    for root, _, names in os.walk(path):
+        for name in names:
+            file_name = os.path.join(root, name)
+            stat = os.stat(file_name)
+            files.append(f'{os.path.relpath(file_name, path)!r}: {stat.st_size}, {stat.st_mtime_ns}')
+    return f'dir({path!r}, [{", ".join(sorted(files))}])'
+
+
+def fingerprint(obj, _depth=0) -> str:
+    """Text representation of dataset and filters configuration for cache key.
+
+    Objects are described by class name and attributes. Attributes which are changed during iteration
+    are listed by class in `runtime_attributes` tuple, they are skipped.
+    Existing file names are extended with file size and modification time, directories with
+    the same for all files inside, so cache is invalidated when files are changed.
+    """
+    if _depth > 20:
+        raise AttributeError(f'Too deep object structure for fingerprint: {type(obj)}')
+    d = _depth + 1
+    if obj is None or isinstance(obj, (bool, int, float, np.number)):
+        return repr(obj)
+    if isinstance(obj, str):
+        if os.path.isfile(obj):
+            stat = os.stat(obj)
+            return f'file({obj!r}, {stat.st_size}, {stat.st_mtime_ns})'
+        if os.path.isdir(obj):
+            return _dir_fingerprint(obj)
+        return repr(obj)
+    if isinstance(obj, (list, tuple)):
+        return '[' + ', '.join(fingerprint(v, d) for v in obj) + ']'
+    if isinstance(obj, (set, frozenset)):
+        return '{' + ', '.join(sorted(fingerprint(v, d) for v in obj)) + '}'
+    if isinstance(obj, dict):
+        return '{' + ', '.join(sorted(f'{k!r}: {fingerprint(v, d)}' for k, v in obj.items())) + '}'
+    if isinstance(obj, np.ndarray):
+        return f'ndarray({obj.dtype}, {obj.shape}, {hashlib.sha1(np.ascontiguousarray(obj).tobytes()).hexdigest()})'
+    if isinstance(obj, torch.Tensor):
+        return f'tensor({fingerprint(obj.detach().cpu().numpy(), d)})'
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return f'pandas({int(pd.util.hash_pandas_object(obj).sum())})'
+    if isinstance(obj, functools.partial):
+        return f'partial({fingerprint(obj.func, d)}, {fingerprint(obj.args, d)}, {fingerprint(obj.keywords, d)})'
+    if isinstance(obj, type) or inspect.isroutine(obj):
+        return f'{getattr(obj, "__module__", None)}.{getattr(obj, "__qualname__", repr(obj))}'
+    if isinstance(obj, torch.nn.Module):
+        # weights are changed during training, only architecture is used
+        return f'module({obj!r})'
+    if hasattr(obj, '__dict__'):
+        runtime_attributes = _runtime_attributes(obj)
+        state = {k: v for k, v in vars(obj).items() if k not in runtime_attributes}
+    else:
+        state = {}
+    return f'{type(obj).__module__}.{type(obj).__qualname__}({fingerprint(state, d)})'
+
+
+def _get_value_type(v) -> str:
+    """'tensor', 'ndarray', numpy dtype for numpy scalar or 'python'"""
+    if isinstance(v, torch.Tensor):
+        return 'tensor'
+    if isinstance(v, np.ndarray):
+        return 'ndarray'
+    if isinstance(v, np.generic):
+        return v.dtype.str
+    return 'python'
+
+
+def _restore_value_type(v, value_type: str):
+    """Convert `FlatArrayDataset` value to type from `_get_value_type`. Sequences are copied from memory map"""
+    if value_type == 'tensor':
+        return v.clone()
+    if value_type == 'ndarray':
+        return v.numpy().copy()
+    if value_type == 'python':
+        return v
+    return np.dtype(value_type).type(v)
+
+
+def _get_partition():
+    """Partition number and count for current DataLoader worker and DDP rank"""
+    worker_info = torch.utils.data.get_worker_info()
+    worker_id, num_workers = (0, 1) if worker_info is None else (worker_info.id, worker_info.num_workers)
+    if dist.is_available() and dist.is_initialized():
+        rank, world_size = dist.get_rank(), dist.get_world_size()
+    else:
+        rank, world_size = 0, 1
+    return rank * num_workers + worker_id, world_size * num_workers
+
+
+class CachedIterableDataset(torch.utils.data.IterableDataset):
+    """Cache for output of iterable dataset with filters.
+
+    First pass reads `dataset`, applies `i_filters` and writes records in `FlatArrayDataset` format
+    while they are yielded. Each DataLoader worker and DDP rank writes its own shard.
+    Next passes read records from shard of the same worker, source dataset isn't used.
+
+    Cache directory is `cache_path/{cache_key}`. `cache_key` is a hash of `fingerprint` of dataset and filters:
+    class names, parameters and size with modification time of input files. Cache is invalidated
+    when any of them is changed. Shards depend on number of workers, so changing `num_workers`
+    creates new shards in the same directory.
+
+    Records should be feature dicts with numeric sequential features. Shard is saved only when
+    source is read to the end. Records from cache have the same order and value types as in the first pass,
+    so put random augmentations and `IterableShuffle` after cache.
+
+    Parameters
+        dataset:
+            iterable dataset, e.g. `ParquetDataset` with `i_filters`
+        cache_path:
+            directory for cache
+        i_filters:
+            extra filters which are applied to dataset output before caching
+        batch_size:
+            number of records which are written together
+
+    Examples:
+        >>> dataset = CachedIterableDataset(ParquetDataset(files, i_filters=[SeqLenFilter(min_seq_len=10)]), 'cache/')
+        >>> dataset = AugmentationIterableDataset(dataset, ...)
+    """
+    def __init__(self, dataset, cache_path: str, i_filters: List = None, batch_size: int = 1000):
+        self.dataset = dataset
+        self.cache_path = cache_path
+        self.i_filters = i_filters
+        self.batch_size = batch_size
+        self.cache_key = hashlib.sha1(fingerprint([dataset, i_filters]).encode('utf-8')).hexdigest()[:20]
+
+    def get_shard_path(self, partition: int, num_partitions: int):
+        return os.path.join(self.cache_path, self.cache_key, f'part-{partition:05d}-of-{num_partitions:05d}')
+
+    def __iter__(self):
+        shard_path = self.get_shard_path(*_get_partition())
+        if os.path.isfile(os.path.join(shard_path, SCHEMA_FILE)):
+            return self._iter_cache(shard_path)
+        return self._iter_write(shard_path)
+
+    @staticmethod
+    def _iter_cache(shard_path):
+        logger.debug(f'Read cache from "{shard_path}"')
+        data = FlatArrayDataset(shard_path)
+        with open(os.path.join(shard_path, RECORD_TYPES_FILE), 'r') as f:
+            value_types = json.load(f)
+        for i in range(len(data)):
+            yield {k: _restore_value_type(v, value_types[k]) for k, v in data[i].items()}
+
+    def _iter_source(self):
+        gen = iter(self.dataset)
+        for f in self.i_filters or []:
+            gen = f(gen)
+        return gen
+
+    def _iter_write(self, shard_path):
+        logger.debug(f'Write cache to "{shard_path}"')
+        tmp_path = f'{shard_path}.tmp-{uuid.uuid4().hex}'
+        writer = FlatArrayWriter(tmp_path)
+        buffer = []
+        value_types = {}
+        try:
+            # records are written before they are yielded, so changes in next steps don't affect cache
+            for rec in self._iter_source():
+                if not isinstance(rec, dict):
+                    raise TypeError(f'Only feature dicts can be cached, found {type(rec)}')
+                if writer.n_records == 0 and len(buffer) == 0:
+                    value_types = {k: _get_value_type(v) for k, v in rec.items()}
+                buffer.append(rec)
+                if len(buffer) >= self.batch_size:
+                    writer.write_records(buffer, self.batch_size)
+                    yield from buffer
+                    buffer = []
+            writer.write_records(buffer, self.batch_size)
+            writer.close()
+            with open(os.path.join(tmp_path, RECORD_TYPES_FILE), 'w') as f:
+                json.dump(value_types, f, indent=2)
+            try:
+                os.rename(tmp_path, shard_path)
+            except OSError:
+                # the same shard was written by other process
+                logger.debug(f'Cache "{shard_path}" already exists')
+            else:
+                logger.info(f'Saved cache with {writer.n_records} records to "{shard_path}"')
+            yield from buffer
+        finally:
+            # iteration was interrupted, partial shard is removed
+            if os.path.exists(tmp_path):
+                shutil.rmtree(tmp_path, ignore_errors=True)
@@ -1,71 +1,147 @@
+import os
 from typing import Iterable, List
 
 import duckdb
+import numpy as np
+import pyarrow as pa
 import torch
+import torch.distributed as dist
 
 from ptls.data_load import IterableChain
 
 
 class DuckDbDataset(torch.utils.data.IterableDataset):
+    """Iterable dataset which groups events into client sequences with DuckDB query.
+
+    Clients are split between DataLoader workers and DDP ranks by id hash:
+    partition `k` of `N = world_size * num_workers` reads clients with `hash(col_id) % N = k`.
+    Default DuckDB connection (the one used by `duckdb.sql`) is used in main process, so tables, views and settings
+    registered on it are visible to the query. Each DataLoader worker opens its own connection, it's reused
+    between epochs with persistent workers. `data_read_func` should be readable from a new connection
+    (files, not in-memory tables) in this case.
+    Query results are fetched as Arrow record batches. Each list column of a batch is converted
+    into one flat tensor, client sequences are views over it.
+
+    Parameters
+        data_read_func:
+            DuckDB relation, table name or subquery like `read_parquet('data/*.parquet')`
+        col_id:
+            client id column
+        col_event_time:
+            event time column, events are sorted by it
+        col_event_fields:
+            event columns which are collected into sequences
+        i_filters:
+            iterable filters for post-processing
+        rows_per_batch:
+            number of clients in one fetched record batch
+        threads:
+            DuckDB threads per worker connection. Default DuckDB value is used when None.
+            Set it to `cpu_count // num_workers` to avoid oversubscription with many workers.
+            Settings of default connection in main process aren't changed
+    """
+    runtime_attributes = ('_connection', '_connection_pid')
+
     def __init__(
             self,
             data_read_func: str,
             col_id: str,
             col_event_time: str,
             col_event_fields: List[str],
-            i_filters: List[Iterable] = None):
+            i_filters: List[Iterable] = None,
+            rows_per_batch: int = 1000,
+            threads: int = None):
         self.data_read_func = data_read_func
         self.col_id = col_id
         self.col_event_time = col_event_time
         self.col_event_fields = col_event_fields
+        self.rows_per_batch = rows_per_batch
+        self.threads = threads
 
         if i_filters:
             self.post_processing = IterableChain(*i_filters)
         else:
             self.post_processing = None
 
-    def __iter__(self):
+        self._connection = None
+        self._connection_pid = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_connection'] = None  # connections can't be shared between processes
+        state['_connection_pid'] = None
+        return state
+
+    def _get_connection(self):
+        """Default connection in main process, own connection in DataLoader worker"""
+        if torch.utils.data.get_worker_info() is None:
+            return duckdb.default_connection() if callable(duckdb.default_connection) else duckdb.default_connection
+        if self._connection is None or self._connection_pid != os.getpid():
+            self._connection = duckdb.connect()
+            self._connection_pid = os.getpid()
+            if self.threads is not None:
+                self._connection.execute(f'SET threads = {int(self.threads)}')
+        return self._connection
+
+    @staticmethod
+    def _get_partition():
+        """Partition number and count for current DataLoader worker and DDP rank"""
         worker_info = torch.utils.data.get_worker_info()
-        if worker_info is None:  # single-process data loading, return the full iterator
-            pass
-        else:  # in a worker process
-            raise NotImplementedError('multiple worker processes are not supported yet')
+        worker_id, num_workers = (0, 1) if worker_info is None else (worker_info.id, worker_info.num_workers)
+        if dist.is_available() and dist.is_initialized():
+            rank, world_size = dist.get_rank(), dist.get_world_size()
+        else:
+            rank, world_size = 0, 1
+        return rank * num_workers + worker_id, world_size * num_workers
 
-        gen = self.__execute_query()
+    def __iter__(self):
+        partition, num_partitions = self._get_partition()
+        gen = self.__execute_query(partition, num_partitions)
         if self.post_processing is not None:
             gen = self.post_processing(gen)
         return gen
 
-    def __execute_query(self):
+    def __execute_query(self, partition=0, num_partitions=1):
         event_fields = self.col_event_fields.copy() + [self.col_event_time]
-        
-        fields = ', '.join([f'LIST({field} ORDER BY {self.col_event_time})' for field in event_fields])
 
-        field_names = [self.col_id] + event_fields
-        
+        fields = ', '.join([f'LIST({field} ORDER BY {self.col_event_time}) AS "{field}"' for field in event_fields])
+
+        where = f'WHERE hash({self.col_id}) % {num_partitions} = {partition}' if num_partitions > 1 else ''
+
         query = f"""
-            SELECT {self.col_id}, {fields}
+            SELECT {self.col_id} AS "{self.col_id}", {fields}
             FROM {self.data_read_func}
+            {where}
             GROUP BY {self.col_id}
             ORDER BY {self.col_id}
             """
-    
-        rel = duckdb.sql(query)
 
-        while True:
-            recs = rel.fetchmany(1000)
-            if not recs:
-                break
-            for rec in recs:
-                feature_dict = dict(zip(field_names, rec))
-                for fld in event_fields:
-                    feature_dict[fld] = torch.tensor(feature_dict[fld])
+        relation = self._get_connection().sql(query)
+        if hasattr(relation, 'to_arrow_reader'):
+            reader = relation.to_arrow_reader(self.rows_per_batch)
+        else:
+            reader = relation.fetch_record_batch(self.rows_per_batch)
+        for rb in reader:
+            yield from self._record_batch_to_dicts(rb, event_fields)
+
+    def _record_batch_to_dicts(self, rb: pa.RecordBatch, event_fields):
+        ids = rb.column(self.col_id).to_pylist()
+        seq_features = {}
+        for fld in event_fields:
+            col = rb.column(fld)
+            values = torch.from_numpy(np.array(col.values.to_numpy(zero_copy_only=False)))
+            offsets = col.offsets.to_numpy().tolist()
+            seq_features[fld] = (values, offsets)
 
-                yield feature_dict
+        for i, _id in enumerate(ids):
+            feature_dict = {self.col_id: _id}
+            for fld, (values, offsets) in seq_features.items():
+                feature_dict[fld] = values[offsets[i]:offsets[i + 1]]
+            yield feature_dict
 
     def get_category_sizes(self, fields):
         field_cnt = ', '.join([f'COUNT(DISTINCT {field})' for field in fields])
 
-        sizes = duckdb.sql(f"""SELECT {field_cnt} from {self.data_read_func}""").fetchone()
+        sizes = self._get_connection().sql(f"""SELECT {field_cnt} from {self.data_read_func}""").fetchone()
 
         return dict(zip(fields, sizes))
@@ -0,0 +1,268 @@
+import json
+import logging
+import os
+from typing import Iterable, List, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import torch
+
+from ptls.data_load.feature_dict import FeatureDict
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_FILE = 'schema.json'
+
+
+def _values_path(path, name):
+    return os.path.join(path, f'{name}.values')
+
+
+def _offsets_path(path, name):
+    return os.path.join(path, f'{name}.offsets')
+
+
+def _to_numpy(v):
+    if isinstance(v, torch.Tensor):
+        return v.detach().cpu().numpy()
+    return np.asarray(v)
+
+
+class FlatArrayWriter:
+    """Streaming writer for `FlatArrayDataset` format. Values are appended to files, offsets and scalars
+    are kept in memory and written on `close`.
+    """
+    def __init__(self, path: str):
+        if os.path.exists(os.path.join(path, SCHEMA_FILE)):
+            raise AttributeError(f'FlatArrayDataset already exists in "{path}"')
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.n_records = 0
+        self.seq_features = None
+        self.scalar_features = None
+        self._files = {}
+        self._lengths = {}
+        self._scalars = {}
+
+    def _init_schema(self, seq_arrays: dict, scalar_arrays: dict):
+        self.seq_features = {}
+        for k, v in seq_arrays.items():
+            if v.dtype.kind not in ('i', 'u', 'f', 'b'):
+                raise TypeError(f'Sequential feature "{k}" has not numeric dtype {v.dtype}')
+            self.seq_features[k] = {'dtype': v.dtype.str, 'shape': list(v.shape[1:])}
+            self._files[k] = open(_values_path(self.path, k), 'wb')
+            self._lengths[k] = []
+        self.scalar_features = {}
+        for k, v in scalar_arrays.items():
+            is_numeric = v.dtype.kind in ('i', 'u', 'f', 'b')
+            self.scalar_features[k] = {'dtype': v.dtype.str if is_numeric else 'object'}
+            self._scalars[k] = []
+
+    def write_columns(self, seq_arrays: dict, seq_lengths: dict, scalar_arrays: dict):
+        """Append a batch of records in columnar format.
+
+        Args:
+            seq_arrays: flat values of sequential features for all records in batch
+            seq_lengths: lengths of sequential features for each record in batch
+            scalar_arrays: scalar features, one value for each record in batch
+        """
+        if self.seq_features is None:
+            self._init_schema(seq_arrays, scalar_arrays)
+        if seq_arrays.keys() != self.seq_features.keys() or scalar_arrays.keys() != self.scalar_features.keys():
+            raise AttributeError(f'Features are not consistent with schema. '
+                                 f'Expected {list(self.seq_features)} and {list(self.scalar_features)}, '
+                                 f'found {list(seq_arrays)} and {list(scalar_arrays)}')
+        for k, v in seq_arrays.items():
+            np.ascontiguousarray(v, dtype=self.seq_features[k]['dtype']).tofile(self._files[k])
+            self._lengths[k].append(np.asarray(seq_lengths[k], dtype=np.int64))
+        batch_size = None
+        for k, v in scalar_arrays.items():
+            self._scalars[k].append(v)
+            batch_size = len(v)
+        if batch_size is None:
+            batch_size = len(next(iter(seq_lengths.values())))
+        self.n_records += batch_size
+
+    def write_records(self, records: Iterable[dict], batch_size: int = 1000):
+        """Append feature dicts. Records are buffered into batches and written with `write_columns`
+        """
+        buffer = []
+        for rec in records:
+            buffer.append(rec)
+            if len(buffer) >= batch_size:
+                self._write_record_batch(buffer)
+                buffer = []
+        if len(buffer) > 0:
+            self._write_record_batch(buffer)
+
+    def _write_record_batch(self, records: List[dict]):
+        seq_arrays, seq_lengths, scalar_arrays = {}, {}, {}
+        for k, v in records[0].items():
+            values = [_to_numpy(rec[k]) for rec in records]
+            if FeatureDict.is_seq_feature(k, v):
+                seq_arrays[k] = np.concatenate(values)
+                seq_lengths[k] = [len(x) for x in values]
+            else:
+                if any(x.ndim != 0 for x in values):
+                    raise TypeError(f'Scalar feature "{k}" has not scalar value {type(v)}. '
+                                    f'Use `np.ndarray` or `torch.Tensor` for sequential features')
+                scalar_arrays[k] = np.array(values)
+        self.write_columns(seq_arrays, seq_lengths, scalar_arrays)
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        for k, lengths in self._lengths.items():
+            lengths = np.concatenate(lengths) if len(lengths) > 0 else np.zeros(0, dtype=np.int64)
+            offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+            offsets.tofile(_offsets_path(self.path, k))
+        for k, values in self._scalars.items():
+            values = np.concatenate(values) if len(values) > 0 else np.array([])
+            if self.scalar_features[k]['dtype'] == 'object':
+                np.save(os.path.join(self.path, f'{k}.npy'), values.astype(object), allow_pickle=True)
+            else:
+                values.astype(self.scalar_features[k]['dtype']).tofile(_values_path(self.path, k))
+        with open(os.path.join(self.path, SCHEMA_FILE), 'w') as f:
+            json.dump({
+                'n_records': self.n_records,
+                'seq_features': self.seq_features or {},
+                'scalar_features': self.scalar_features or {},
+            }, f, indent=2)
+        logger.info(f'Saved {self.n_records} records to "{self.path}"')
+
+
+def save_flat_array_dataset(data: Union[Iterable[dict], pd.DataFrame], path: str, batch_size: int = 1000):
+    """Save feature dicts in `FlatArrayDataset` format.
+
+    Args:
+        data: iterable with feature dicts, like `PandasDataPreprocessor` output,
+            or `pandas.DataFrame` from `PandasDataPreprocessor(return_records=False)`
+        path: output directory
+        batch_size: number of records which are converted together
+
+    """
+    if isinstance(data, pd.DataFrame):
+        data = data.to_dict(orient='records')
+    writer = FlatArrayWriter(path)
+    writer.write_records(data, batch_size)
+    writer.close()
+
+
+def parquet_to_flat_array_dataset(data_files: Union[str, List[str]], path: str, batch_size: int = 10000):
+    """Convert parquet files with ptls records into `FlatArrayDataset` format.
+    List columns are sequential features, they are copied from arrow buffers without per-record conversion.
+    Other columns are scalar features.
+
+    Args:
+        data_files: parquet file name or list of file names
+        path: output directory
+        batch_size: number of records which are converted together
+
+    """
+    if isinstance(data_files, str):
+        data_files = [data_files]
+    writer = FlatArrayWriter(path)
+    for file_name in data_files:
+        for rb in pq.ParquetFile(file_name).iter_batches(batch_size=batch_size):
+            seq_arrays, seq_lengths, scalar_arrays = {}, {}, {}
+            for name, col in zip(rb.schema.names, rb.columns):
+                if pa.types.is_list(col.type) or pa.types.is_large_list(col.type):
+                    seq_arrays[name] = col.flatten().to_numpy(zero_copy_only=False)
+                    seq_lengths[name] = col.value_lengths().fill_null(0).to_numpy(zero_copy_only=False)
+                else:
+                    scalar_arrays[name] = col.to_numpy(zero_copy_only=False)
+            writer.write_columns(seq_arrays, seq_lengths, scalar_arrays)
+    writer.close()
+
+
+class FlatArrayDataset(torch.utils.data.Dataset):
+    """Map-style dataset over `FlatArrayDataset` on-disk format.
+
+    Each sequential feature is one contiguous file with values of all records and offsets array
+    with shape (n_records + 1,), both are mapped with `np.memmap`. Scalar features are kept in separate files.
+    `schema.json` describes features. Create dataset with `save_flat_array_dataset`
+    or `parquet_to_flat_array_dataset`.
+
+    `__getitem__` returns tensors which are views over memory-mapped files, nothing is loaded at start.
+    DataLoader workers share the pages through OS page cache, there are no python objects per record.
+    Files are opened in copy-on-write mode: tensors are writable, changes aren't saved to disk.
+
+    Parameters
+        path:
+            dataset directory
+
+    Examples:
+        >>> save_flat_array_dataset(PandasDataPreprocessor(...).fit_transform(df), 'data/train_flat')
+        >>> dataset = FlatArrayDataset('data/train_flat')
+        >>> dataset[0]
+    """
+    runtime_attributes = ('_offsets', '_values', '_scalars')
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, SCHEMA_FILE), 'r') as f:
+            schema = json.load(f)
+        self.n_records = schema['n_records']
+        self.seq_features = schema['seq_features']
+        self.scalar_features = schema['scalar_features']
+
+        self._offsets = None
+        self._values = None
+        self._scalars = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # memory maps are reopened in worker, so data isn't pickled
+        state['_offsets'] = None
+        state['_values'] = None
+        state['_scalars'] = None
+        return state
+
+    def _open(self):
+        self._offsets = {k: np.memmap(_offsets_path(self.path, k), dtype=np.int64, mode='r')
+                         for k in self.seq_features}
+        self._values = {}
+        for k, v in self.seq_features.items():
+            n_values = int(self._offsets[k][-1])
+            if n_values == 0:
+                self._values[k] = np.zeros((0, *v['shape']), dtype=v['dtype'])
+                continue
+            self._values[k] = np.memmap(_values_path(self.path, k), dtype=v['dtype'], mode='c',
+                                        shape=(n_values, *v['shape']))
+        self._scalars = {}
+        for k, v in self.scalar_features.items():
+            if v['dtype'] == 'object':
+                self._scalars[k] = np.load(os.path.join(self.path, f'{k}.npy'), allow_pickle=True)
+            elif self.n_records > 0:
+                self._scalars[k] = np.memmap(_values_path(self.path, k), dtype=v['dtype'], mode='c',
+                                             shape=(self.n_records,))
+
+    def __len__(self):
+        return self.n_records
+
+    def __getitem__(self, item: int):
+        if self._values is None:
+            self._open()
+        if item < 0:
+            item += self.n_records
+        if not 0 <= item < self.n_records:
+            raise IndexError(f'Index {item} is out of range for dataset with {self.n_records} records')
+
+        rec = {}
+        for k, v in self._scalars.items():
+            rec[k] = v[item].item() if isinstance(v, np.memmap) else v[item]
+        for k, v in self._values.items():
+            offsets = self._offsets[k]
+            rec[k] = torch.from_numpy(v[offsets[item]:offsets[item + 1]])
+        return rec
+
+    def get_seq_lens(self) -> np.ndarray:
+        """Sequence lengths of all records from offsets. Used by `LengthBucketBatchSampler`.
+        Synchronized with `ptls.data_load.feature_dict.FeatureDict.get_seq_len`
+        """
+        if self._values is None:
+            self._open()
+        k = 'event_time' if 'event_time' in self._offsets else next(iter(self._offsets))
+        return np.diff(np.asarray(self._offsets[k]))
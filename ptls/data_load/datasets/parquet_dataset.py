@@ -1,7 +1,6 @@
 import logging
 import os
 import warnings
-from functools import partial
 from glob import glob
 from itertools import chain
 from typing import Union, List
@@ -12,14 +11,21 @@ import torch
 import torch.distributed as dist
 from omegaconf import ListConfig
 
-from pymonad.either import Either
-from ptls.data_load import read_pyarrow_file
+from ptls.data_load.columnar_batch import ColumnarBatch, trans_time_features
+from ptls.data_load.datasets.parquet_pushdown import get_read_columns, get_filter_expression, \
+    get_parquet_fragment
+from ptls.data_load.iterable_processing.iterable_shuffle import interleave
+from ptls.data_load.datasets.read_ahead import ReadAheadIterator, ReadAheadStats
+from ptls.data_load.datasets.parquet_sharding import get_parquet_work_units, plan_parquet_shards, \
+    shard_num_rows, group_units_by_file
 from ptls.data_load.utils import init_worker
 
 logger = logging.getLogger(__name__)
 
 
 def iter_with_max_num(iterated, max_num: int = None):
+    if max_num is not None and max_num <= 0:
+        return
     num = 0
     for i in iterated:
         yield i
@@ -30,6 +36,22 @@ def iter_with_max_num(iterated, max_num: int = None):
             break
 
 
+def iter_columnar_with_max_num(iterated, max_num: int = None):
+    """`iter_with_max_num` for `ColumnarBatch` items. `max_num` is a number of clients, not batches
+    """
+    if max_num is not None and max_num <= 0:
+        return
+    num = 0
+    for batch in iterated:
+        if max_num is not None and num + len(batch) >= max_num:
+            yield batch.slice(0, max_num - num)
+            if dist.is_initialized():
+                logger.debug(f'Stopping worker on GPU {dist.get_rank()}')
+            break
+        yield batch
+        num += len(batch)
+
+
 class ParquetFiles:
     """Helper file which search parquet files in specified path.
 
@@ -94,15 +116,56 @@ class ParquetDataset(torch.utils.data.IterableDataset):
         shuffle_files: shuffle data_files before reading when True.
         cache_schema: dict schema (feature names) will be read once
         shuffle_seed: random seed for shuffle_files
+        columnar: yield `ptls.data_load.columnar_batch.ColumnarBatch` objects instead of feature dicts.
+            No per-client dict is created, batches are views over arrow buffers.
+            Use with `DataLoader(batch_size=None, collate_fn=collate_columnar_batch)`.
+            `i_filters` are record-level and can't be used in this mode.
+        columnar_batch_size: number of clients in each `ColumnarBatch`. Used when `columnar=True`
+        row_group_sharding: split work between workers by `(file, row_group)` units instead of files.
+            Units are balanced by row count with `ptls.data_load.datasets.parquet_sharding.plan_parquet_shards`,
+            so all workers are busy even with a few large files. Only file footers are read for planning.
+            `shuffle_files` shuffles row groups in this mode.
+        columns: list of columns to read. All columns are read when None.
+            Names are the same as in records, `trans_time` is read for `local_day`, `hour` and other time features.
+        trx_encoder: `TrxEncoder` which is used with this dataset. Its features, `event_time` and `target*` columns
+            are read, `columns` are extra columns (like client id) in this case.
+        filter_pushdown: leading `IdFilter`, `SeqLenFilter` and `FeatureFilter` from `i_filters` are translated
+            into pyarrow dataset filter and column projection
+            with `ptls.data_load.datasets.parquet_pushdown`. Row groups which can't match filter by statistics
+            aren't decoded. Python filters are still applied, so records are the same as without pushdown.
+        read_ahead: number of row groups which are read and decoded ahead in background thread of each worker.
+            I/O is overlapped with record processing. Disabled when 0.
+            In columnar mode batches don't cross row group boundaries with read-ahead.
+        read_ahead_max_bytes: memory limit for decoded row groups in read-ahead queue. No limit when None.
+            Queue wait statistics are in `read_ahead_stats` and are logged with debug level at the end of each
+            worker iteration. Statistics are collected in the worker copy of the dataset, so `read_ahead_stats`
+            of the main process dataset is filled only when iterated without DataLoader workers (`num_workers=0`).
+        interleave_files: number of simultaneously open files (or row group sets with `row_group_sharding`)
+            of each worker. Records are taken from them in random order, so consecutive records
+            come from different files. Use with `IterableShuffle` to improve shuffle quality without
+            larger buffer. Each open file is kept in memory. Can't be used with `read_ahead`.
+            Order depends on the epoch, see `set_epoch`.
 
     """
 
+    runtime_attributes = ('rs', '_worker_id', '_num_workers', '_shuffle_seed', '_epoch', '_schema',
+                          '_work_units', '_read_options', 'read_ahead_stats')
+
     def __init__(self, 
                  data_files: Union[ParquetFiles, List[str]],
                  i_filters: List = None,
                  shuffle_files: bool = False, 
                  cache_schema: bool =True, 
-                 shuffle_seed: int = 42
+                 shuffle_seed: int = 42,
+                 columnar: bool = False,
+                 columnar_batch_size: int = 512,
+                 row_group_sharding: bool = False,
+                 columns: List[str] = None,
+                 trx_encoder=None,
+                 filter_pushdown: bool = True,
+                 read_ahead: int = 0,
+                 read_ahead_max_bytes: int = None,
+                 interleave_files: int = 1,
                  ):
         is_parquet = isinstance(data_files, ParquetFiles)
         self.data_files = data_files.data_files if is_parquet else data_files
@@ -110,12 +173,63 @@ class ParquetDataset(torch.utils.data.IterableDataset):
         self.shuffle_files = shuffle_files
         self.cache_schema = cache_schema
         self.shuffle_seed = shuffle_seed
+        self.columnar = columnar
+        self.columnar_batch_size = columnar_batch_size
+        self.row_group_sharding = row_group_sharding
+        self.columns = columns
+        self.trx_encoder = trx_encoder
+        self.filter_pushdown = filter_pushdown
+        self.read_ahead = read_ahead
+        self.read_ahead_max_bytes = read_ahead_max_bytes
+        self.read_ahead_stats = None
+        self.interleave_files = interleave_files
         self.rs = None
 
+        if self.columnar and self.postprocessing_func:
+            raise AttributeError('`i_filters` are not supported with `columnar=True`')
+        if self.read_ahead > 0 and self.interleave_files > 1:
+            raise AttributeError('`interleave_files` is not supported with `read_ahead`')
+
         self._worker_id = None
         self._num_workers = None
         self._shuffle_seed = None
+        self._epoch = 0
         self._schema = None
+        self._work_units = None
+        self._read_options = None
+
+    def set_epoch(self, epoch: int):
+        """Epoch for `interleave_files` order. It's also passed to `i_filters` with `set_epoch`, like `IterableShuffle`.
+
+        Epoch is a number of iterations over dataset since the last `set_epoch` call. DataLoader workers
+        iterate over their own copy of the dataset, and non-persistent workers are recreated each epoch,
+        so call this in main process before each epoch. `ptls.frames.dataset_epoch.DatasetEpochCallback`
+        does it for lightning training.
+        """
+        self._epoch = epoch
+        for i_filter in self.postprocessing_func or []:
+            if callable(getattr(i_filter, 'set_epoch', None)):
+                i_filter.set_epoch(epoch)
+
+    def _get_schema(self):
+        if self._schema is None or not self.cache_schema:
+            self._schema = pq.read_schema(self.data_files[0])
+        return self._schema
+
+    def _get_read_options(self):
+        """Column list and pyarrow filter expression for reading. Both are None when nothing is pushed down
+        """
+        if self._read_options is None or not self.cache_schema:
+            i_filters = self.postprocessing_func if self.filter_pushdown else None
+            if (self.columns is None and self.trx_encoder is None and not i_filters) or len(self.data_files) == 0:
+                self._read_options = None, None
+            else:
+                schema = self._get_schema()
+                self._read_options = (
+                    get_read_columns(schema, self.columns, self.trx_encoder, i_filters),
+                    get_filter_expression(schema, i_filters),
+                )
+        return self._read_options
 
     def _get_my_files(self):
         files = [(i, name) for i, name in enumerate(self.data_files)]
@@ -123,49 +237,141 @@ class ParquetDataset(torch.utils.data.IterableDataset):
 
         return my_files
 
-    def __apply_postproc(self, sample):
+    def _get_shard(self):
+        """Shard id and number of shards for current worker"""
+        return self._worker_id, self._num_workers
+
+    def _get_work_units(self):
+        if self._work_units is None:
+            _, filter_expression = self._get_read_options()
+            self._work_units = get_parquet_work_units(self.data_files, filter_expression)
+        return self._work_units
+
+    def _get_my_shard(self):
+        shard_id, num_shards = self._get_shard()
+        return plan_parquet_shards(self._get_work_units(), num_shards)[shard_id]
+
+    def _get_my_work(self):
+        """List of `(file_name, row_groups)` for current worker. `row_groups` is None for whole file
+        """
+        rs = np.random.RandomState(self._shuffle_seed % 2 ** 32) if self.shuffle_files else None
+        if not self.row_group_sharding:
+            my_files = self._get_my_files()
+            if rs is not None:
+                rs.shuffle(my_files)
+            return [(name, None) for name in my_files]
+
+        my_units = self._get_my_shard()
+        if rs is not None:
+            my_units = [my_units[i] for i in rs.permutation(len(my_units))]
+        return list(group_units_by_file(my_units))
+
+    def _iter_work(self, my_work):
+        if self.read_ahead > 0:
+            return self._iter_work_read_ahead(my_work)
+        if self.interleave_files > 1:
+            rng = np.random.default_rng([self._shuffle_seed % 2 ** 32, self._epoch])
+            return interleave((self._iter_file_mode(name, row_groups) for name, row_groups in my_work),
+                              self.interleave_files, rng)
+        return chain.from_iterable(self._iter_file_mode(name, row_groups) for name, row_groups in my_work)
+
+    def _split_by_row_groups(self, my_work):
+        """Each `(file_name, row_groups)` is split into single row group items for read-ahead"""
+        _, filter_expression = self._get_read_options()
+        for file_name, row_groups in my_work:
+            if row_groups is None:
+                row_groups = [unit.row_group for unit in get_parquet_work_units([file_name], filter_expression)]
+            for row_group in row_groups:
+                yield file_name, [row_group]
+
+    def _read_table(self, work_item):
+        file_name, row_groups = work_item
+        logger.debug(f'[{self._worker_id}/{self._num_workers}] Read ahead "{file_name}", row groups {row_groups}')
+        columns, filter_expression = self._get_read_options()
+        return read_pyarrow_table(file_name, use_threads=True, row_groups=row_groups,
+                                  columns=columns, filter=filter_expression)
+
+    def _iter_work_read_ahead(self, my_work):
+        self.read_ahead_stats = ReadAheadStats()
+        tables = ReadAheadIterator(self._split_by_row_groups(my_work), self._read_table,
+                                   depth=self.read_ahead, max_bytes=self.read_ahead_max_bytes,
+                                   stats=self.read_ahead_stats)
+        try:
+            for p_table in tables:
+                if self.columnar:
+                    for rb in p_table.to_batches(max_chunksize=self.columnar_batch_size):
+                        if len(rb) > 0:
+                            yield ColumnarBatch.from_record_batch(rb)
+                else:
+                    for rec in iter_pyarrow_table_records(p_table):
+                        yield {k: self.to_torch(v) for k, v in rec.items()}
+        finally:
+            logger.debug(f'[{self._worker_id}/{self._num_workers}] {self.read_ahead_stats}')
+
+    def _apply_postproc(self, gen):
         for func in self.postprocessing_func:
-            sample = func(sample)
-        return sample
+            gen = func(gen)
+        return gen
 
     def __iter__(self):
         init_worker(self)
-        rs = np.random.RandomState(self._shuffle_seed % 2 ** 32)
-        my_files = rs.shuffle(self._get_my_files()) if self.shuffle_files else self._get_my_files()
-        dataset_generator = map(self.iter_file, my_files)
-        sample = Either(value=dataset_generator,
-                        monoid=[dataset_generator,
-                                self.postprocessing_func is not None]). \
-            either(left_function=lambda x: x,
-                   right_function=lambda x: self.__apply_postproc(x))
-
-        return sample
-
-    def iter_file(self, file_name):
+        gen = self._iter_work(self._get_my_work())
+        self._epoch += 1
+        if self.postprocessing_func is not None:
+            gen = self._apply_postproc(gen)
+        return gen
+
+    def _iter_file_mode(self, file_name, row_groups=None):
+        if self.columnar:
+            return self.iter_file_columnar(file_name, row_groups)
+        return self.iter_file(file_name, row_groups)
+
+    def iter_file(self, file_name, row_groups=None):
         """
         Iterates over parquet file
 
         Args:
             file_name: parquet file name
+            row_groups: list of row groups to read. Whole file is read when None
 
         Returns:
             [(customer_id, features)]
         """
+        logger.debug(f'[{self._worker_id}/{self._num_workers}] Iter file "{file_name}", row groups {row_groups}')
+        columns, filter_expression = self._get_read_options()
+        for rec in read_pyarrow_file(file_name, use_threads=True, row_groups=row_groups,
+                                     columns=columns, filter=filter_expression):
+            yield {k: self.to_torch(v) for k, v in rec.items()}
 
-        def _create_feature_dict(rec):
-            return {next(x) for x in map(self.to_torch, rec.items())}
+    def iter_file_columnar(self, file_name, row_groups=None):
+        """
+        Iterates over parquet file by record batches
 
-        logger.debug(f'[{self._worker_id}/{self._num_workers}] Iter file "{file_name}"')
-        pyarrow_generator = map(partial(read_pyarrow_file, use_threads=True), file_name)
-        rec = map(_create_feature_dict, pyarrow_generator)
-        yield next(rec)
+        Args:
+            file_name: parquet file name
+            row_groups: list of row groups to read. Whole file is read when None
+
+        Returns:
+            [ColumnarBatch]
+        """
+        logger.debug(f'[{self._worker_id}/{self._num_workers}] Iter file "{file_name}", row groups {row_groups} '
+                     f'in columnar mode')
+        columns, filter_expression = self._get_read_options()
+        if columns is None and filter_expression is None:
+            batches = pq.ParquetFile(file_name).iter_batches(
+                batch_size=self.columnar_batch_size, row_groups=row_groups, use_threads=True)
+        else:
+            batches = get_parquet_fragment(file_name, row_groups).to_batches(
+                batch_size=self.columnar_batch_size, columns=columns, filter=filter_expression, use_threads=True)
+        for rb in batches:
+            if len(rb) > 0:
+                yield ColumnarBatch.from_record_batch(rb)
 
     @staticmethod
-    def to_torch(key, val):
-        is_numpy = isinstance(val, np.ndarray)
-        is_int_or_float = val.dtype.kind in ('i', 'f')
-        val = torch.from_numpy(val) if all([is_numpy, is_int_or_float]) else val
-        return {key: val}
+    def to_torch(val):
+        if isinstance(val, np.ndarray) and val.dtype.kind in ('i', 'f'):
+            return torch.from_numpy(val)
+        return val
 
 
 class DistributedParquetDataset(ParquetDataset):
@@ -186,9 +392,20 @@ class DistributedParquetDataset(ParquetDataset):
         repeat_items: whether to start reading same files again on the worker for preventing deadlocks (caused by
                       inability to calculate exact number of yielded items per worker and as a result inability to
                       yield the same number of items on different GPUs)
+        row_group_sharding: split `(file, row_group)` units between all workers of all ranks.
+                      Item count per worker is calculated from parquet footers. It's exact only without
+                      `i_filters`: footer counts are taken before filters and pushdown, so with filters
+                      workers yield fewer items and `repeat_items` is required for equal counts on all ranks.
+        columns, trx_encoder, filter_pushdown: column projection and filter pushdown, see `ParquetDataset`
+        read_ahead, read_ahead_max_bytes: background read-ahead, see `ParquetDataset`
+        interleave_files: records from several open files, see `ParquetDataset`
+
+    Row counts are taken from parquet footer metadata, tables aren't read before training.
 
     """
 
+    runtime_attributes = ('items_per_worker', 'real_worker_id', 'real_num_workers')
+
     def __init__(self, 
                  data_files: Union[ParquetFiles, List[str]],
                  i_filters: List = None,
@@ -196,19 +413,48 @@ class DistributedParquetDataset(ParquetDataset):
                  cache_schema: bool = True, 
                  shuffle_seed: int = 42, 
                  max_items_per_file: int = None, 
-                 repeat_items: bool = True):
+                 repeat_items: bool = True,
+                 columnar: bool = False,
+                 columnar_batch_size: int = 512,
+                 row_group_sharding: bool = False,
+                 columns: List[str] = None,
+                 trx_encoder=None,
+                 filter_pushdown: bool = True,
+                 read_ahead: int = 0,
+                 read_ahead_max_bytes: int = None,
+                 interleave_files: int = 1):
         super().__init__(data_files=data_files,
                          i_filters=i_filters,
                          shuffle_files=shuffle_files, 
                          cache_schema=cache_schema, 
-                         shuffle_seed=shuffle_seed)
+                         shuffle_seed=shuffle_seed,
+                         columnar=columnar,
+                         columnar_batch_size=columnar_batch_size,
+                         row_group_sharding=row_group_sharding,
+                         columns=columns,
+                         trx_encoder=trx_encoder,
+                         filter_pushdown=filter_pushdown,
+                         read_ahead=read_ahead,
+                         read_ahead_max_bytes=read_ahead_max_bytes,
+                         interleave_files=interleave_files)
         self.max_items_per_file = max_items_per_file
         self.items_per_worker = None
         self.repeat_items = repeat_items
         self.real_worker_id = None
         self.real_num_workers = None
+        if i_filters and not repeat_items:
+            warnings.warn('Item count per worker is calculated before `i_filters`, ranks can yield different '
+                          'number of items and DDP can hang. Use `repeat_items=True` with filters')
 
     def _calc_min_items_per_worker(self):
+        if self.row_group_sharding:
+            _, num_shards = self._get_shard()
+            min_rows = min(shard_num_rows(shard) for shard in plan_parquet_shards(self._get_work_units(), num_shards))
+            if min_rows == 0:
+                warnings.warn(f'Some of {num_shards} shards have no row groups, so no rows will be read by '
+                              f'any worker of any rank. Reduce the number of workers or write smaller row groups')
+            return min_rows
+
         nums = []
         for rank in range(dist.get_world_size()):
             per_gpu = 0
@@ -216,10 +462,13 @@ class DistributedParquetDataset(ParquetDataset):
                 if self.max_items_per_file is not None:
                     per_gpu += self.max_items_per_file
                 else:
-                    per_gpu += pq.read_table(filename).shape[0]
+                    per_gpu += pq.ParquetFile(filename).metadata.num_rows
             nums.append(per_gpu)
         return min(nums) // self._num_workers
 
+    def _get_shard(self):
+        return self.real_worker_id, self.real_num_workers
+
     def _get_my_files(self):
         my_files = [name for i, name in enumerate(self.data_files) if
                     i % self.real_num_workers == self.real_worker_id]
@@ -242,55 +491,61 @@ class DistributedParquetDataset(ParquetDataset):
         if dist.is_initialized() and self.items_per_worker is None:
             self.items_per_worker = self._calc_min_items_per_worker()
 
-        my_files = self._get_my_files()
-        if self.shuffle_files:
-            rs = np.random.RandomState(self._shuffle_seed % 2 ** 32)
-            rs.shuffle(my_files)
-
-        logger.debug(f'Iter [{self._worker_id:02d}/{self._num_workers:02d}]: {my_files}')
+        my_work = self._get_my_work()
+        logger.debug(f'Iter [{self._worker_id:02d}/{self._num_workers:02d}]: {my_work}')
         if self.repeat_items:
-            gen = chain(*[self.iter_file(name) for _ in range(2) for name in my_files])
-        else:
-            gen = chain(*[self.iter_file(name) for name in my_files])
-
-        if self.i_filters is not None:
-            gen = self.i_filters(gen)
+            my_work = my_work * 2
+        gen = self._iter_work(my_work)
+        self._epoch += 1
+
+        if self.postprocessing_func is not None:
+            gen = self._apply_postproc(gen)
+        if self.columnar:
+            return iter_columnar_with_max_num(gen, self.items_per_worker)
         return iter_with_max_num(gen, self.items_per_worker)
 
 
-def read_pyarrow_file(path, use_threads=True):
-    p_table = pq.read_table(
-        source=path,
-        use_threads=use_threads,
-    )
+def read_pyarrow_table(path, use_threads=True, row_groups=None, columns=None, filter=None):
+    if columns is not None or filter is not None:
+        return get_parquet_fragment(path, row_groups).to_table(
+            columns=columns, filter=filter, use_threads=use_threads)
+    if row_groups is None:
+        return pq.read_table(
+            source=path,
+            use_threads=use_threads,
+        )
+    return pq.ParquetFile(path).read_row_groups(row_groups, use_threads=use_threads)
 
+
+def read_pyarrow_file(path, use_threads=True, row_groups=None, columns=None, filter=None):
+    p_table = read_pyarrow_table(path, use_threads, row_groups, columns, filter)
+    return iter_pyarrow_table_records(p_table)
+
+
+def iter_pyarrow_table_records(p_table):
     col_indexes = p_table.column_names
 
     def get_records():
         for rb in p_table.to_batches():
             col_arrays = [rb.column(i) for i, _ in enumerate(col_indexes)]
-            col_arrays = [a.to_numpy(zero_copy_only=False) for a in col_arrays]  # Keep as NumPy arrays
-
-            # Pre-allocate dictionary
-            records = [{} for _ in range(len(col_arrays[0]))]
+            col_arrays_np = [a.to_numpy(zero_copy_only=False) for a in col_arrays]  # Keep as NumPy arrays
 
             if 'trans_time' in col_indexes:
-                date_batch = col_arrays[col_indexes.index('trans_time')].astype('datetime64[s]')
+                # time features are calculated once for all events in batch and split by clients
+                trans_time = col_arrays[col_indexes.index('trans_time')]
+                split_ix = trans_time.offsets.to_numpy()
+                time_features = trans_time_features(trans_time.values.to_numpy(zero_copy_only=False))
+                time_features = {k: np.split(v[split_ix[0]:split_ix[-1]], split_ix[1:-1] - split_ix[0])
+                                 for k, v in time_features.items()}
                 records = [
                     {
-                        'local_day': (date_batch[i].astype('datetime64[D]') - date_batch[i]).astype(
-                            'datetime64[M]').astype(np.int16) + 1,
-                        'local_month': date_batch[i].astype('datetime64[M]').astype(np.int16) / 12 + 1,
-                        'local_weekday': (date_batch[i].astype('datetime64[D]').astype(np.int16) + 3) / 7,
-                        'hour': ((date_batch[i] - date_batch[i].astype('datetime64[D]')).astype(
-                            np.int32) // 3600 + 1).astype(np.int16),
-                        **{n: a[i] for n, a in zip(col_indexes, col_arrays) if n != 'trans_time'}
+                        **{k: v[i] for k, v in time_features.items()},
+                        **{n: a[i] for n, a in zip(col_indexes, col_arrays_np) if n != 'trans_time'}
                     }
-                    for i in range(len(date_batch))
+                    for i in range(len(rb))
                 ]
             else:
-                for i in range(len(col_arrays[0])):
-                    records[i] = {n: a[i] for n, a in zip(col_indexes, col_arrays)}
+                records = [{n: a[i] for n, a in zip(col_indexes, col_arrays_np)} for i in range(len(rb))]
 
             yield from records
 
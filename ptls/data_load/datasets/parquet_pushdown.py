@@ -0,0 +1,128 @@
+import logging
+from typing import List
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from ptls.data_load.iterable_processing.feature_preprocessing import FeaturePreprocessing
+from ptls.data_load.iterable_processing.filtering import Filtering
+
+logger = logging.getLogger(__name__)
+
+TRANS_TIME_FEATURES = ('local_day', 'local_month', 'local_weekday', 'hour')
+
+
+def _is_list(field: pa.Field):
+    return pa.types.is_list(field.type) or pa.types.is_large_list(field.type)
+
+
+def _is_seq_column(field: pa.Field):
+    """Synchronized with `ptls.data_load.feature_dict.FeatureDict.is_seq_feature` for parquet columns"""
+    if field.name == 'event_time':
+        return True
+    return not field.name.startswith('target') and _is_list(field)
+
+
+def _pushdown_prefix(i_filters):
+    """Leading filters which can be pushed down. Filters after the first other filter may see modified records
+    """
+    prefix = []
+    for f in i_filters or []:
+        if isinstance(f, Filtering) and f.mode in ('IdFilter', 'SeqLenFilter'):
+            prefix.append(f)
+        elif isinstance(f, FeaturePreprocessing) and f.mode == 'FeatureFilter':
+            prefix.append(f)
+        else:
+            break
+    return prefix
+
+
+def trx_encoder_columns(trx_encoder) -> List[str]:
+    """Feature names which are used by `TrxEncoder`.
+    Custom embeddings and `numeric_values` read `col_name` of encoder when it's set, not their key
+    """
+    names = set(trx_encoder.embeddings.keys())
+    names.update(emb.col_name or name for name, emb in trx_encoder.custom_embeddings.items())
+    return sorted(names)
+
+
+def get_read_columns(schema: pa.Schema, columns: List[str] = None, trx_encoder=None, i_filters=None):
+    """Columns which should be read from parquet file.
+
+    Names are record-level: `trans_time` column is read when any of derived time features
+    (`local_day`, `local_month`, `local_weekday`, `hour`) is required.
+
+    Args:
+        schema: parquet file schema
+        columns: explicit column list. Extra columns (like client id) when `trx_encoder` is set
+        trx_encoder: `TrxEncoder`. Its features, `event_time` and `target*` columns are read
+        i_filters: leading `FeatureFilter`, `IdFilter` and `SeqLenFilter` filters are used for projection
+
+    Returns:
+        list of column names in schema order or None when all columns are required
+    """
+    names = schema.names
+    record_names = [name for name in names if name != 'trans_time']
+    if 'trans_time' in names:
+        record_names.extend(TRANS_TIME_FEATURES)
+
+    required = None
+    if trx_encoder is not None:
+        required = set(trx_encoder_columns(trx_encoder)) | set(columns or [])
+        required |= {name for name in names if name == 'event_time' or name.startswith('target')}
+    elif columns is not None:
+        required = set(columns)
+
+    filter_columns = set()
+    dropped = set()
+    for f in _pushdown_prefix(i_filters):
+        if isinstance(f, Filtering):
+            filter_columns.update(f.required_columns())
+            continue
+        dropped.update(name for name in record_names
+                       if f.is_drop(name, name in TRANS_TIME_FEATURES or _is_seq_column(schema.field(name))))
+
+    if required is None and len(dropped) == 0:
+        return None
+    if required is None:
+        required = set(record_names)
+    required = (required - dropped) | filter_columns
+    if required & set(TRANS_TIME_FEATURES) and 'trans_time' in names:
+        required.add('trans_time')
+    missing = required - set(record_names) - {'trans_time'}
+    if len(missing) > 0:
+        logger.debug(f'Columns {sorted(missing)} are not found in parquet schema')
+    return [name for name in names if name in required]
+
+
+def get_filter_expression(schema: pa.Schema, i_filters=None):
+    """Translate leading `IdFilter` and `SeqLenFilter` filters into pyarrow dataset expression.
+    Expression on scalar columns allows row group skipping by statistics.
+
+    Python filters are kept in the pipeline, so records are the same with and without pushdown.
+
+    Returns:
+        `pyarrow.dataset.Expression` or None
+    """
+    default_sequence_col = next((field.name for field in schema if _is_seq_column(field) and _is_list(field)), None)
+    expression = None
+    for f in _pushdown_prefix(i_filters):
+        if not isinstance(f, Filtering):
+            continue
+        e = f.to_arrow_filter(schema.names, default_sequence_col)
+        if e is not None:
+            expression = e if expression is None else expression & e
+    return expression
+
+
+def get_parquet_fragment(file_name: str, row_groups: List[int] = None):
+    fragment = next(ds.dataset(file_name, format='parquet').get_fragments())
+    if row_groups is not None:
+        fragment = fragment.subset(row_group_ids=row_groups)
+    return fragment
+
+
+def get_matching_row_groups(file_name: str, expression) -> List[int]:
+    """Row groups which can match expression by statistics"""
+    return [rg.id for rg in get_parquet_fragment(file_name).subset(filter=expression).row_groups]
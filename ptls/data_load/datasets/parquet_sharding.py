@@ -0,0 +1,69 @@
+import heapq
+from collections import namedtuple
+from itertools import groupby
+from typing import List
+
+import pyarrow.parquet as pq
+
+from ptls.data_load.datasets.parquet_pushdown import get_matching_row_groups
+
+ParquetWorkUnit = namedtuple('ParquetWorkUnit', ['file_name', 'row_group', 'num_rows'])
+
+
+def get_parquet_work_units(data_files: List[str], filter=None) -> List[ParquetWorkUnit]:
+    """`(file, row_group)` work units with row counts. Only parquet footer metadata is read.
+
+    Args:
+        data_files: list of parquet file names
+        filter: `pyarrow.dataset.Expression`. Row groups which can't match it by statistics are skipped
+
+    Returns:
+        list of `ParquetWorkUnit` in file and row group order
+    """
+    units = []
+    for file_name in data_files:
+        metadata = pq.ParquetFile(file_name).metadata
+        row_groups = range(metadata.num_row_groups)
+        if filter is not None:
+            row_groups = get_matching_row_groups(file_name, filter)
+        for row_group in row_groups:
+            units.append(ParquetWorkUnit(file_name, row_group, metadata.row_group(row_group).num_rows))
+    return units
+
+
+def plan_parquet_shards(units: List[ParquetWorkUnit], num_shards: int) -> List[List[ParquetWorkUnit]]:
+    """Split work units into `num_shards` shards with balanced row counts.
+
+    Greedy largest-first assignment: units are taken in descending row count order
+    and each one goes to the shard with the least rows. Plan is deterministic, so all workers and ranks
+    build the same plan independently. Units inside a shard keep file and row group order.
+
+    Args:
+        units: work units from `get_parquet_work_units`
+        num_shards: number of shards, usually `num_workers * world_size`
+
+    Returns:
+        list with `num_shards` lists of work units
+    """
+    order = sorted(range(len(units)), key=lambda i: -units[i].num_rows)
+    heap = [(0, shard_id) for shard_id in range(num_shards)]
+    shards = [[] for _ in range(num_shards)]
+    for i in order:
+        num_rows, shard_id = heapq.heappop(heap)
+        shards[shard_id].append(i)
+        heapq.heappush(heap, (num_rows + units[i].num_rows, shard_id))
+    return [[units[i] for i in sorted(shard)] for shard in shards]
+
+
+def shard_num_rows(shard: List[ParquetWorkUnit]) -> int:
+    return sum(unit.num_rows for unit in shard)
+
+
+def group_units_by_file(shard: List[ParquetWorkUnit]):
+    """Consecutive units from the same file are grouped to read them with one file open.
+
+    Yields:
+        tuple with file name and list of row groups
+    """
+    for file_name, units in groupby(shard, key=lambda unit: unit.file_name):
+        yield file_name, [unit.row_group for unit in units]
@@ -0,0 +1,157 @@
+import threading
+import time
+from collections import deque
+from typing import Callable, Iterable
+
+
+class ReadAheadStats:
+    """Queue statistics of `ReadAheadIterator`. Use them to choose read-ahead depth.
+
+    `consumer_wait_time` is a time when data was requested but not ready yet. Large value means that
+    reading is slower than processing, increase depth or number of workers.
+    `producer_wait_time` is a time when background thread was blocked by depth or memory limit.
+    Large value means that read-ahead is deeper than required.
+
+    Attributes:
+        n_items: number of loaded items
+        n_waits: number of requests which waited for item
+        consumer_wait_time: total consumer wait time, seconds
+        producer_wait_time: total background thread wait time, seconds
+        load_time: total load time in background thread, seconds
+        max_queue_bytes: max size of loaded items in queue, bytes
+    """
+    def __init__(self):
+        self.n_items = 0
+        self.n_waits = 0
+        self.consumer_wait_time = 0.0
+        self.producer_wait_time = 0.0
+        self.load_time = 0.0
+        self.max_queue_bytes = 0
+
+    def as_dict(self):
+        return dict(self.__dict__)
+
+    def __repr__(self):
+        return (f'ReadAheadStats(n_items={self.n_items}, n_waits={self.n_waits}, '
+                f'consumer_wait_time={self.consumer_wait_time:.3f}, '
+                f'producer_wait_time={self.producer_wait_time:.3f}, '
+                f'load_time={self.load_time:.3f}, max_queue_bytes={self.max_queue_bytes})')
+
+
+class ReadAheadIterator:
+    """Loads items with `load_fn` in background thread ahead of consumer.
+
+    pyarrow releases GIL when reads and decodes parquet, so I/O and decoding are overlapped
+    with python record processing in main thread. Order of items is kept.
+    Exception in `load_fn` is raised in consumer.
+
+    Parameters
+        items:
+            work items, e.g. `(file_name, row_groups)` tuples
+        load_fn:
+            function which loads one item, e.g. reads `pyarrow.Table`
+        depth:
+            max number of loaded items in queue
+        max_bytes:
+            max size of loaded items in queue. Item isn't added when queue would exceed the limit.
+            One item is always allowed, so large item doesn't block reading. No limit when None
+        size_fn:
+            function which returns size of loaded item in bytes. `nbytes` attribute is used by default
+        stats:
+            `ReadAheadStats` object which is updated. New one is created when None
+    """
+    def __init__(self,
+                 items: Iterable,
+                 load_fn: Callable,
+                 depth: int = 2,
+                 max_bytes: int = None,
+                 size_fn: Callable = None,
+                 stats: ReadAheadStats = None,
+                 ):
+        if depth < 1:
+            raise AttributeError(f'`depth` should be positive, found {depth}')
+        self.items = items
+        self.load_fn = load_fn
+        self.depth = depth
+        self.max_bytes = max_bytes
+        self.size_fn = size_fn if size_fn is not None else self._default_size
+        self.stats = stats if stats is not None else ReadAheadStats()
+
+        self._queue = deque()
+        self._queue_bytes = 0
+        self._cond = threading.Condition()
+        self._stopped = False
+
+    @staticmethod
+    def _default_size(value):
+        return getattr(value, 'nbytes', 0)
+
+    def _is_full(self, size: int):
+        """Item with `size` bytes can't be added to queue"""
+        if len(self._queue) == 0:
+            return False
+        if len(self._queue) >= self.depth:
+            return True
+        return self.max_bytes is not None and self._queue_bytes + size > self.max_bytes
+
+    def _put(self, entry, size):
+        with self._cond:
+            t = time.perf_counter()
+            while self._is_full(size) and not self._stopped:
+                self._cond.wait()
+            self.stats.producer_wait_time += time.perf_counter() - t
+            if self._stopped:
+                return False
+            self._queue.append((entry, size))
+            self._queue_bytes += size
+            self.stats.max_queue_bytes = max(self.stats.max_queue_bytes, self._queue_bytes)
+            self._cond.notify_all()
+            return True
+
+    def _produce(self):
+        try:
+            for item in self.items:
+                t = time.perf_counter()
+                value = self.load_fn(item)
+                self.stats.load_time += time.perf_counter() - t
+                if not self._put(('value', value), self.size_fn(value)):
+                    return
+            self._put(('end', None), 0)
+        except Exception as e:
+            self._put(('error', e), 0)
+
+    def _get(self):
+        with self._cond:
+            if len(self._queue) == 0:
+                self.stats.n_waits += 1
+                t = time.perf_counter()
+                while len(self._queue) == 0:
+                    self._cond.wait()
+                self.stats.consumer_wait_time += time.perf_counter() - t
+            entry, size = self._queue.popleft()
+            self._queue_bytes -= size
+            self._cond.notify_all()
+            return entry
+
+    def _stop(self):
+        with self._cond:
+            self._stopped = True
+            self._queue.clear()
+            self._queue_bytes = 0
+            self._cond.notify_all()
+
+    def __iter__(self):
+        thread = threading.Thread(target=self._produce, name='ptls-read-ahead', daemon=True)
+        thread.start()
+        try:
+            while True:
+                kind, value = self._get()
+                if kind == 'end':
+                    break
+                if kind == 'error':
+                    raise value
+                self.stats.n_items += 1
+                yield value
+        finally:
+            self._stop()
+            thread.join()
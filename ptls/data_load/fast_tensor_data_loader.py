@@ -1,6 +1,34 @@
+import inspect
+import logging
+import os
+from glob import glob
 from typing import Optional
+
+import numpy as np
 import torch
 
+from ptls.data_load.length_bucket_sampler import get_dataset_seq_lens
+from ptls.data_load.padded_batch import PaddedBatch
+from ptls.data_load.utils import collate_feature_dict
+
+logger = logging.getLogger(__name__)
+
+
+def load_bucket(file_name: str, mmap: bool = True):
+    """`torch.load` for bucket file. `mmap` (torch >= 2.1) and `weights_only` (torch >= 1.13) are passed only when
+    supported by installed torch. Bucket is loaded fully into memory when `mmap` isn't supported.
+    """
+    params = inspect.signature(torch.load).parameters
+    kwargs = {}
+    if 'weights_only' in params:
+        kwargs['weights_only'] = False
+    if mmap:
+        if 'mmap' in params:
+            kwargs['mmap'] = True
+        else:
+            logger.warning('`mmap` requires torch >= 2.1, buckets are loaded into memory')
+    return torch.load(file_name, **kwargs)
+
 
 class FastTensorDataLoader:
     """
@@ -65,3 +93,99 @@ class FastTensorDataLoader:
 
     def __len__(self):
         return self.n_batches
+
+
+def save_padded_buckets(data, path: str, n_buckets: int = 8, max_bucket_records: int = 100000):
+    """Convert dataset with feature dicts into length buckets of pre-padded tensors for `PaddedBucketDataLoader`.
+
+    Records are sorted by sequence length and split into `n_buckets` buckets with equal number of records.
+    Each bucket is collated once with `collate_feature_dict` and saved with `torch.save` as `bucket_{i}.pt`.
+    Buckets with more than `max_bucket_records` records are split into several files to limit memory.
+
+    Args:
+        data: map-style dataset, list or iterable with feature dicts
+        path: output directory. It shouldn't contain buckets from previous save
+        n_buckets: number of length buckets
+        max_bucket_records: max number of records in one bucket file
+
+    """
+    if not hasattr(data, '__getitem__') or not hasattr(data, '__len__'):
+        data = list(data)
+    seq_lens = get_dataset_seq_lens(data)
+    order = np.argsort(seq_lens, kind='stable')
+    if len(glob(os.path.join(path, 'bucket_*.pt'))) > 0:
+        raise AttributeError(f'Buckets already exist in "{path}". Remove them or use other directory')
+    os.makedirs(path, exist_ok=True)
+
+    n_files = 0
+    for bucket in np.array_split(order, min(n_buckets, max(len(order), 1))):
+        for start in range(0, len(bucket), max_bucket_records):
+            index = bucket[start:start + max_bucket_records]
+            pb = collate_feature_dict([data[i] for i in index])
+            torch.save({
+                'payload': pb.payload,
+                'seq_lens': pb.seq_lens,
+                'index': torch.from_numpy(index.astype(np.int64)),
+            }, os.path.join(path, f'bucket_{n_files:05d}.pt'))
+            n_files += 1
+    logger.info(f'Saved {len(order)} records in {n_files} buckets to "{path}"')
+
+
+class PaddedBucketDataLoader:
+    """A DataLoader-like object which yields `PaddedBatch` slices from pre-padded buckets
+    saved with `save_padded_buckets`. There is no per-sample python work and no collation.
+
+    Records in bucket are sorted by length, so each batch is a contiguous slice of bucket tensors,
+    sequential features are trimmed to max length in batch.
+    Use it for repeated inference or evaluation over the same data.
+
+    Parameters
+        path: directory with buckets
+        batch_size: number of records in batch
+        shuffle: shuffle batch order. Records in batch are always neighbours by length
+        mmap: load bucket tensors with memory mapping, data is read on first access.
+            Requires torch >= 2.1, buckets are loaded into memory with older versions
+
+    Examples:
+        >>> save_padded_buckets(valid_data, 'data/valid_buckets')
+        >>> dl = PaddedBucketDataLoader('data/valid_buckets', batch_size=512)
+        >>> embeddings = torch.cat(trainer.predict(inference_module, dl))
+        >>> embeddings = embeddings[torch.argsort(dl.get_index())]  # restore dataset order
+    """
+    def __init__(self, path: str, batch_size: int = 32, shuffle: bool = False, mmap: bool = True):
+        self.path = path
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        file_names = sorted(glob(os.path.join(path, 'bucket_*.pt')))
+        if len(file_names) == 0:
+            raise AttributeError(f'Buckets are not found in "{path}"')
+        self.buckets = [load_bucket(f, mmap) for f in file_names]
+        self.batches = [(i, start) for i, bucket in enumerate(self.buckets)
+                        for start in range(0, len(bucket['seq_lens']), batch_size)]
+
+    def __len__(self):
+        return len(self.batches)
+
+    def get_index(self) -> torch.Tensor:
+        """Dataset indexes of records in iteration order without shuffle"""
+        return torch.cat([bucket['index'] for bucket in self.buckets])
+
+    def get_batch(self, bucket_id: int, start: int) -> PaddedBatch:
+        bucket = self.buckets[bucket_id]
+        end = start + self.batch_size
+        seq_lens = bucket['seq_lens'][start:end]
+        max_len = int(seq_lens.max()) if len(seq_lens) > 0 else 0
+        payload = {}
+        for k, v in bucket['payload'].items():
+            v = v[start:end]
+            if type(v) is torch.Tensor and PaddedBatch.is_seq_feature(k, v):
+                v = v[:, :max_len]
+            payload[k] = v
+        return PaddedBatch(payload, seq_lens)
+
+    def __iter__(self):
+        batches = self.batches
+        if self.shuffle:
+            batches = [batches[i] for i in torch.randperm(len(batches)).tolist()]
+        for bucket_id, start in batches:
+            yield self.get_batch(bucket_id, start)
@@ -9,6 +9,8 @@ logger = logging.getLogger(__name__)
 
 
 class FilterDataset(torch.utils.data.IterableDataset):
+    runtime_attributes = ('rs', '_worker_id', '_num_workers', '_shuffle_seed', '_schema')
+
     def __init__(self, dataset,
                  post_processing=None,
                  shuffle_files=False,
@@ -68,6 +68,14 @@ class FeaturePreprocessing(IterableProcessingDataset):
             return False
         return k in self._keep_feature_names
 
+    def is_drop(self, k: str, is_seq: bool) -> bool:
+        """Feature `k` is removed by `FeatureFilter` mode. `is_seq` tells if it's a sequential feature"""
+        if self.is_keep(k):
+            return False
+        if self._drop_feature_names is not None and k in self._drop_feature_names:
+            return True
+        return self._drop_non_iterable and not is_seq
+
     def process_feature_rename(self, features: dict) -> dict:
         return {self._feature_names.get(k, k): v for k, v in features.items()}
 
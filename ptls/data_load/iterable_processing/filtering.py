@@ -2,6 +2,7 @@ import pandas as pd
 from ptls.data_load.iterable_processing_dataset import IterableProcessingDataset
 from ptls.data_load.augmentations.seq_len_limit import SeqLenLimit
 import numpy as np
+import pyarrow.compute as pc
 import torch
 
 
@@ -83,6 +84,48 @@ class Filtering(IterableProcessingDataset):
             else:
                 raise ValueError("Unsupported mode")
 
+    def required_columns(self) -> list:
+        """Columns which are read by `IdFilter` and `SeqLenFilter` modes"""
+        if self.mode == 'IdFilter':
+            return [self._id_col]
+        if self.mode == 'SeqLenFilter':
+            return [c for c in (self._seq_len_col, self._sequence_col) if c is not None]
+        return []
+
+    def to_arrow_filter(self, column_names: list, default_sequence_col: str = None):
+        """`pyarrow.dataset.Expression` which keeps the same records as `IdFilter` and `SeqLenFilter` modes.
+
+        Args:
+            column_names: names of available columns
+            default_sequence_col: list column which is used for length when `seq_len_col` and `sequence_col` aren't set
+
+        Returns:
+            expression or None when filter can't be expressed with available columns
+        """
+        if self.mode == 'IdFilter':
+            if self._id_col not in column_names:
+                return None
+            return pc.field(self._id_col).isin(list(self._relevant_ids))
+
+        if self.mode == 'SeqLenFilter':
+            if self._seq_len_col is not None:
+                if self._seq_len_col not in column_names:
+                    return None
+                seq_len = pc.field(self._seq_len_col)
+            else:
+                seq_col = self._sequence_col if self._sequence_col is not None else default_sequence_col
+                if seq_col is None or seq_col not in column_names:
+                    return None
+                seq_len = pc.list_value_length(pc.field(seq_col))
+            expression = None
+            if self._min_seq_len is not None:
+                expression = seq_len >= self._min_seq_len
+            if self._max_seq_len is not None:
+                e = seq_len <= self._max_seq_len
+                expression = e if expression is None else expression & e
+            return expression
+        return None
+
     def _is_in_relevant_ids_with_type(self, _id):
         if type(_id) is not self._id_type:
             raise TypeError(f'Type mismatch when id check. {type(_id)} found in sequence, '
@@ -1,42 +1,110 @@
-from itertools import islice
+from typing import Iterable
+
 import numpy as np
+import torch
+
 from ptls.data_load.iterable_processing_dataset import IterableProcessingDataset
 
 
+def get_shuffle_rng(seed: int = None, epoch: int = 0) -> np.random.Generator:
+    """Random generator for current DataLoader worker and epoch.
+
+    When `seed` is None, torch worker seed is used in worker process. It's different for each worker and epoch
+    and it's reproducible after `torch.manual_seed`. Global numpy random state is used in main process.
+    When `seed` is set, generator is derived from `(seed, worker_id, epoch)`.
+    """
+    worker_info = torch.utils.data.get_worker_info()
+    worker_id = 0 if worker_info is None else worker_info.id
+    if seed is None:
+        if worker_info is not None:
+            return np.random.default_rng(worker_info.seed)
+        seed = np.random.randint(2 ** 32)
+    return np.random.default_rng(np.random.SeedSequence([seed, worker_id, epoch]))
+
+
+def interleave(sources: Iterable[Iterable], n_open: int, rng: np.random.Generator):
+    """Yield items from `n_open` simultaneously open sources in random order.
+    Next source is opened when one of them is exhausted. Sources are opened lazily, in the given order.
+
+    Args:
+        sources: iterable of iterables, e.g. generators which read files
+        n_open: number of simultaneously open sources
+        rng: random generator
+
+    """
+    sources = iter(sources)
+    active = []
+    for source in sources:
+        active.append(iter(source))
+        if len(active) >= n_open:
+            break
+    while len(active) > 0:
+        i = rng.integers(len(active))
+        try:
+            yield next(active[i])
+        except StopIteration:
+            next_source = next(sources, None)
+            if next_source is None:
+                active[i] = active[-1]
+                active.pop()
+            else:
+                active[i] = iter(next_source)
+
+
 class IterableShuffle(IterableProcessingDataset):
     """
-    Shuffle records in the buffer and yield them in random order. Buffer is filled with records
-    from the source iterator. When buffer is empty, the iterator is exhausted. Buffer is refilled
-    with records from the source iterator and the process is repeated.
+    Shuffle records with a fixed size reservoir buffer. Buffer is filled with first `buffer_size` records.
+    Then each new record replaces a random record from the buffer, which is yielded.
+    Insert and evict are O(1), buffer is preallocated. Rest of the buffer is shuffled and yielded
+    when source is exhausted.
+
+    Random generator is derived with `get_shuffle_rng`, so each worker and epoch has its own order.
 
     Args:
         buffer_size: buffer size in records
+        seed: random seed. Order depends on `(seed, worker_id, epoch)` when set.
+            Torch worker seed is used when None.
+
+    Epoch is a number of iterations over this object since the last `set_epoch` call.
+    DataLoader workers iterate over their own copy of the object, and non-persistent workers are recreated
+    each epoch, so the local counter is lost. Call `set_epoch` in main process before each epoch to change order
+    with explicit seed and non-persistent workers. `ptls.frames.dataset_epoch.DatasetEpochCallback` does it
+    for lightning training, `ParquetDataset.set_epoch` forwards epoch to its `i_filters`.
 
     """
-    def __init__(self, buffer_size: int):
+    runtime_attributes = ('_epoch',)
+
+    def __init__(self, buffer_size: int, seed: int = None):
         super().__init__()
 
-        assert buffer_size > 1  # we will split buffer into two parts
+        assert buffer_size > 1
         self._buffer_size = buffer_size
+        self._seed = seed
+        self._epoch = 0
+
+    def set_epoch(self, epoch: int):
+        self._epoch = epoch
 
     def __iter__(self):
-        source = iter(self._src)
-        buffer = np.array([])
-        while True:
-            new_buffer_size = self._buffer_size - len(buffer)
-            new_buffer_list = list(islice(source, new_buffer_size))
-            new_buffer = np.empty(len(new_buffer_list), dtype=object)
-            new_buffer[:] = new_buffer_list
-            buffer = np.concatenate([buffer, new_buffer])
-            if len(buffer) == 0:
-                break
-
-            window_size = min(len(buffer), self._buffer_size // 2)
-            ix_for_choice = np.random.choice(len(buffer), window_size, replace=False)
-
-            for idx in ix_for_choice:
-                yield buffer[idx]
-
-            mask_selected = np.zeros(len(buffer), dtype=bool)
-            mask_selected[ix_for_choice] = True
-            buffer = buffer[~mask_selected]
+        rng = get_shuffle_rng(self._seed, self._epoch)
+        self._epoch += 1
+
+        buffer = [None] * self._buffer_size
+        n = 0
+        ix_block = rng.integers(self._buffer_size, size=self._buffer_size)
+        ix_pos = 0
+        for rec in self._src:
+            if n < self._buffer_size:
+                buffer[n] = rec
+                n += 1
+                continue
+            if ix_pos == len(ix_block):
+                ix_block = rng.integers(self._buffer_size, size=self._buffer_size)
+                ix_pos = 0
+            ix = ix_block[ix_pos]
+            ix_pos += 1
+            yield buffer[ix]
+            buffer[ix] = rec
+
+        for ix in rng.permutation(n):
+            yield buffer[ix]
@@ -3,10 +3,13 @@ from ptls.data_load.feature_dict import FeatureDict
 
 
 class IterableProcessingDataset(FeatureDict, IterableDataset):
+    runtime_attributes = ('_src', '_found_sequence_col')
+
     def __init__(self):
         super().__init__()
         self._src = None
         self._sequence_col = None
+        self._found_sequence_col = None
 
     def __call__(self, src):
         self._src = src
@@ -30,9 +33,11 @@ class IterableProcessingDataset(FeatureDict, IterableDataset):
         raise NotImplementedError()
 
     def get_sequence_col(self, rec):
-        if self._sequence_col is None:
+        if self._sequence_col is not None:
+            return self._sequence_col
+        if self._found_sequence_col is None:
             arrays = [k for k, v in rec.items() if self.is_seq_feature(k, v)]
             if len(arrays) == 0:
                 raise ValueError(f'Can not find field with sequence from record: {rec}')
-            self._sequence_col = arrays[0]
-        return self._sequence_col
+            self._found_sequence_col = arrays[0]
+        return self._found_sequence_col
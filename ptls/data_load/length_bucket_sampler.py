@@ -0,0 +1,202 @@
+import logging
+from typing import List, Union
+
+import numpy as np
+import torch
+import torch.distributed as dist
+from torch.utils.data import Sampler
+
+from ptls.data_load.feature_dict import FeatureDict
+
+logger = logging.getLogger(__name__)
+
+
+def get_dataset_seq_lens(dataset) -> np.ndarray:
+    """Sequence lengths of map-style dataset records.
+
+    Wrappers like `ColesDataset`, `MapSplittingDataset` or `MapAugmentationDataset` are unwrapped
+    to the source data with feature dicts, so splits and augmentations aren't applied.
+    Lengths are calculated with `FeatureDict.get_seq_len` or taken from `dataset.get_seq_lens()` when available.
+
+    Args:
+        dataset: map-style dataset or list with feature dicts or (feature dict, target) tuples
+
+    Returns:
+        np.ndarray with length of each record
+    """
+    if hasattr(dataset, 'get_seq_lens'):
+        return np.asarray(dataset.get_seq_lens(), dtype=np.int64)
+    for attr in ('data', 'base_dataset'):
+        if hasattr(dataset, attr):
+            return get_dataset_seq_lens(getattr(dataset, attr))
+
+    def _seq_len(rec):
+        if isinstance(rec, tuple):
+            rec = rec[0]  # (features, target) records
+        return FeatureDict.get_seq_len(rec)
+
+    return np.array([_seq_len(dataset[i]) for i in range(len(dataset))], dtype=np.int64)
+
+
+class LengthBucketBatchSampler(Sampler):
+    """Batch sampler which groups samples with similar sequence length.
+
+    Samples are shuffled, then split into buckets of `bucket_size` samples.
+    Samples in bucket are sorted by length and packed into batches with `max_tokens` budget,
+    the budget is counted for padded batch: `len(batch) * max(seq_len in batch) <= max_tokens`.
+    Batch order is shuffled too. Shuffling is reproducible, it depends on `seed` and epoch number.
+    Call `set_epoch` before each epoch to change shuffling, pytorch-lightning does it automatically.
+
+    With DDP each rank takes every `num_replicas`-th batch.
+    All ranks get the same number of batches, the tail is dropped or padded with first batches.
+    Use `Trainer(use_distributed_sampler=False)` (`Trainer(replace_sampler_ddp=False)` for pytorch-lightning < 2.0)
+    so lightning doesn't replace the sampler.
+
+    Args:
+        seq_lens: sequence length for each sample in dataset
+        max_tokens: token budget for padded batch. Long sequences are placed in a batch alone
+        batch_size: max number of samples in batch. Not limited when None
+        bucket_size: number of samples which are sorted together. Smaller buckets gives more random batches
+        shuffle: shuffle samples and batches. Samples are sorted by length only when False
+        seed: random seed for shuffle
+        drop_last: like in DataLoader, drop the last incomplete batch. It's the last batch of the last bucket when it
+            isn't limited by `max_tokens` or `batch_size`. Also drop tail batches which can't be split
+            over all DDP ranks. Pad with first batches when False
+        num_replicas: number of DDP processes. Taken from `torch.distributed` when None
+        rank: DDP rank of current process. Taken from `torch.distributed` when None
+
+    Examples:
+        >>> dataset = ColesDataset(data, splitter)
+        >>> sampler = LengthBucketBatchSampler(get_dataset_seq_lens(dataset), max_tokens=64 * 512)
+        >>> dl = DataLoader(dataset, batch_sampler=sampler, collate_fn=dataset.collate_fn)
+
+    """
+    def __init__(self,
+                 seq_lens: Union[np.ndarray, List[int]],
+                 max_tokens: int,
+                 batch_size: int = None,
+                 bucket_size: int = 10000,
+                 shuffle: bool = True,
+                 seed: int = 42,
+                 drop_last: bool = False,
+                 num_replicas: int = None,
+                 rank: int = None,
+                 ):
+        self.seq_lens = np.asarray(seq_lens, dtype=np.int64)
+        self.max_tokens = max_tokens
+        self.batch_size = batch_size
+        self.bucket_size = bucket_size
+        self.shuffle = shuffle
+        self.seed = seed
+        self.drop_last = drop_last
+        self.num_replicas = num_replicas
+        self.rank = rank
+
+        self.epoch = 0
+        self._batches = None
+
+    def set_epoch(self, epoch: int):
+        if epoch != self.epoch:
+            self.epoch = epoch
+            self._batches = None
+
+    def _get_replicas(self):
+        num_replicas, rank = self.num_replicas, self.rank
+        if num_replicas is None:
+            num_replicas = dist.get_world_size() if dist.is_available() and dist.is_initialized() else 1
+        if rank is None:
+            rank = dist.get_rank() if dist.is_available() and dist.is_initialized() else 0
+        return num_replicas, rank
+
+    def _is_full(self, batch: np.ndarray):
+        """Batch can't take one more sample of the same length"""
+        max_len = max(self.seq_lens[batch].max(), 1)
+        return (len(batch) + 1) * max_len > self.max_tokens or \
+            (self.batch_size is not None and len(batch) >= self.batch_size)
+
+    def _pack_bucket(self, bucket: np.ndarray):
+        """Split indexes sorted by length into batches with token budget"""
+        batches = []
+        start = 0
+        batch_max_len = 0
+        for i, ix in enumerate(bucket):
+            seq_len = max(self.seq_lens[ix], 1)
+            new_max_len = max(batch_max_len, seq_len)
+            size = i - start
+            is_full = size > 0 and (
+                (size + 1) * new_max_len > self.max_tokens or
+                (self.batch_size is not None and size >= self.batch_size)
+            )
+            if is_full:
+                batches.append(bucket[start:i])
+                start = i
+                new_max_len = seq_len
+            batch_max_len = new_max_len
+        if start < len(bucket):
+            batches.append(bucket[start:])
+        return batches
+
+    def _plan_batches(self):
+        rs = np.random.RandomState((self.seed + self.epoch) % 2 ** 32)
+        if self.shuffle:
+            indexes = rs.permutation(len(self.seq_lens))
+        else:
+            indexes = np.arange(len(self.seq_lens))
+
+        batches = []
+        for start in range(0, len(indexes), self.bucket_size):
+            bucket = indexes[start:start + self.bucket_size]
+            bucket = bucket[np.argsort(self.seq_lens[bucket], kind='stable')]
+            batches.extend(self._pack_bucket(bucket))
+        if self.drop_last and len(batches) > 0 and not self._is_full(batches[-1]):
+            batches.pop()
+
+        if self.shuffle:
+            batches = [batches[i] for i in rs.permutation(len(batches))]
+
+        num_replicas, rank = self._get_replicas()
+        if num_replicas > 1:
+            if self.drop_last:
+                batches = batches[:len(batches) - len(batches) % num_replicas]
+            else:
+                pad_size = (num_replicas - len(batches) % num_replicas) % num_replicas
+                batches = batches + batches[:pad_size]
+            batches = batches[rank::num_replicas]
+        return [b.tolist() for b in batches]
+
+    def __iter__(self):
+        if self._batches is None:
+            self._batches = self._plan_batches()
+        return iter(self._batches)
+
+    def __len__(self):
+        if self._batches is None:
+            self._batches = self._plan_batches()
+        return len(self._batches)
+
+
+def loader_batching_kwargs(dataset,
+                           batch_size: int,
+                           max_tokens: int = None,
+                           shuffle: bool = False,
+                           drop_last: bool = False,
+                           **sampler_kwargs):
+    """Batching arguments for `torch.utils.data.DataLoader`.
+
+    Returns `batch_sampler` with `LengthBucketBatchSampler` when `max_tokens` is set and dataset is map-style.
+    Returns plain `batch_size`, `shuffle` and `drop_last` otherwise.
+    """
+    if max_tokens is None or isinstance(dataset, torch.utils.data.IterableDataset):
+        if max_tokens is not None:
+            logger.warning('`max_tokens` is ignored for IterableDataset')
+        return dict(batch_size=batch_size, shuffle=shuffle, drop_last=drop_last)
+
+    sampler = LengthBucketBatchSampler(
+        get_dataset_seq_lens(dataset),
+        max_tokens=max_tokens,
+        batch_size=batch_size,
+        shuffle=shuffle,
+        drop_last=drop_last,
+        **sampler_kwargs,
+    )
+    return dict(batch_sampler=sampler)
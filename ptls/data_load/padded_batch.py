@@ -5,6 +5,58 @@ import torch
 
 from ptls.data_load.feature_dict import FeatureDict
 
+ARENA_ALIGNMENT = 64
+
+
+def _arena_slots(payload, length):
+    """`(slot, tensor)` pairs which are packed into arena. Slot is a payload key, `None` for tensor payload
+    and `...` for length"""
+    slots = [(..., length)]
+    if type(payload) is dict:
+        slots.extend((k, v) for k, v in payload.items() if type(v) is torch.Tensor)
+    elif type(payload) is torch.Tensor:
+        slots.append((None, payload))
+    return slots
+
+
+def _arena_views(arena: torch.Tensor, header):
+    return {slot: arena[offset:offset + nbytes].view(dtype).view(shape)
+            for slot, dtype, shape, offset, nbytes in header}
+
+
+def _pack_arena(payload, length):
+    """Copy all tensors into one contiguous uint8 arena. Tensors are grouped by dtype,
+    each one is aligned to `ARENA_ALIGNMENT` bytes.
+
+    Returns:
+        arena tensor and header with `(slot, dtype, shape, offset, nbytes)` for each tensor
+    """
+    slots = sorted(_arena_slots(payload, length), key=lambda item: str(item[1].dtype))
+    header = []
+    offset = 0
+    for slot, v in slots:
+        nbytes = v.numel() * v.element_size()
+        header.append((slot, v.dtype, tuple(v.size()), offset, nbytes))
+        offset += (nbytes + ARENA_ALIGNMENT - 1) // ARENA_ALIGNMENT * ARENA_ALIGNMENT
+    arena = torch.empty(offset, dtype=torch.uint8)
+    for (slot, v), (_, dtype, shape, offset, nbytes) in zip(slots, header):
+        if nbytes > 0:
+            arena[offset:offset + nbytes].copy_(v.detach().reshape(-1).view(torch.uint8))
+    return arena, header
+
+
+def _rebuild_padded_batch(arena, header, payload_rest):
+    """Unpickle `PaddedBatch` from arena. Tensors are views over arena, nothing is copied
+    """
+    views = _arena_views(arena, header)
+    if None in views:
+        payload = views[None]
+    else:
+        payload = {k: views[k] if k in views else v for k, v in payload_rest.items()}
+    pb = PaddedBatch(payload, views[...])
+    pb._arena = (arena, header, views)
+    return pb
+
 
 class PaddedBatch:
     """Contains a padded batch of sequences with different lengths.
@@ -71,10 +123,28 @@ class PaddedBatch:
         >>> # get all transaction flatten
         >>> torch.testing.assert_close(data.payload[data.seq_len_mask.bool()], torch.tensor([1, 2, 3, 4, 5, 6, 7, 8, 9]))
 
+    PaddedBatch is pickled with all tensors packed into one contiguous arena (grouped by dtype, with small header).
+    So a batch from DataLoader worker is one shared memory segment instead of one segment per feature.
+    Tensors of unpickled batch are zero-copy views over arena. `to` and `pin_memory` process arena
+    with a single operation, features which were replaced after unpickling are processed separately.
+    Batches with non-cpu tensors are pickled as is.
+
     """
     def __init__(self, payload: Dict[str, torch.Tensor], length: torch.LongTensor):
         self._payload = payload
         self._length = length
+        self._arena = None
+
+    def __reduce__(self):
+        slots = _arena_slots(self._payload, self._length)
+        if any(v.device.type != 'cpu' for _, v in slots):
+            return PaddedBatch, (self._payload, self._length)
+        arena, header = _pack_arena(self._payload, self._length)
+        if type(self._payload) is dict:
+            payload_rest = {k: None if type(v) is torch.Tensor else v for k, v in self._payload.items()}
+        else:
+            payload_rest = None
+        return _rebuild_padded_batch, (arena, header, payload_rest)
 
     @property
     def payload(self):
@@ -95,13 +165,40 @@ class PaddedBatch:
     def __len__(self):
         return len(self._length)
 
+    def _map_tensors(self, arena_func, tensor_func):
+        """New PaddedBatch with `arena_func` applied to arena once and `tensor_func` to other tensors
+        """
+        views, new_views = {}, {}
+        if self._arena is not None:
+            arena, header, views = self._arena
+            new_arena = arena_func(arena)
+            new_views = _arena_views(new_arena, header)
+
+        def apply(slot, v):
+            if type(v) is not torch.Tensor:
+                return v
+            if slot in views and views[slot] is v:
+                return new_views[slot]
+            return tensor_func(v)
+
+        if type(self._payload) is dict:
+            payload = {k: apply(k, v) for k, v in self._payload.items()}
+        else:
+            payload = apply(None, self._payload)
+        pb = PaddedBatch(payload, apply(..., self._length))
+        if self._arena is not None:
+            pb._arena = (new_arena, header, new_views)
+        return pb
+
     def to(self, device, non_blocking=False):
-        length = self._length.to(device=device, non_blocking=non_blocking)
-        payload = {
-            k: v.to(device=device, non_blocking=non_blocking) if type(v) is torch.Tensor else v
-            for k, v in self._payload.items()
-        }
-        return PaddedBatch(payload, length)
+        return self._map_tensors(
+            lambda v: v.to(device=device, non_blocking=non_blocking),
+            lambda v: v.to(device=device, non_blocking=non_blocking),
+        )
+
+    def pin_memory(self):
+        """Used by DataLoader with `pin_memory=True`"""
+        return self._map_tensors(lambda v: v.pin_memory(), lambda v: v.pin_memory())
 
     @property
     def seq_len_mask(self):
@@ -1,14 +1,18 @@
+import heapq
 import logging
 import os
 from collections import defaultdict, Counter
-from itertools import chain
+from glob import glob
+from itertools import chain, groupby
 from pydoc import locate
 
 import numpy as np
+import pyarrow.parquet as pq
 import torch
 from torch.utils.data import DataLoader
 
 from ptls.data_load import read_pyarrow_file
+from ptls.data_load.datasets.parquet_dataset import iter_pyarrow_table_records
 from ptls.data_load.utils import init_worker
 
 logger = logging.getLogger(__name__)
@@ -81,7 +85,7 @@ class PartitionedDataFiles:
         dt_parts = [dt_parts[i] for i in dt_dates_sort_ix]
         dt_dates = dt_dates[dt_dates_sort_ix]
 
-        mask = np.ones_like(dt_dates, dtype=np.bool)
+        mask = np.ones_like(dt_dates, dtype=bool)
         if self.dt_start is not None:
             mask &= dt_dates >= self.dt_start
         if self.dt_end is not None:
@@ -133,10 +137,17 @@ class PartitionedDataset(torch.utils.data.IterableDataset):
 
     `hash_id` is a value of `customer_id`. So if we have to collect all data for specific `customer_id`,
     we should calculate `hash_id = H` and get data from all month from `hash_id=H` subpartitions.
+
+    By default all clients of `hash_id=H` are collected in memory before the first one is yielded.
+    With `merge_sorted=True` each parquet file should be sorted by `col_id`. Files of all `mon` partitions
+    are read by row groups and merged by `col_id` (k-way merge), each client is yielded as soon as it's complete.
+    Memory is bounded by one row group per open file and one client. Clients are yielded in `col_id` order.
     """
+    runtime_attributes = ('rs', '_worker_id', '_num_workers', '_shuffle_seed', '_schema')
+
     def __init__(self, data_path, dt_parts, hash_parts,
                  col_id, file_level_processing=None, post_processing=None,
-                 shuffle_files=False, cache_schema=True, shuffle_seed=42):
+                 shuffle_files=False, cache_schema=True, shuffle_seed=42, merge_sorted=False):
         self.data_path = data_path
         self.dt_parts = dt_parts
         self.hash_parts = hash_parts
@@ -146,6 +157,7 @@ class PartitionedDataset(torch.utils.data.IterableDataset):
         self.shuffle_files = shuffle_files
         self.cache_schema = cache_schema
         self.shuffle_seed = shuffle_seed
+        self.merge_sorted = merge_sorted
         self.rs = None
 
         self._worker_id = None
@@ -168,7 +180,8 @@ class PartitionedDataset(torch.utils.data.IterableDataset):
             rs.shuffle(my_hashes)
 
         logger.debug(f'Iter [{self._worker_id:02d}/{self._num_workers:02d}]: {my_hashes}')
-        gen = chain(*[self.iter_hash(name) for name in my_hashes])
+        iter_hash = self.iter_hash_merge_sorted if self.merge_sorted else self.iter_hash
+        gen = chain(*[iter_hash(name) for name in my_hashes])
         if self.post_processing is not None:
             gen = self.post_processing(gen)
         return gen
@@ -194,6 +207,50 @@ class PartitionedDataset(torch.utils.data.IterableDataset):
         for cli_id, features in client_partitioned_data.items():
             yield self.join_features(features)
 
+    def iter_hash_merge_sorted(self, hash_part_name):
+        """Streaming k-way merge by `col_id` of all files for all dt_parts from hash.
+        Each file should be sorted by `col_id`. Records of one client are joined in dt_parts order.
+
+        :param hash_part_name:
+        :return:
+        """
+        logger.debug(f'[{self._worker_id:2d}/{self._num_workers}] Start merge hash {hash_part_name}')
+        sources = []
+        for dt_part in self.dt_parts:
+            path = os.path.join(self.data_path, dt_part, hash_part_name)
+            file_names = sorted(glob(os.path.join(path, '*.parquet'))) if os.path.isdir(path) else [path]
+            for file_name in file_names:
+                gen = self.iter_file_by_row_groups(file_name)
+                if self.file_level_processing is not None:
+                    gen = self.file_level_processing(gen)
+                sources.append(self._check_sorted(gen, file_name))
+
+        # `heapq.merge` is stable, so records with the same id are taken in sources order
+        merged = heapq.merge(*sources, key=lambda features: features[self.col_id])
+        for _id, features in groupby(merged, key=lambda features: features[self.col_id]):
+            yield self.join_features(list(features))
+
+    def _check_sorted(self, gen, file_name):
+        prev_id = None
+        for features in gen:
+            _id = features[self.col_id]
+            if prev_id is not None and _id < prev_id:
+                raise ValueError(f'File "{file_name}" is not sorted by "{self.col_id}". '
+                                 f'Found {_id} after {prev_id}. Sorted files are required with `merge_sorted=True`')
+            prev_id = _id
+            yield features
+
+    def iter_file_by_row_groups(self, file_name):
+        """Iterates over parquet file, only one row group is in memory
+
+        :param file_name:
+        :return: [(customer_id, features)]
+        """
+        logger.debug(f'[{self._worker_id}/{self._num_workers}] Iter file "{file_name}" by row groups')
+        pf = pq.ParquetFile(file_name)
+        for row_group in range(pf.num_row_groups):
+            yield from iter_pyarrow_table_records(pf.read_row_group(row_group, use_threads=True))
+
     def iter_file(self, file_name):
         """
 
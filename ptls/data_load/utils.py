@@ -1,5 +1,5 @@
 from collections import defaultdict
-from functools import partial, reduce
+from functools import partial
 
 import numpy as np
 import torch
@@ -66,7 +66,36 @@ def detect_transform_func(dict_tup):
 #     return PaddedBatch(collated, lengths)
 
 
-def collate_feature_dict(batch):
+def _pad_seq_features(batch, keys, pin_memory=False):
+    """Pad sequential tensor features. Features with the same dtype, trailing shape and sequence lengths
+    are grouped and padded into one preallocated (F, B, T, ...) tensor with a single masked assignment.
+
+    Returns dict with (B, T, ...) views, the same values as `pad_sequence(batch_first=True)` returns.
+    """
+    groups = defaultdict(list)
+    for k in keys:
+        v0 = batch[0][k]
+        lengths = tuple(x[k].shape[0] for x in batch)
+        groups[(v0.dtype, v0.size()[1:], lengths)].append(k)
+
+    pin_memory = pin_memory and torch.cuda.is_available()
+    res = {}
+    for (_, trailing_shape, lengths), group_keys in groups.items():
+        flat = torch.cat([x[k] for k in group_keys for x in batch])
+        lengths = torch.LongTensor(lengths)
+        max_len = lengths.max().item() if len(lengths) > 0 else 0
+        padded = torch.zeros((len(group_keys), len(batch), max_len, *trailing_shape),
+                             dtype=flat.dtype, pin_memory=pin_memory)
+        # flat positions of valid tokens in (F, B, T) layout, same order as `flat`
+        valid_ix = (torch.arange(max_len).unsqueeze(0) < lengths.unsqueeze(1)).view(-1).nonzero().squeeze(1)
+        feature_shift = torch.arange(len(group_keys)).unsqueeze(1) * (len(batch) * max_len)
+        padded.view(-1, *trailing_shape).index_copy_(0, (feature_shift + valid_ix.unsqueeze(0)).view(-1), flat)
+        for i, k in enumerate(group_keys):
+            res[k] = padded[i]
+    return res
+
+
+def collate_feature_dict(batch, pin_memory=False):
     """Collate feature with arrays to padded batch
 
     Check feature consistency. Keys for all batch samples should be the same.
@@ -76,27 +105,30 @@ def collate_feature_dict(batch):
     ----------
     batch:
         list with feature dicts
+    pin_memory:
+        allocate padded sequential features in pinned memory. Used when cuda is available.
     Returns
     -------
         PaddedBatch
     """
-    new_x_ = defaultdict(list)
-    for i, x in enumerate(batch):
-        for k, v in x.items():
-            new_x_[k].append(v)
-        assert reduce(
-            lambda a, b: ((a[1] is not None and a[1] == b or a[1] is None) and a[0], b),
-            map(len, new_x_.values()), (True, None))[0]
+    keys = list(batch[0].keys())
+    key_set = set(keys)
+    assert all(len(x) == len(keys) and key_set.issuperset(x.keys()) for x in batch)
 
     seq_col = next(k for k, v in batch[0].items() if FeatureDict.is_seq_feature(k, v))
     lengths = torch.LongTensor([len(rec[seq_col]) for rec in batch])
+
+    seq_tensor_keys = [k for k in keys if isinstance(batch[0][k], torch.Tensor) and not k.startswith('target')]
+    padded = _pad_seq_features(batch, seq_tensor_keys, pin_memory) if len(seq_tensor_keys) > 0 else {}
+
     new_x = {}
-    for k, v in new_x_.items():
+    for k in keys:
+        if k in padded:
+            new_x[k] = padded[k]
+            continue
+        v = [x[k] for x in batch]
         if isinstance(v[0], torch.Tensor):
-            if k.startswith('target'):
-                new_x[k] = torch.stack(v, dim=0)
-            else:
-                new_x[k] = torch.nn.utils.rnn.pad_sequence(v, batch_first=True)
+            new_x[k] = torch.stack(v, dim=0)
         elif isinstance(v[0], np.ndarray):
             new_x[k] = v  # list of arrays[object]
         elif isinstance(v[0], list):
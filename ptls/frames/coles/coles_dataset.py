@@ -2,10 +2,12 @@ from functools import reduce
 from operator import iadd
 
 import joblib
+import numpy as np
 import torch
 from joblib import Parallel, delayed
 
 from ptls.data_load.feature_dict import FeatureDict
+from ptls.data_load.padded_batch import PaddedBatch
 from ptls.data_load.utils import collate_feature_dict
 from ptls.frames.coles.split_strategy import AbsSplit
 
@@ -21,6 +23,10 @@ class ColesDataset(FeatureDict, torch.utils.data.Dataset):
         n_jobs: number of workers requested by the callers. 
             Passing n_jobs=-1 means requesting all available workers for instance matching the number of
             CPU cores on the worker host(s).
+        batch_split: split sequences in `collate_fn` with vectorized `splitter.split_batch`.
+            Dataset returns source feature dicts, `collate_fn` gathers all subsequences of all clients
+            into one `PaddedBatch` without per-subsequence dicts.
+            Only splitters with contiguous subsequences support it (`SampleSlices`, `SampleUniform`, ...)
     """
 
     def __init__(self,
@@ -28,6 +34,7 @@ class ColesDataset(FeatureDict, torch.utils.data.Dataset):
                  splitter: AbsSplit,
                  col_time: str = 'event_time',
                  n_jobs: int = 1,
+                 batch_split: bool = False,
                  *args,
                  **kwargs
                  ):
@@ -37,17 +44,27 @@ class ColesDataset(FeatureDict, torch.utils.data.Dataset):
         self.splitter = splitter
         self.col_time = col_time
         self.n_jobs = n_jobs
+        self.batch_split = batch_split
+        if batch_split:
+            if type(splitter).split_batch is AbsSplit.split_batch:
+                raise AttributeError(f'{splitter.__class__.__name__} does not support `batch_split`')
+            self.collate_fn = self.collate_batch_split
 
     def __len__(self):
         return len(self.data)
 
     def __getitem__(self, idx: int):
         feature_arrays = self.data[idx]
+        if self.batch_split:
+            return feature_arrays
         return self.get_splits(feature_arrays)
 
     def __iter__(self):
         for feature_arrays in self.data:
-            yield self.get_splits(feature_arrays)
+            if self.batch_split:
+                yield feature_arrays
+            else:
+                yield self.get_splits(feature_arrays)
 
     def _create_split_subset(self, idx, feature_arrays):
         return {k: v[idx] for k, v in feature_arrays.items() if not isinstance(v, int)}
@@ -68,6 +85,48 @@ class ColesDataset(FeatureDict, torch.utils.data.Dataset):
         padded_batch = collate_feature_dict(reduce(iadd, batch))
         return padded_batch, class_labels
 
+    def collate_batch_split(self, batch):
+        """Split and collate source feature dicts. Used as `collate_fn` when `batch_split=True`.
+
+        Sequential features of all clients are concatenated once, then all subsequences are taken
+        with a single (N, T) index tensor, where N = len(batch) * split_count.
+        Output is the same as `collate_fn` with `get_splits` for the same split positions,
+        sequential numpy features are converted to tensors.
+        """
+        seq_lens = np.array([len(rec[self.col_time]) for rec in batch], dtype=np.int64)
+        start_pos, lengths = self.splitter.split_batch(seq_lens)
+        B, split_count = start_pos.shape
+
+        offsets = np.concatenate([[0], np.cumsum(seq_lens)[:-1]])
+        start_pos = torch.from_numpy((start_pos + offsets.reshape(-1, 1)).reshape(-1))
+        lengths = torch.from_numpy(lengths.reshape(-1))
+        max_len = lengths.max().item() if len(lengths) > 0 else 0
+        ix = start_pos.unsqueeze(1) + torch.arange(max_len).unsqueeze(0)
+        # padding positions point to the extra zero element after all events
+        ix = torch.where(torch.arange(max_len).unsqueeze(0) < lengths.unsqueeze(1), ix, int(seq_lens.sum()))
+
+        class_labels = torch.arange(B).repeat_interleave(split_count)
+        payload = {}
+        for k, v in batch[0].items():
+            if isinstance(v, int):
+                continue  # dropped like in `_create_split_subset`
+            values = [rec[k] for rec in batch]
+            if self.is_seq_feature(k, v):
+                if isinstance(v, np.ndarray):
+                    values = [torch.from_numpy(x) for x in values]
+                flat = torch.cat(values + [values[0].new_zeros((1, *values[0].size()[1:]))])
+                payload[k] = flat[ix]
+            elif isinstance(v, torch.Tensor):
+                payload[k] = torch.stack(values)[class_labels]
+            else:
+                values = np.array(values)[class_labels.numpy()]
+                if values.dtype.kind == 'i':
+                    values = torch.from_numpy(values).long()
+                elif values.dtype.kind == 'f':
+                    values = torch.from_numpy(values).float()
+                payload[k] = values
+        return PaddedBatch(payload, lengths), class_labels
+
 
 class ColesIterableDataset(ColesDataset, torch.utils.data.IterableDataset):
     pass
@@ -1,14 +1,27 @@
 import logging
 
 import torch
-import numpy as np
 import torchmetrics
 
 
 logger = logging.getLogger(__name__)
 
 
-def outer_pairwise_distance(A: torch.tensor, B: torch.tensor = None):
+def _pairwise_distance_tile(A, B, A_sq, B_sq, self_offset=None, eps=1e-6):
+    """Euclidean distance with matrix multiplication: |a - b|^2 = |a|^2 + |b|^2 - 2 a.b
+
+    `self_offset` is the position of B tile in A when B is a part of A. Distance to itself is set to `eps`.
+    Squared distance is clamped to `eps ** 2` before `sqrt`, so distances are at least `eps` and gradient is finite
+    like in `F.pairwise_distance`.
+    """
+    d2 = torch.addmm(A_sq.unsqueeze(1) + B_sq.unsqueeze(0), A, B.t(), alpha=-2)
+    if self_offset is not None:
+        ix = torch.arange(B.size(0), device=d2.device)
+        d2[ix + self_offset, ix] = 0
+    return d2.clamp(min=eps ** 2).sqrt()
+
+
+def outer_pairwise_distance(A: torch.tensor, B: torch.tensor = None, max_size: int = 2 ** 26, eps: float = 1e-6):
     """
     Compute pairwise_distance of Tensors
         A (size(A) = n x d, where n - rows count, d - vector size) and
@@ -17,35 +30,95 @@ def outer_pairwise_distance(A: torch.tensor, B: torch.tensor = None):
 
     if only one Tensor was given, computer pairwise distance to itself (B = A)
 
+    Distance is computed with matrix multiplication over column tiles of B,
+    `n x m x d` intermediate tensor isn't created.
+
     Args:
         A: Tensor with size n x d
         B: Tensor with size m x d
+        max_size: max number of elements in intermediate `n x tile` tensors
+        eps: min distance, keeps `sqrt` gradient finite for equal rows
     """
-
+    is_self = B is None
     if B is None: B = A
 
-    max_size = 2 ** 26
     n = A.size(0)
     m = B.size(0)
-    d = A.size(1)
+    A_sq = A.pow(2).sum(dim=1)
+    B_sq = A_sq if is_self else B.pow(2).sum(dim=1)
 
-    if n * m * d <= max_size or m == 1:
+    tile_size = max(1, max_size // max(n, 1))
+    batch_results = []
+    for id_left in range(0, m, tile_size):
+        id_right = min(id_left + tile_size, m)
+        batch_results.append(_pairwise_distance_tile(A, B[id_left:id_right], A_sq, B_sq[id_left:id_right],
+                                                      self_offset=id_left if is_self else None, eps=eps))
+    return torch.cat(batch_results, dim=1) if len(batch_results) != 1 else batch_results[0]
 
-        return torch.pairwise_distance(
-            A[:, None].expand(n, m, d).reshape((-1, d)),
-            B.expand(n, m, d).reshape((-1, d))
-        ).reshape((n, m))
 
-    else:
+def outer_distance_topk(A: torch.tensor, B: torch.tensor = None, k: int = 1, metric: str = 'euclidean',
+                        labels_A: torch.tensor = None, labels_B: torch.tensor = None, max_size: int = 2 ** 26):
+    """
+    Find `k` nearest rows of A for each row of B without full `n x m` distance matrix.
+    B is processed by tiles, each tile is `tile x n` tensor with no more than `max_size` elements.
+    Used for neighbour search, returned distances aren't differentiable.
 
-        batch_size = max(1, max_size // (n * d))
-        batch_results = []
-        for i in range((m - 1) // batch_size + 1):
-            id_left = i * batch_size
-            id_rigth = min((i + 1) * batch_size, m)
-            batch_results.append(outer_pairwise_distance(A, B[id_left:id_rigth]))
+    If only one Tensor was given, nearest neighbours are searched in A itself (B = A), the row itself is excluded.
+    If labels are given, only rows with different labels are considered (hard negative mining).
+    Candidates which are excluded have `inf` distance, they are returned when there are less than `k` candidates.
 
-        return torch.cat(batch_results, dim=1)
+    Args:
+        A: Tensor with size n x d
+        B: Tensor with size m x d
+        k: number of nearest rows
+        metric: 'euclidean' or 'cosine'. Negative cosine similarity is used as a distance for 'cosine'
+        labels_A: Tensor with size n, labels of A rows
+        labels_B: Tensor with size m, labels of B rows. The same as `labels_A` when B is None
+        max_size: max number of elements in intermediate `tile x n` tensors
+
+    Returns:
+        tuple with distances and indexes of A rows, both with size k x m, like `topk(dim=0)` for `n x m` matrix
+    """
+    is_self = B is None
+    if B is None:
+        B = A
+        labels_B = labels_A
+
+    n = A.size(0)
+    m = B.size(0)
+    if metric not in ('euclidean', 'cosine'):
+        raise AttributeError(f'wrong metric "{metric}"')
+
+    with torch.no_grad():
+        if metric == 'euclidean':
+            # |b|^2 is constant for each row of tile, it's added to k nearest only
+            A_sq = A.pow(2).sum(dim=1).unsqueeze(0)
+        else:
+            A = A / A.norm(dim=1, keepdim=True)
+            B = A if is_self else B / B.norm(dim=1, keepdim=True)
+
+        tile_size = max(1, max_size // max(n, 1))
+        all_values, all_indices = [], []
+        for id_left in range(0, m, tile_size):
+            id_right = min(id_left + tile_size, m)
+            B_tile = B[id_left:id_right]
+            if metric == 'euclidean':
+                dist = torch.addmm(A_sq, B_tile, A.t(), alpha=-2)
+            else:
+                dist = torch.mm(B_tile, A.t()).neg_()
+
+            if labels_A is not None:
+                dist.masked_fill_(labels_B[id_left:id_right].view(-1, 1) == labels_A.view(1, -1), float('inf'))
+            if is_self:
+                ix = torch.arange(id_right - id_left, device=dist.device)
+                dist[ix, ix + id_left] = float('inf')
+
+            values, indices = dist.topk(min(k, n), dim=1, largest=False)
+            if metric == 'euclidean':
+                values = (values + B_tile.pow(2).sum(dim=1, keepdim=True)).clamp(min=0).sqrt()
+            all_values.append(values)
+            all_indices.append(indices)
+    return torch.cat(all_values, dim=0).t(), torch.cat(all_indices, dim=0).t()
 
 
 def outer_cosine_similarity(A, B=None):
@@ -83,52 +156,30 @@ def outer_cosine_similarity(A, B=None):
         return torch.cat(batch_results, dim=1)
 
 
-def metric_recall_top_K(X, y, K, metric='cosine'):
+def metric_recall_top_K(X, y, K, metric='cosine', max_size=2 ** 26):
     """
         calculate metric R@K
         X - tensor with size n x d, where n - number of examples, d - size of embedding vectors
         y - true labels
         N - count of closest examples, which we consider for recall calcualtion
         metric: 'cosine' / 'euclidean'.
-            !!! 'euclidean' - to slow for datasets bigger than 100K rows
+        max_size: max number of elements in intermediate distance tensors, see `outer_distance_topk`
     """
     # TODO: take K from `y`
-    res = []
-
-    n = X.size(0)
-    d = X.size(1)
-    max_size = 2 ** 32
-    batch_size = max(1, max_size // (n * d))
-
     with torch.no_grad():
+        values, indices = outer_distance_topk(X, k=K, metric=metric, max_size=max_size)
+        res = (y[indices] == y.view(1, -1)).sum().item()
 
-        for i in range(1 + (len(X) - 1) // batch_size):
-
-            id_left = i * batch_size
-            id_right = min((i + 1) * batch_size, len(y))
-            y_batch = y[id_left:id_right]
-
-            if metric == 'cosine':
-                pdist = -1 * outer_cosine_similarity(X, X[id_left:id_right])
-            elif metric == 'euclidean':
-                pdist = outer_pairwise_distance(X, X[id_left:id_right])
-            else:
-                raise AttributeError(f'wrong metric "{metric}"')
-
-            values, indices = pdist.topk(K + 1, 0, largest=False)
-
-            y_rep = y_batch.repeat(K, 1)
-            res.append((y[indices[1:]] == y_rep).sum().item())
-
-    return np.sum(res) / len(y) / K
+    return res / len(y) / K
 
 
 class BatchRecallTopK(torchmetrics.MeanMetric):
-    def __init__(self, K, metric='cosine'):
+    def __init__(self, K, metric='cosine', max_size=2 ** 26):
         super().__init__()
 
         self.k = K
         self.metric = metric
+        self.max_size = max_size
 
     def update(self, preds, target):
-        super().update(metric_recall_top_K(preds, target, self.k, self.metric))
+        super().update(metric_recall_top_K(preds, target, self.k, self.metric, self.max_size))
@@ -1,38 +1,58 @@
 import torch
 
 from ptls.frames.coles.sampling_strategies.pair_selector import PairSelector
-from ptls.frames.coles.metric import outer_pairwise_distance
+from ptls.frames.coles.metric import outer_distance_topk
 
 
 class HardNegativePairSelector(PairSelector):
     """
     Generates all possible possitive pairs given labels and
          neg_count hardest negative example for each example
+
+    Dense `n x n` matrices aren't created, so it works with large distributed batches.
+    Negatives are mined with `outer_distance_topk` by tiles,
+    `max_size` limits the number of elements in one `tile x n` distance tensor.
     """
 
-    def __init__(self, neg_count=1):
+    def __init__(self, neg_count=1, max_size=2 ** 26):
         super().__init__()
         self.neg_count = neg_count
+        self.max_size = max_size
+
+    @staticmethod
+    def get_positive_pairs(labels):
+        """All pairs (i, j), i < j, with the same label, in lexicographical order.
+        Pairs are generated in label-sorted order by shift, only `max(class size)` shifts are required.
+        """
+        n = labels.size(0)
+        sorted_labels, order = labels.sort(stable=True)
+        pairs = []
+        for shift in range(1, n):
+            is_same = sorted_labels[shift:] == sorted_labels[:-shift]
+            if not is_same.any():
+                break  # classes are contiguous after sort, larger shifts give no pairs too
+            ix = is_same.nonzero(as_tuple=True)[0]
+            pairs.append(torch.stack([order[ix], order[ix + shift]], dim=1))
+        if len(pairs) == 0:
+            return torch.zeros((0, 2), dtype=torch.long, device=labels.device)
+        pairs = torch.cat(pairs, dim=0)
+        pairs = torch.stack([pairs.min(dim=1).values, pairs.max(dim=1).values], dim=1)
+        return pairs[torch.argsort(pairs[:, 0] * n + pairs[:, 1])]
 
     def get_pairs(self, embeddings, labels):
-        # construct matrix x, such as x_ij == 0 <==> labels[i] == labels[j]
         n = labels.size(0)
-        x = labels.expand(n, n) - labels.expand(n, n).t()
 
         # positive pairs
-        positive_pairs = torch.triu((x == 0).int(), diagonal=1).nonzero(as_tuple=False)
+        positive_pairs = self.get_positive_pairs(labels)
 
         # hard negative minning
-        mat_distances = outer_pairwise_distance(embeddings.detach())  # pairwise_distance
-
-        upper_bound = int((2 * n) ** 0.5) + 1
-        mat_distances = ((upper_bound - mat_distances) * (x != 0).type(
-            mat_distances.dtype))  # filter: get only negative pairs
-
-        values, indices = mat_distances.topk(k=self.neg_count, dim=0, largest=True)
+        values, indices = outer_distance_topk(embeddings.detach(), k=self.neg_count,
+                                              labels_A=labels, max_size=self.max_size)
         negative_pairs = torch.stack([
-            torch.arange(0, n, dtype=indices.dtype, device=indices.device).repeat(self.neg_count),
+            torch.arange(0, n, dtype=indices.dtype, device=indices.device).repeat(indices.size(0)),
             torch.cat(indices.unbind(dim=0))
         ]).t()
+        # less than `neg_count` negatives are available for some examples
+        negative_pairs = negative_pairs[torch.cat(values.unbind(dim=0)).isfinite()]
 
-        return positive_pairs, negative_pairs
\ No newline at end of file
+        return positive_pairs, negative_pairs
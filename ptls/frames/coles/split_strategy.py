@@ -5,6 +5,18 @@ class AbsSplit:
     def split(self, dates):
         raise NotImplementedError()
 
+    def split_batch(self, seq_lens: np.ndarray):
+        """Vectorized split for all sequences in batch. Supported by splitters with contiguous subsequences.
+
+        Args:
+            seq_lens: (B,) array with sequence lengths
+
+        Returns:
+            tuple with `start` and `length` int arrays with shape (B, split_count).
+            Subsequence `j` of sequence `i` is `range(start[i, j], start[i, j] + length[i, j])`
+        """
+        raise NotImplementedError(f'{self.__class__.__name__} does not support batch split')
+
 
 class NoSplit(AbsSplit):
     def split(self, dates):
@@ -13,6 +25,10 @@ class NoSplit(AbsSplit):
 
         return [date_range]
 
+    def split_batch(self, seq_lens):
+        seq_lens = np.asarray(seq_lens, dtype=np.int64).reshape(-1, 1)
+        return np.zeros_like(seq_lens), seq_lens
+
 
 class SampleRandom(AbsSplit):
     def __init__(self, split_count, cnt_min, cnt_max):
@@ -122,6 +138,29 @@ class SampleSlices(AbsSplit):
         ix_sort = np.argsort(start_pos)
         return [date_range[s:s + l] for s, l in zip(start_pos[ix_sort], lengths[ix_sort])]
 
+    def split_batch(self, seq_lens):
+        seq_lens = np.asarray(seq_lens, dtype=np.int64)
+        B = len(seq_lens)
+        crop_lens = (seq_lens * self.short_seq_crop_rate).astype(np.int64)
+        # synchronized with `_validate_split_range`
+        only_one_fold = (seq_lens <= self.cnt_min) & (self.short_seq_crop_rate >= 1.0)
+        several_fold = (crop_lens <= self.cnt_min) & (self.short_seq_crop_rate < 1.0)
+
+        cnt_min = np.where(several_fold, crop_lens, self.cnt_min)
+        cnt_max = np.minimum(seq_lens, self.cnt_max)
+        # `only_one_fold` sequences get full length
+        cnt_min = np.where(only_one_fold, seq_lens, cnt_min)
+        cnt_max = np.where(only_one_fold, seq_lens, cnt_max)
+
+        lengths = np.random.randint(cnt_min.reshape(-1, 1), cnt_max.reshape(-1, 1) + 1, (B, self.split_count))
+        available_start_pos = (seq_lens.reshape(-1, 1) - lengths).clip(0, None)
+        start_pos = (np.random.rand(B, self.split_count) * (available_start_pos + 1 - 1e-9)).astype(np.int64)
+        if self.is_sorted:
+            ix_sort = np.argsort(start_pos, axis=1)
+            start_pos = np.take_along_axis(start_pos, ix_sort, axis=1)
+            lengths = np.take_along_axis(lengths, ix_sort, axis=1)
+        return start_pos, lengths
+
 
 class SampleUniform(AbsSplit):
     """
@@ -153,6 +192,15 @@ class SampleUniform(AbsSplit):
                                 self.split_count).round().astype(int)
         return [date_range[s:s + self.seq_len] for s in start_pos]
 
+    def split_batch(self, seq_lens):
+        seq_lens = np.asarray(seq_lens, dtype=np.int64).reshape(-1, 1)
+        is_short = seq_lens <= self.seq_len + self.split_count
+        start_pos = np.linspace(0, np.maximum(seq_lens - self.seq_len, 0), self.split_count, axis=1)
+        start_pos = start_pos.reshape(len(seq_lens), self.split_count).round().astype(np.int64)
+        start_pos = np.where(is_short, 0, start_pos)
+        lengths = np.where(is_short, seq_lens, self.seq_len).repeat(self.split_count, axis=1)
+        return start_pos, lengths
+
 
 class SampleUniformBySplitCount(AbsSplit):
     """
@@ -172,6 +220,13 @@ class SampleUniformBySplitCount(AbsSplit):
         date_range = np.arange(dates.shape[0])
         return np.array_split(date_range, self.split_count)
 
+    def split_batch(self, seq_lens):
+        seq_lens = np.asarray(seq_lens, dtype=np.int64).reshape(-1, 1)
+        # the same section sizes as `np.array_split`: first `seq_len % split_count` sections are longer
+        lengths = seq_lens // self.split_count + (np.arange(self.split_count) < seq_lens % self.split_count)
+        start_pos = np.cumsum(lengths, axis=1) - lengths
+        return start_pos, lengths
+
 
 class SplitByNextNearestTime(AbsSplit):
     """
@@ -0,0 +1,31 @@
+import pytorch_lightning as pl
+import torch
+
+
+def iter_datasets(dataloaders):
+    """Datasets of DataLoaders from `trainer.train_dataloader`, which can be a DataLoader, list or dict of them"""
+    if isinstance(dataloaders, torch.utils.data.DataLoader):
+        yield dataloaders.dataset
+    elif isinstance(dataloaders, dict):
+        for dl in dataloaders.values():
+            yield from iter_datasets(dl)
+    elif isinstance(dataloaders, (list, tuple)):
+        for dl in dataloaders:
+            yield from iter_datasets(dl)
+
+
+class DatasetEpochCallback(pl.Callback):
+    """Calls `set_epoch(trainer.current_epoch)` of train datasets before each epoch.
+
+    Lightning calls `set_epoch` for samplers only. Iterable datasets with random order, like `ParquetDataset`
+    with `interleave_files` or with `IterableShuffle` in `i_filters`, keep epoch counter in a worker copy
+    of the dataset, which is lost when non-persistent DataLoader workers are recreated.
+    This callback sets epoch in main process before DataLoader iterator is created.
+
+    Example:
+        >>> trainer = pl.Trainer(callbacks=[DatasetEpochCallback()])
+    """
+    def on_train_epoch_start(self, trainer, pl_module):
+        for dataset in iter_datasets(trainer.train_dataloader):
+            if callable(getattr(dataset, 'set_epoch', None)):
+                dataset.set_epoch(trainer.current_epoch)
@@ -0,0 +1,231 @@
+import json
+import logging
+import os
+
+import numpy as np
+import torch
+
+from ptls.data_load.padded_batch import PaddedBatch
+
+logger = logging.getLogger(__name__)
+
+
+class HiddenStateStore:
+    """On-disk store with rnn hidden states of clients. Used for incremental embedding calculation.
+
+    States are kept in a float16 matrix, mapped into memory with `np.memmap`.
+    Each client has one row with flatten hidden state and `watermark`,
+    the `event_time` of the last transaction which is included in the state.
+
+    Files in `path` directory:
+        - `states.f16`: float16 matrix with shape (capacity, state_size)
+        - `watermarks.f64`: float64 vector with shape (capacity,)
+        - `ids.npy`: client ids in row order
+        - `meta.json`: state shape, capacity and number of stored clients
+
+    Parameters
+        path:
+            store directory. Created if not exists
+        state_shape:
+            shape of the hidden state of one client, (num_layers, H) for `RnnEncoder`.
+            Required when new store is created, ignored for existing store
+        capacity:
+            initial number of rows. Store grows twice when rows are exhausted
+
+    Examples:
+        >>> store = HiddenStateStore('states/', state_shape=(1, 16))
+        >>> h_0, watermarks = store.get(ids)  # zeros and -inf for new clients
+        >>> store.put(ids, h_n, new_watermarks)
+        >>> store.flush()
+
+    """
+    def __init__(self, path: str, state_shape=None, capacity: int = 1024):
+        self.path = path
+        meta_path = os.path.join(path, 'meta.json')
+        if os.path.exists(meta_path):
+            with open(meta_path, 'r') as f:
+                meta = json.load(f)
+            self.state_shape = tuple(meta['state_shape'])
+            self.capacity = meta['capacity']
+            self.n_rows = meta['n_rows']
+            ids = np.load(os.path.join(path, 'ids.npy'), allow_pickle=True).tolist()
+            mode = 'r+'
+        else:
+            if state_shape is None:
+                raise AttributeError(f'`state_shape` is required for new store "{path}"')
+            os.makedirs(path, exist_ok=True)
+            self.state_shape = tuple(state_shape)
+            self.capacity = capacity
+            self.n_rows = 0
+            ids = []
+            mode = 'w+'
+
+        self.state_size = int(np.prod(self.state_shape))
+        self._ids = ids
+        self._index = {_id: i for i, _id in enumerate(ids)}
+        self._open(mode)
+        if mode == 'w+':
+            self._watermarks[:] = -np.inf
+
+    def _open(self, mode):
+        self._states = np.memmap(os.path.join(self.path, 'states.f16'), dtype=np.float16, mode=mode,
+                                 shape=(self.capacity, self.state_size))
+        self._watermarks = np.memmap(os.path.join(self.path, 'watermarks.f64'), dtype=np.float64, mode=mode,
+                                     shape=(self.capacity,))
+
+    def _grow(self, min_capacity):
+        new_capacity = max(self.capacity * 2, min_capacity)
+        self._states.flush()
+        self._watermarks.flush()
+        del self._states, self._watermarks
+        for name, item_size in [('states.f16', 2 * self.state_size), ('watermarks.f64', 8)]:
+            with open(os.path.join(self.path, name), 'r+b') as f:
+                f.truncate(new_capacity * item_size)
+        old_capacity, self.capacity = self.capacity, new_capacity
+        self._open('r+')
+        self._watermarks[old_capacity:] = -np.inf
+        logger.debug(f'HiddenStateStore "{self.path}" grows to {new_capacity} rows')
+
+    def __len__(self):
+        return self.n_rows
+
+    def __contains__(self, _id):
+        return _id in self._index
+
+    @staticmethod
+    def _to_list(ids):
+        if isinstance(ids, torch.Tensor):
+            ids = ids.cpu().numpy()
+        return np.asarray(ids).tolist()
+
+    def _rows(self, ids, insert=False):
+        ids = self._to_list(ids)
+        if insert:
+            new_ids = [_id for _id in dict.fromkeys(ids) if _id not in self._index]
+            if self.n_rows + len(new_ids) > self.capacity:
+                self._grow(self.n_rows + len(new_ids))
+            for _id in new_ids:
+                self._index[_id] = self.n_rows
+                self._ids.append(_id)
+                self.n_rows += 1
+        return np.array([self._index.get(_id, -1) for _id in ids], dtype=np.int64)
+
+    def get(self, ids):
+        """States and watermarks for clients.
+
+        Args:
+            ids: list, numpy array or tensor with client ids
+
+        Returns:
+            tuple with float32 states (B, *state_shape) and float64 watermarks (B,).
+            New clients have zero state and `-inf` watermark
+        """
+        rows = self._rows(ids)
+        is_known = rows >= 0
+        states = np.zeros((len(rows), self.state_size), dtype=np.float32)
+        watermarks = np.full(len(rows), -np.inf, dtype=np.float64)
+        states[is_known] = self._states[rows[is_known]]
+        watermarks[is_known] = self._watermarks[rows[is_known]]
+        return states.reshape(len(rows), *self.state_shape), watermarks
+
+    def put(self, ids, states, watermarks):
+        """Save states and watermarks. New clients are appended.
+
+        Args:
+            ids: list, numpy array or tensor with client ids
+            states: (B, *state_shape) tensor or numpy array
+            watermarks: (B,) tensor or numpy array
+        """
+        if isinstance(states, torch.Tensor):
+            states = states.detach().cpu().numpy()
+        if isinstance(watermarks, torch.Tensor):
+            watermarks = watermarks.detach().cpu().numpy()
+        rows = self._rows(ids, insert=True)
+        self._states[rows] = states.reshape(len(rows), self.state_size).astype(np.float16)
+        self._watermarks[rows] = watermarks
+
+    def flush(self):
+        """Flush memory-mapped data and write id index and meta
+        """
+        self._states.flush()
+        self._watermarks.flush()
+        np.save(os.path.join(self.path, 'ids.npy'), np.array(self._ids, dtype=object), allow_pickle=True)
+        with open(os.path.join(self.path, 'meta.json'), 'w') as f:
+            json.dump({'state_shape': list(self.state_shape), 'capacity': self.capacity, 'n_rows': self.n_rows}, f)
+
+
+class IncrementalRnnEncoder(torch.nn.Module):
+    """Wrapper for `RnnSeqEncoder` which updates embeddings with new transactions only.
+
+    For each client in batch the previous hidden state and watermark are loaded from `HiddenStateStore`.
+    Transactions with `event_time <= watermark` are removed from batch, the rest are processed by rnn
+    starting from the previous state. The updated state and watermark are written back to the store.
+    The cost of update depends on the number of new transactions, not on the full history length.
+
+    Input batch should contain the full or the latest part of client history, sorted by `col_time`,
+    and `col_id` feature. Output is the last layer hidden state, the same as `RnnSeqEncoder`
+    with `reducer='last_step', packed=True` over the full history.
+    Use it with `ptls.frames.inference_module.InferenceModule` in single process mode. Call `state_store.flush()`
+    after inference.
+
+    Parameters
+        seq_encoder:
+            `RnnSeqEncoder` with unidirectional gru
+        state_store:
+            `HiddenStateStore` with state_shape (num_layers, hidden_size)
+        col_id:
+            client id feature name
+        col_time:
+            event time feature name
+    """
+    def __init__(self, seq_encoder, state_store: HiddenStateStore, col_id='client_id', col_time='event_time'):
+        super().__init__()
+        self.seq_encoder = seq_encoder
+        self.state_store = state_store
+        self.col_id = col_id
+        self.col_time = col_time
+
+    @property
+    def is_reduce_sequence(self):
+        return True
+
+    @is_reduce_sequence.setter
+    def is_reduce_sequence(self, value):
+        if not value:
+            raise AttributeError('IncrementalRnnEncoder supports reduced output only')
+
+    @staticmethod
+    def select_new_events(x: PaddedBatch, event_time: torch.Tensor, watermarks: torch.Tensor) -> PaddedBatch:
+        """Shift new events (`event_time > watermark`) to the beginning of sequences.
+        Events are expected to be sorted by time, so new events are a tail of each sequence.
+        """
+        B, T = event_time.size()
+        mask = x.seq_len_mask.bool()
+        n_old = ((event_time.double() <= watermarks.unsqueeze(1)) & mask).sum(dim=1)
+        new_lens = x.seq_lens - n_old
+        ix = (torch.arange(T, device=x.device).unsqueeze(0) + n_old.unsqueeze(1)).clamp(max=T - 1)
+        new_mask = torch.arange(T, device=x.device).unsqueeze(0) < new_lens.unsqueeze(1)
+        payload = {}
+        for k, v in x.payload.items():
+            if x.is_seq_feature(k, v) and isinstance(v, torch.Tensor):
+                v = torch.gather(v, 1, ix.view(B, T, *[1] * (v.dim() - 2)).expand_as(v))
+                v = v * new_mask.view(B, T, *[1] * (v.dim() - 2)).to(v.dtype)
+            payload[k] = v
+        return PaddedBatch(payload, new_lens)
+
+    def forward(self, x: PaddedBatch):
+        ids = x.payload[self.col_id]
+        event_time = x.payload[self.col_time]
+        h_0, watermarks = self.state_store.get(ids)
+        h_0 = torch.from_numpy(h_0).to(x.device).transpose(0, 1).contiguous()
+        watermarks = torch.from_numpy(watermarks).to(x.device)
+
+        x_new = self.select_new_events(x, event_time, watermarks)
+        z = self.seq_encoder.trx_encoder(x_new)
+        h_n = self.seq_encoder.seq_encoder.forward_state(z, h_0)
+
+        mask = x.seq_len_mask.bool()
+        last_time = event_time.double().masked_fill(~mask, -np.inf).max(dim=1).values
+        new_watermarks = torch.where(x_new.seq_lens > 0, last_time, watermarks)
+        self.state_store.put(ids, h_n.transpose(0, 1), new_watermarks)
+        return h_n[-1]
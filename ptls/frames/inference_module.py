@@ -4,19 +4,67 @@ import pytorch_lightning as pl
 import torch
 import numpy as np
 import onnxruntime as ort
+import pyarrow as pa
 
 from itertools import chain
 from ptls.data_load.padded_batch import PaddedBatch
 
 
+def _to_numpy(v):
+    if type(v) is torch.Tensor:
+        return v.detach().cpu().numpy()
+    return v
+
+
+def _arrow_array(v: np.ndarray):
+    """Arrow array with one row for each item of first dimension. Trailing dimensions are fixed size lists"""
+    if type(v) is list or v.dtype.kind == 'O':
+        return pa.array(list(v))
+    flat = pa.array(np.ascontiguousarray(v).reshape(-1))
+    for size in reversed(v.shape[1:]):
+        flat = pa.FixedSizeListArray.from_arrays(flat, size)
+    return flat
+
+
+def _arrow_embedding_columns(k, v: np.ndarray, embedding_format):
+    """Columns for (N, H) embedding array"""
+    v = v.astype(np.float32, copy=False)
+    if v.ndim == 1:
+        return [k], [pa.array(v)]
+    if embedding_format == 'list':
+        return [k], [_arrow_array(v)]
+    if embedding_format == 'wide':
+        return [f'{k}_{j:04d}' for j in range(v.shape[1])], [pa.array(np.ascontiguousarray(v[:, j]))
+                                                             for j in range(v.shape[1])]
+    raise AttributeError(f'Unknown embedding_format: "{embedding_format}". "wide" or "list" expected')
+
+
 class InferenceModule(pl.LightningModule):
-    def __init__(self, model, pandas_output=True, drop_seq_features=True, model_out_name='out'):
+    """Inference wrapper for `trainer.predict`.
+
+    Parameters
+        model: model which takes `PaddedBatch`
+        pandas_output: return `pandas.DataFrame` for each batch
+        drop_seq_features: keep only scalar input features in output
+        model_out_name: name of model output column
+        arrow_output: return `pyarrow.RecordBatch` for each batch. It's built from whole batch tensors without
+            per-client python work. Rows are the same as `pandas_output` rows: one row per client
+            for reduced output and one row per valid step for sequential output.
+            Sequential input features are list columns in record mode. Used instead of `pandas_output` when True.
+        embedding_format: format of embedding columns for `arrow_output`.
+            'wide' - float32 column `{model_out_name}_{j:04d}` for each component, like `pandas_output`.
+            'list' - single fixed size list column.
+    """
+    def __init__(self, model, pandas_output=True, drop_seq_features=True, model_out_name='out',
+                 arrow_output=False, embedding_format='wide'):
         super().__init__()
 
         self.model = model
         self.pandas_output = pandas_output
         self.drop_seq_features = drop_seq_features
         self.model_out_name = model_out_name
+        self.arrow_output = arrow_output
+        self.embedding_format = embedding_format
 
     def forward(self, x: PaddedBatch):
         out = self.model(x)
@@ -25,10 +73,65 @@ class InferenceModule(pl.LightningModule):
             x[self.model_out_name] = out
         else:
             x.payload[self.model_out_name] = out
+        if self.arrow_output:
+            return self.to_arrow(x)
         if self.pandas_output:
             return self.to_pandas(x)
         return x
 
+    def to_arrow(self, x) -> pa.RecordBatch:
+        """Convert inference output into `pyarrow.RecordBatch`. Rows are the same as in `to_pandas`
+        """
+        len_mask = None
+        x_ = x
+        if type(x_) is PaddedBatch:
+            len_mask = x_.seq_len_mask.bool().cpu().numpy()
+            x_ = x_.payload
+        out = x_[self.model_out_name]
+        is_reduced = type(out) is not PaddedBatch
+        if not is_reduced:
+            len_mask = out.seq_len_mask.bool().cpu().numpy()
+
+        lengths, offsets = None, None
+        if len_mask is not None:
+            lengths = len_mask.sum(axis=1)
+            offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int32)
+
+        names, arrays = [], []
+        for k, v in x_.items():
+            if type(v) is PaddedBatch:
+                v = v.payload
+            v = _to_numpy(v)
+            is_scalar = type(v) is list or len(v.shape) == 1 or k.startswith('target')
+            is_embedding = not is_scalar and (len(v.shape) == 3 or k == self.model_out_name)
+
+            if is_scalar:
+                if not is_reduced:
+                    v = np.repeat(np.asarray(v, dtype=object) if type(v) is list else v, lengths, axis=0)
+                names.append(k)
+                arrays.append(_arrow_array(v))
+            elif not is_reduced:
+                # one row for each valid step
+                if is_embedding:
+                    col_names, col_arrays = _arrow_embedding_columns(k, v[len_mask], self.embedding_format)
+                    names.extend(col_names)
+                    arrays.extend(col_arrays)
+                else:
+                    names.append(k)
+                    arrays.append(_arrow_array(v[len_mask]))
+            elif k == self.model_out_name:
+                col_names, col_arrays = _arrow_embedding_columns(k, v, self.embedding_format)
+                names.extend(col_names)
+                arrays.extend(col_arrays)
+            elif len_mask is not None:
+                # list of valid steps for each client
+                names.append(k)
+                arrays.append(pa.ListArray.from_arrays(pa.array(offsets), _arrow_array(v[len_mask])))
+            else:
+                names.append(k)
+                arrays.append(_arrow_array(v))
+        return pa.RecordBatch.from_arrays(arrays, names=names)
+
     def to_pandas(self, x):
         is_reduced = None
         scalar_features, seq_features, expand_features = {}, {}, {}
@@ -123,7 +226,11 @@ class InferenceModule(pl.LightningModule):
 
 
 class InferenceModuleMultimodal(pl.LightningModule):
-    def __init__(self, model, pandas_output=True, drop_seq_features=True, model_out_name='out', col_id = 'epk_id'):
+    """Inference wrapper for multimodal models. Output has `col_id` and `model_out_name` columns.
+    See `InferenceModule` for `arrow_output` and `embedding_format`.
+    """
+    def __init__(self, model, pandas_output=True, drop_seq_features=True, model_out_name='out', col_id = 'epk_id',
+                 arrow_output=False, embedding_format='wide'):
         super().__init__()
 
         self.model = model
@@ -131,15 +238,32 @@ class InferenceModuleMultimodal(pl.LightningModule):
         self.drop_seq_features = drop_seq_features
         self.model_out_name = model_out_name
         self.col_id = col_id
+        self.arrow_output = arrow_output
+        self.embedding_format = embedding_format
 
     def forward(self, x: PaddedBatch):
         x, batch_ids = x
         out = self.model(x)
         x_out = {self.col_id : batch_ids, self.model_out_name: out}
+        if self.arrow_output:
+            return self.to_arrow(x_out)
         if self.pandas_output:
             return self.to_pandas(x_out)
         return x_out
 
+    def to_arrow(self, x) -> pa.RecordBatch:
+        names, arrays = [], []
+        for k, v in x.items():
+            v = _to_numpy(v)
+            if type(v) is not list and len(v.shape) == 2:
+                col_names, col_arrays = _arrow_embedding_columns(k, v, self.embedding_format)
+                names.extend(col_names)
+                arrays.extend(col_arrays)
+            else:
+                names.append(k)
+                arrays.append(_arrow_array(v))
+        return pa.RecordBatch.from_arrays(arrays, names=names)
+
     @staticmethod
     def to_pandas(x):
         expand_cols = []
@@ -0,0 +1,258 @@
+import logging
+import os
+from glob import glob
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import pytorch_lightning as pl
+import torch
+
+logger = logging.getLogger(__name__)
+
+FILE_EXTENSIONS = {'parquet': 'parquet', 'ipc': 'arrows'}
+
+
+class PredictionSink(pl.Callback):
+    """Writes `trainer.predict` outputs to disk batch by batch.
+
+    Outputs of `InferenceModule` (`pandas.DataFrame` or `pyarrow.RecordBatch` with `arrow_output=True`)
+    are buffered up to `row_group_size` rows and appended to a part file. Each rank writes its own files
+    `part-{rank}-{n}.{ext}` in `path` directory, so memory is bounded and nothing is gathered between ranks.
+    Use `trainer.predict(..., return_predictions=False)` so lightning doesn't keep outputs too.
+
+    Written rows survive job failure:
+        - 'ipc' format (Arrow IPC stream) is readable up to the last written row group.
+        - 'parquet' file is readable only when it's closed. Files are closed after `max_rows_per_file` rows,
+          so only the last file of each rank is lost.
+
+    Resume: with `resume=True` ids in `col_id` column of existing files are collected into `existing_ids`.
+    Use `skip_existing(dataset)` to drop these clients from input. Rows with existing ids are also dropped
+    before writing. Unreadable files from failed run are renamed to `_part-*.incomplete`,
+    so they are ignored by parquet dataset readers. All ranks scan the files, a file which is already renamed
+    by another rank is skipped.
+
+    Parameters
+        path: output directory
+        format: 'parquet' or 'ipc'
+        row_group_size: number of rows which are written together
+        max_rows_per_file: new part file is started after this number of rows. One file per rank when None,
+            such parquet file is unreadable after failure
+        resume: keep existing files and skip ids which are already written. Output directory should be empty
+            or not exist when False
+        col_id: client id column, used for resume
+
+    Examples:
+        >>> sink = PredictionSink('scores.parquet', resume=True, col_id='client_id')
+        >>> trainer = pl.Trainer(callbacks=[sink])
+        >>> trainer.predict(InferenceModule(model, arrow_output=True), sink.skip_existing(dataloader),
+        >>>                 return_predictions=False)
+        >>> df = pd.read_parquet('scores.parquet')
+    """
+    def __init__(self,
+                 path: str,
+                 format: str = 'parquet',
+                 row_group_size: int = 100000,
+                 max_rows_per_file: int = 1000000,
+                 resume: bool = False,
+                 col_id: str = None,
+                 ):
+        super().__init__()
+        if format not in FILE_EXTENSIONS:
+            raise AttributeError(f'Unknown format "{format}". One of {list(FILE_EXTENSIONS)} expected')
+        if resume and col_id is None:
+            raise AttributeError('`col_id` is required for resume')
+        self.path = path
+        self.format = format
+        self.row_group_size = row_group_size
+        self.max_rows_per_file = max_rows_per_file
+        self.resume = resume
+        self.col_id = col_id
+
+        self.existing_ids = None
+        self._existing_ids_array = None
+        self.n_rows = 0
+        self._rank = 0
+        self._buffer = []
+        self._buffer_rows = 0
+        self._writer = None
+        self._schema = None
+        self._file_rows = 0
+
+        if os.path.isdir(path) and len(self._part_files()) > 0:
+            if not resume:
+                raise AttributeError(f'Output "{path}" is not empty. Remove it or use `resume=True`')
+            self.existing_ids = self._read_existing_ids()
+            self._existing_ids_array = pa.array(list(self.existing_ids))
+            logger.info(f'Found {len(self.existing_ids)} existing ids in "{path}"')
+
+    def _part_files(self, rank=None):
+        rank = '*' if rank is None else f'{rank:05d}'
+        return sorted(glob(os.path.join(self.path, f'part-{rank}-*.{FILE_EXTENSIONS[self.format]}')))
+
+    def _read_file_ids(self, file_name):
+        if self.format == 'parquet':
+            return pq.read_table(file_name, columns=[self.col_id]).column(0)
+        chunks = []
+        with pa.OSFile(file_name, 'rb') as f:
+            reader = pa.ipc.open_stream(f)
+            try:
+                for rb in reader:
+                    chunks.append(rb.column(self.col_id))
+            except (pa.ArrowInvalid, OSError):
+                logger.warning(f'"{file_name}" is incomplete, rows after the last complete batch are lost')
+        return pa.chunked_array(chunks, type=reader.schema.field(self.col_id).type)
+
+    def _read_existing_ids(self):
+        ids = []
+        for file_name in self._part_files():
+            try:
+                ids.append(self._read_file_ids(file_name))
+            except FileNotFoundError:
+                continue  # incomplete file is already renamed by another rank
+            except (pa.ArrowInvalid, OSError):
+                logger.warning(f'"{file_name}" can not be read. It is renamed and its rows will be recomputed')
+                try:
+                    os.rename(file_name, os.path.join(self.path, f'_{os.path.basename(file_name)}.incomplete'))
+                except FileNotFoundError:
+                    pass
+        return set(_id for file_ids in ids for _id in file_ids.to_pylist())
+
+    def skip_existing(self, data):
+        """Dataset or DataLoader without clients which are already written. Input is returned as is without resume.
+        Records are checked one by one, map-style datasets are read once to find existing ids.
+
+        DataLoader is rebuilt with the same parameters. Indexes of map-style dataset are changed, so DataLoader
+        with custom `sampler` or `batch_sampler` isn't supported. Pass a dataset and build the DataLoader
+        with sampler for the returned dataset in this case.
+        """
+        if not self.existing_ids:
+            return data
+        if isinstance(data, torch.utils.data.DataLoader):
+            return self._skip_existing_loader(data)
+        if isinstance(data, torch.utils.data.IterableDataset) or not hasattr(data, '__getitem__'):
+            return _SkipIdsIterableDataset(data, self.col_id, self.existing_ids)
+        indexes = [i for i in range(len(data)) if self._get_id(data[i]) not in self.existing_ids]
+        logger.info(f'{len(data) - len(indexes)} records are skipped, {len(indexes)} records left')
+        return torch.utils.data.Subset(data, indexes)
+
+    def _skip_existing_loader(self, dl: torch.utils.data.DataLoader):
+        is_iterable = isinstance(dl.dataset, torch.utils.data.IterableDataset)
+        is_shuffle = isinstance(dl.sampler, torch.utils.data.RandomSampler)
+        is_custom_sampler = not isinstance(dl.sampler, (torch.utils.data.SequentialSampler,
+                                                        torch.utils.data.RandomSampler))
+        is_custom_batch_sampler = dl.batch_size is None and dl.batch_sampler is not None
+        if not is_iterable and (is_custom_sampler or is_custom_batch_sampler):
+            raise AttributeError('DataLoader with custom `sampler` or `batch_sampler` is not supported. '
+                                 'Use `skip_existing(dataset)` and build DataLoader for the returned dataset')
+        params = {k: getattr(dl, k) for k in _DATALOADER_PARAMS if hasattr(dl, k)}
+        return torch.utils.data.DataLoader(self.skip_existing(dl.dataset), shuffle=is_shuffle, **params)
+
+    def _get_id(self, rec):
+        return _get_record_id(rec, self.col_id)
+
+    def _new_file_name(self):
+        n = len(glob(os.path.join(self.path, f'part-{self._rank:05d}-*'))) + \
+            len(glob(os.path.join(self.path, f'_part-{self._rank:05d}-*')))
+        return os.path.join(self.path, f'part-{self._rank:05d}-{n:05d}.{FILE_EXTENSIONS[self.format]}')
+
+    def _open(self, schema: pa.Schema):
+        file_name = self._new_file_name()
+        if self.format == 'parquet':
+            self._writer = pq.ParquetWriter(file_name, schema)
+        else:
+            self._writer = pa.ipc.new_stream(file_name, schema)
+        self._schema = schema
+        self._file_rows = 0
+        logger.debug(f'Open "{file_name}"')
+
+    def _close_file(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def _to_record_batch(self, outputs) -> pa.RecordBatch:
+        if isinstance(outputs, pa.RecordBatch):
+            return outputs
+        if isinstance(outputs, pa.Table):
+            return outputs.combine_chunks().to_batches()[0] if len(outputs) > 0 else None
+        if isinstance(outputs, pd.DataFrame):
+            return pa.RecordBatch.from_pandas(outputs, preserve_index=False)
+        raise TypeError(f'`pandas.DataFrame` or `pyarrow.RecordBatch` predictions expected, found {type(outputs)}')
+
+    def write(self, outputs):
+        """Append batch of predictions"""
+        rb = self._to_record_batch(outputs)
+        if rb is None or len(rb) == 0:
+            return
+        if self.existing_ids:
+            mask = pc.invert(pc.is_in(rb.column(self.col_id), value_set=self._existing_ids_array))
+            rb = rb.filter(mask)
+        self._buffer.append(rb)
+        self._buffer_rows += len(rb)
+        if self._buffer_rows >= self.row_group_size:
+            self.flush(final=False)
+
+    def flush(self, final: bool = True):
+        """Write buffered rows. Only full row groups are written when `final=False`, the rest is kept in buffer"""
+        if self._buffer_rows == 0:
+            return
+        table = pa.Table.from_batches(self._buffer)
+        n_write = len(table) if final else len(table) // self.row_group_size * self.row_group_size
+        if n_write == 0:
+            return
+        rest = table.slice(n_write)
+        table = table.slice(0, n_write)
+        self._buffer, self._buffer_rows = rest.to_batches(), len(rest)
+        if self._writer is None:
+            self._open(table.schema)
+        elif table.schema != self._schema:
+            table = table.cast(self._schema)
+        if self.format == 'parquet':
+            self._writer.write_table(table, row_group_size=self.row_group_size)
+        else:
+            self._writer.write_table(table, max_chunksize=self.row_group_size)
+        self._file_rows += len(table)
+        self.n_rows += len(table)
+        if self.max_rows_per_file is not None and self._file_rows >= self.max_rows_per_file:
+            self._close_file()
+
+    def close(self):
+        self.flush()
+        self._close_file()
+        logger.info(f'{self.n_rows} rows saved to "{self.path}"')
+
+    def on_predict_start(self, trainer, pl_module):
+        self._rank = trainer.global_rank
+        os.makedirs(self.path, exist_ok=True)
+
+    def on_predict_batch_end(self, trainer, pl_module, outputs, batch, batch_idx, dataloader_idx=0):
+        self.write(outputs)
+
+    def on_predict_end(self, trainer, pl_module):
+        self.close()
+
+
+_DATALOADER_PARAMS = ('batch_size', 'drop_last', 'collate_fn', 'num_workers', 'pin_memory', 'timeout',
+                      'worker_init_fn', 'multiprocessing_context', 'generator', 'prefetch_factor',
+                      'persistent_workers', 'pin_memory_device')
+
+
+def _get_record_id(rec, col_id):
+    if isinstance(rec, tuple):
+        rec = rec[0]
+    _id = rec[col_id]
+    return _id.item() if hasattr(_id, 'item') else _id
+
+
+class _SkipIdsIterableDataset(torch.utils.data.IterableDataset):
+    def __init__(self, data, col_id, ids):
+        self.data = data
+        self.col_id = col_id
+        self.ids = ids
+
+    def __iter__(self):
+        for rec in self.data:
+            if _get_record_id(rec, self.col_id) not in self.ids:
+                yield rec
@@ -4,6 +4,8 @@ from functools import partial
 import pytorch_lightning as pl
 import torch
 
+from ptls.data_load.length_bucket_sampler import loader_batching_kwargs
+
 
 class PtlsDataModule(pl.LightningDataModule):
     """
@@ -17,6 +19,13 @@ class PtlsDataModule(pl.LightningDataModule):
             The number of workers for the dataloader. 0 = single-process loader
         drop_last: bool. Default: False.
             Drop the last incomplete batch, if the dataset size is not divisible by the batch size
+        max_tokens: int. Default: None.
+            Token budget for padded batch. Map-style dataset samples are grouped by sequence length with
+            `ptls.data_load.length_bucket_sampler.LengthBucketBatchSampler` when set,
+            `batch_size` is an upper limit of samples in batch in this case.
+            `drop_last` drops the last incomplete batch of the sampler.
+            Use `Trainer(use_distributed_sampler=False)` (`Trainer(replace_sampler_ddp=False)` for
+            pytorch-lightning < 2.0) with DDP, the sampler shards batches by itself.
 
     Returns:
         DataLoader
@@ -26,26 +35,32 @@ class PtlsDataModule(pl.LightningDataModule):
                  train_batch_size: int = 64,
                  train_num_workers: int = 0,
                  train_drop_last: bool = False,
+                 train_max_tokens: int = None,
                  valid_data: List[Dict] = None,
                  valid_batch_size: int = 64,
                  valid_num_workers: int = 0,
                  valid_drop_last: bool = False,
+                 valid_max_tokens: int = None,
                  test_data: List[Dict] = None, 
                  test_batch_size: int = 64,
                  test_num_workers: int = 0,
                  test_drop_last: bool = False,
+                 test_max_tokens: int = None,
                  ):
 
         super().__init__()
         self.train_batch_size = train_batch_size
         self.train_num_workers = train_num_workers
         self.train_drop_last = train_drop_last
+        self.train_max_tokens = train_max_tokens
         self.valid_batch_size = valid_batch_size
         self.valid_num_workers = valid_num_workers
         self.valid_drop_last = valid_drop_last
+        self.valid_max_tokens = valid_max_tokens
         self.test_batch_size = test_batch_size
         self.test_num_workers = test_num_workers
         self.test_drop_last = test_drop_last
+        self.test_max_tokens = test_max_tokens
         
         self.save_hyperparameters(ignore=['train_data', 'valid_data', 'test_data'])
         if self.hparams.valid_num_workers is None:
@@ -69,28 +84,40 @@ class PtlsDataModule(pl.LightningDataModule):
         return torch.utils.data.DataLoader(
             dataset=train_data,
             collate_fn=train_data.collate_fn,
-            shuffle=not isinstance(train_data, torch.utils.data.IterableDataset),
             num_workers=self.hparams.train_num_workers,
-            batch_size=self.hparams.train_batch_size,
-            drop_last=self.hparams.train_drop_last,
+            **loader_batching_kwargs(
+                train_data,
+                batch_size=self.hparams.train_batch_size,
+                max_tokens=self.hparams.train_max_tokens,
+                shuffle=not isinstance(train_data, torch.utils.data.IterableDataset),
+                drop_last=self.hparams.train_drop_last,
+            ),
         )
 
     def val_dl(self, valid_data):
         return torch.utils.data.DataLoader(
             dataset=valid_data,
             collate_fn=valid_data.collate_fn,
-            shuffle=False,
             num_workers=self.hparams.valid_num_workers,
-            batch_size=self.hparams.valid_batch_size,
-            drop_last=self.hparams.valid_drop_last,
+            **loader_batching_kwargs(
+                valid_data,
+                batch_size=self.hparams.valid_batch_size,
+                max_tokens=self.hparams.valid_max_tokens,
+                shuffle=False,
+                drop_last=self.hparams.valid_drop_last,
+            ),
         )
 
     def test_dl(self, test_data):
         return torch.utils.data.DataLoader(
             dataset=test_data,
             collate_fn=test_data.collate_fn,
-            shuffle=False,
             num_workers=self.hparams.test_num_workers,
-            batch_size=self.hparams.test_batch_size,
-            drop_last=self.hparams.test_drop_last,
+            **loader_batching_kwargs(
+                test_data,
+                batch_size=self.hparams.test_batch_size,
+                max_tokens=self.hparams.test_max_tokens,
+                shuffle=False,
+                drop_last=self.hparams.test_drop_last,
+            ),
         )
@@ -0,0 +1,114 @@
+"""Vectorized reductions over valid steps of `PaddedBatch`.
+
+Payload is a tensor of shape `(B, T, ...)`, only first `seq_lens[b]` steps of each sequence are used.
+Each function makes a fixed number of kernel calls for the whole batch, no loop over sequences.
+"""
+import torch
+
+from ptls.data_load.padded_batch import PaddedBatch
+
+
+def valid_mask(x: PaddedBatch):
+    """Bool mask of valid steps, broadcastable to payload: shape `(B, T, 1, ..., 1)`.
+    The same as `x.seq_len_mask`, but on payload device and for payload of any rank.
+    """
+    payload = x.payload
+    seq_lens = torch.as_tensor(x.seq_lens, device=payload.device)
+    mask = torch.arange(payload.size(1), device=payload.device).unsqueeze(0) < seq_lens.unsqueeze(1)
+    return mask.view(*mask.size(), *[1] * (payload.dim() - 2))
+
+
+def _seq_lens_like(x: PaddedBatch):
+    """Sequence lengths of shape `(B, 1, ..., 1)` with payload float type, broadcastable to reduced payload"""
+    payload = x.payload
+    dtype = payload.dtype if payload.is_floating_point() else torch.float
+    seq_lens = torch.as_tensor(x.seq_lens, device=payload.device).to(dtype)
+    return seq_lens.view(-1, *[1] * (payload.dim() - 2))
+
+
+def _fill_value(payload: torch.Tensor, largest: bool):
+    """Neutral value for max (`largest=False`) or min (`largest=True`) of payload dtype"""
+    if payload.is_floating_point():
+        return float('inf') if largest else float('-inf')
+    if payload.dtype == torch.bool:
+        return largest
+    info = torch.iinfo(payload.dtype)
+    return info.max if largest else info.min
+
+
+def masked_sum(x: PaddedBatch):
+    """Sum over valid steps. `(B, T, ...)` -> `(B, ...)`. Padding values are ignored, even `nan` and `inf`"""
+    return x.payload.masked_fill(~valid_mask(x), 0).sum(dim=1)
+
+
+def masked_mean(x: PaddedBatch):
+    """Mean over valid steps. `(B, T, ...)` -> `(B, ...)`. `nan` for empty sequences"""
+    return masked_sum(x) / _seq_lens_like(x)
+
+
+def masked_max(x: PaddedBatch):
+    """Max over valid steps. `(B, T, ...)` -> `(B, ...)`.
+    `-inf` for empty sequences, the smallest value of dtype for integer payload
+    """
+    return x.payload.masked_fill(~valid_mask(x), _fill_value(x.payload, largest=False)).max(dim=1).values
+
+
+def masked_min(x: PaddedBatch):
+    """Min over valid steps. `(B, T, ...)` -> `(B, ...)`.
+    `inf` for empty sequences, the largest value of dtype for integer payload
+    """
+    return x.payload.masked_fill(~valid_mask(x), _fill_value(x.payload, largest=True)).min(dim=1).values
+
+
+def masked_std(x: PaddedBatch, unbiased: bool = True):
+    """Standard deviation over valid steps. `(B, T, ...)` -> `(B, ...)`.
+    `unbiased` has the same meaning as in `torch.std`
+    """
+    mask = valid_mask(x)
+    seq_lens = _seq_lens_like(x)
+    payload = x.payload.masked_fill(~mask, 0)
+    mean = payload.sum(dim=1, keepdim=True) / seq_lens.unsqueeze(1)
+    sq_sum = (payload - mean).masked_fill(~mask, 0).pow(2).sum(dim=1)
+    return (sq_sum / (seq_lens - 1 if unbiased else seq_lens)).sqrt()
+
+
+def gather_steps(x: PaddedBatch, index: torch.Tensor):
+    """Steps selected by `index` of shape `(B, K)` for each sequence. `(B, T, ...)` -> `(B, K, ...)`"""
+    payload = x.payload
+    index = index.to(payload.device).view(*index.size(), *[1] * (payload.dim() - 2))
+    return payload.gather(1, index.expand(-1, -1, *payload.size()[2:]))
+
+
+def last_valid(x: PaddedBatch):
+    """Last valid step of each sequence. `(B, T, ...)` -> `(B, ...)`. The first step for empty sequences"""
+    seq_lens = torch.as_tensor(x.seq_lens, device=x.payload.device)
+    return gather_steps(x, (seq_lens - 1).clamp(min=0).unsqueeze(1)).squeeze(1)
+
+
+def strided_select(x: PaddedBatch, step_size: int):
+    """Every `step_size`-th valid step, aligned to the last valid step.
+
+    Steps `l - 1, l - 1 - step_size, ...` with at least `step_size - 1` steps before them are selected
+    in time order. Last valid step is always selected. Selected steps are left aligned and padded with zeros.
+
+    Returns
+    -------
+    `PaddedBatch` with payload of shape `(B, max(T // step_size, 1), ...)` and selected step counts as lengths
+    """
+    payload = x.payload
+    seq_lens = torch.as_tensor(x.seq_lens, device=payload.device)
+    n_steps = max(payload.size(1) // step_size, 1)
+    # the first selected step is the smallest step aligned to `l - 1` which is not less than `step_size - 1`
+    start = torch.minimum(seq_lens - 1, step_size - 1 + seq_lens % step_size)
+    out_lens = torch.where(seq_lens > 0, (seq_lens // step_size).clamp(min=1), torch.zeros_like(seq_lens))
+
+    index = start.unsqueeze(1) + torch.arange(n_steps, device=payload.device).unsqueeze(0) * step_size
+    is_valid = torch.arange(n_steps, device=payload.device).unsqueeze(0) < out_lens.unsqueeze(1)
+    out = gather_steps(x, index.clamp(0, payload.size(1) - 1))
+    out = out.masked_fill(~is_valid.view(*is_valid.size(), *[1] * (payload.dim() - 2)), 0)
+    return PaddedBatch(out, out_lens)
+
+
+def flatten_valid(x: PaddedBatch):
+    """Valid steps of all sequences, concatenated. `(B, T, ...)` -> `(sum(seq_lens), ...)`"""
+    return x.payload[valid_mask(x).view(x.payload.size()[:2])]
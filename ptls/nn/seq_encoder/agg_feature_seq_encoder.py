@@ -48,6 +48,12 @@ class AggFeatureSeqEncoder(torch.nn.Module):
             Calc more features
         logify_sum_mean_seqlens (bool):
             True - apply log transform to sequence length
+        engine (str):
+            How statistics by category values are calculated.
+            'scatter' - `index_add` and `scatter_reduce` over flattened positions.
+                Memory is O(B x T + B x dictionary_size).
+            'ohe' - one hot tensors of shape (B, T, dictionary_size). Memory is O(B x T x dictionary_size).
+            Both engines return the same features.
 
     Example:
 
@@ -65,6 +71,7 @@ class AggFeatureSeqEncoder(torch.nn.Module):
                  use_topk_cnt=0,
                  distribution_target_task=False,
                  logify_sum_mean_seqlens=False,
+                 engine='scatter',
                  ):
 
         super().__init__()
@@ -78,12 +85,20 @@ class AggFeatureSeqEncoder(torch.nn.Module):
 
         self.eps = 1e-9
 
+        if engine not in ('scatter', 'ohe'):
+            raise AttributeError(f'Unknown engine "{engine}". "scatter" or "ohe" expected')
+        self.engine = engine
+
         self.ohe_buffer = {}
-        for col_embed, options_embed in self.embeddings.items():
-            size = options_embed['in']
-            ohe = torch.diag(torch.ones(size))
-            self.ohe_buffer[col_embed] = ohe
-            self.register_buffer(f'ohe_{col_embed}', ohe)
+        if engine == 'ohe':
+            for col_embed, options_embed in self.embeddings.items():
+                size = options_embed['in']
+                ohe = torch.diag(torch.ones(size))
+                self.ohe_buffer[col_embed] = ohe
+                self.register_buffer(f'ohe_{col_embed}', ohe)
+        else:
+            # checkpoints of 'ohe' engine have `ohe_*` buffers
+            self._register_load_state_dict_pre_hook(self._drop_ohe_buffers)
 
         self.is_used_count = is_used_count
         self.is_used_mean = is_used_mean
@@ -126,6 +141,10 @@ class AggFeatureSeqEncoder(torch.nn.Module):
             processed = [seq_lens.unsqueeze(1)]
         cat_processed = []
 
+        if self.engine == 'scatter':
+            category_index = {col_embed: self._scatter_category_index(x, col_embed, options_embed)
+                              for col_embed, options_embed in self.embeddings.items()}
+
         for col_num, options_num in self.numeric_values.items():
             # take array with numerical feature and convert it to original scale
             if col_num.strip('"') == '#ones':
@@ -170,50 +189,18 @@ class AggFeatureSeqEncoder(torch.nn.Module):
 
             # embeddings features (like mcc)
             for col_embed, options_embed in self.embeddings.items():
-                ohe = getattr(self, f'ohe_{col_embed}')
-                val_embed = feature_arrays[col_embed].long()
-                val_embed = val_embed.clamp(0, options_embed['in'] - 1)
-
-                ohe_transform = ohe[val_embed.flatten()].view(*val_embed.size(), -1)  # B, T, size
-                m_sum = ohe_transform * val_orig.unsqueeze(-1)  # B, T, size
-
-                # counts over val_embed
-                mask = (1.0 - ohe[0]).unsqueeze(0)  # 0, 1, 1, 1, ..., 1
-
-                e_cnt = ohe_transform.sum(dim=1) * mask
-                if self.is_used_count:
-                    processed.append(e_cnt)
-
-                # sum over val_embed
-                if self.is_used_mean:
-                    e_sum = m_sum.sum(dim=1)
-                    e_mean = e_sum.div(e_cnt + 1e-9)
-                    processed.append(e_mean)
-
-                if self.is_used_std:
-                    a = torch.clamp(m_sum.pow(2).sum(dim=1) - m_sum.sum(dim=1).pow(2).div(e_cnt + 1e-9), min=0.0)
-                    e_std = a.div(torch.clamp(e_cnt - 1, min=0) + 1e-9).pow(0.5)
-                    processed.append(e_std)
-
-                if self.is_used_min:
-                    min_ = m_sum.masked_fill(~x.seq_len_mask.bool().unsqueeze(2), np.float32('inf')).min(dim=1).values
-                    processed.append(min_)
-
-                if self.is_used_max:
-                    max_ = m_sum.masked_fill(~x.seq_len_mask.bool().unsqueeze(2), np.float32('-inf')).max(dim=1).values
-                    processed.append(max_)
+                if self.engine == 'ohe':
+                    processed.extend(self._ohe_category_features(x, col_embed, options_embed, val_orig))
+                else:
+                    processed.extend(self._scatter_category_features(
+                        x, category_index[col_embed], options_embed, val_orig))
 
         # n_unique and top_k
         for col_embed, options_embed in self.embeddings.items():
-            ohe = getattr(self, f'ohe_{col_embed}')
-            val_embed = feature_arrays[col_embed].long()
-            val_embed = val_embed.clamp(0, options_embed['in'] - 1)
-
-            ohe_transform = ohe[val_embed.flatten()].view(*val_embed.size(), -1)  # B, T, size
-
-            # counts over val_embed
-            mask = (1.0 - ohe[0]).unsqueeze(0)  # 0, 1, 1, 1, ..., 1
-            e_cnt = ohe_transform.sum(dim=1) * mask
+            if self.engine == 'ohe':
+                e_cnt = self._ohe_category_count(x, col_embed, options_embed)
+            else:
+                e_cnt = category_index[col_embed][1]
 
             processed.append(e_cnt.gt(0.0).float().sum(dim=1, keepdim=True))
 
@@ -228,6 +215,113 @@ class AggFeatureSeqEncoder(torch.nn.Module):
 
         return out
 
+    def _ohe_category_count(self, x, col_embed, options_embed):
+        ohe = getattr(self, f'ohe_{col_embed}')
+        val_embed = x.payload[col_embed].long()
+        val_embed = val_embed.clamp(0, options_embed['in'] - 1)
+
+        ohe_transform = ohe[val_embed.flatten()].view(*val_embed.size(), -1)  # B, T, size
+
+        # counts over val_embed
+        mask = (1.0 - ohe[0]).unsqueeze(0)  # 0, 1, 1, 1, ..., 1
+        return ohe_transform.sum(dim=1) * mask
+
+    def _ohe_category_features(self, x, col_embed, options_embed, val_orig):
+        processed = []
+        ohe = getattr(self, f'ohe_{col_embed}')
+        val_embed = x.payload[col_embed].long()
+        val_embed = val_embed.clamp(0, options_embed['in'] - 1)
+
+        ohe_transform = ohe[val_embed.flatten()].view(*val_embed.size(), -1)  # B, T, size
+        m_sum = ohe_transform * val_orig.unsqueeze(-1)  # B, T, size
+
+        # counts over val_embed
+        mask = (1.0 - ohe[0]).unsqueeze(0)  # 0, 1, 1, 1, ..., 1
+
+        e_cnt = ohe_transform.sum(dim=1) * mask
+        if self.is_used_count:
+            processed.append(e_cnt)
+
+        # sum over val_embed
+        if self.is_used_mean:
+            e_sum = m_sum.sum(dim=1)
+            e_mean = e_sum.div(e_cnt + 1e-9)
+            processed.append(e_mean)
+
+        if self.is_used_std:
+            a = torch.clamp(m_sum.pow(2).sum(dim=1) - m_sum.sum(dim=1).pow(2).div(e_cnt + 1e-9), min=0.0)
+            e_std = a.div(torch.clamp(e_cnt - 1, min=0) + 1e-9).pow(0.5)
+            processed.append(e_std)
+
+        if self.is_used_min:
+            min_ = m_sum.masked_fill(~x.seq_len_mask.bool().unsqueeze(2), np.float32('inf')).min(dim=1).values
+            processed.append(min_)
+
+        if self.is_used_max:
+            max_ = m_sum.masked_fill(~x.seq_len_mask.bool().unsqueeze(2), np.float32('-inf')).max(dim=1).values
+            processed.append(max_)
+        return processed
+
+    @staticmethod
+    def _scatter_category_index(x, col_embed, options_embed):
+        """Flat index `b * size + category` for all positions and per-category counts without 0 category.
+        Counts and sums include padding positions, like in one hot engine
+        """
+        B, T = x.seq_feature_shape
+        size = options_embed['in']
+        val_embed = x.payload[col_embed].long().clamp(0, size - 1)
+        row = torch.arange(B, device=val_embed.device).unsqueeze(1)
+        index = (row * size + val_embed).flatten()  # B * T
+
+        e_cnt = torch.zeros(B * size, device=val_embed.device).index_add_(
+            0, index, torch.ones(len(index), device=val_embed.device)).view(B, size)
+        e_cnt[:, 0] = 0.0  # 0, 1, 1, 1, ..., 1
+        return index, e_cnt
+
+    def _scatter_category_features(self, x, category_index, options_embed, val_orig):
+        processed = []
+        index, e_cnt = category_index
+        B, size = e_cnt.size()
+        val = val_orig.flatten()
+
+        if self.is_used_count:
+            processed.append(e_cnt)
+
+        if self.is_used_mean or self.is_used_std:
+            e_sum = val.new_zeros(B * size).index_add_(0, index, val).view(B, size)
+
+        if self.is_used_mean:
+            e_mean = e_sum.div(e_cnt + 1e-9)
+            processed.append(e_mean)
+
+        if self.is_used_std:
+            e_sum2 = val.new_zeros(B * size).index_add_(0, index, val.pow(2)).view(B, size)
+            a = torch.clamp(e_sum2 - e_sum.pow(2).div(e_cnt + 1e-9), min=0.0)
+            e_std = a.div(torch.clamp(e_cnt - 1, min=0) + 1e-9).pow(0.5)
+            processed.append(e_std)
+
+        if self.is_used_min or self.is_used_max:
+            valid = x.seq_len_mask.bool().flatten()
+            valid_index, valid_val = index[valid], val[valid]
+            valid_cnt = val.new_zeros(B * size).index_add_(0, valid_index, torch.ones_like(valid_val)).view(B, size)
+            # positions with other categories are zeros for min and max, like in one hot product
+            has_other = valid_cnt < x.seq_lens.to(val.device).unsqueeze(1)
+
+        if self.is_used_min:
+            min_ = val.new_full((B * size,), np.float32('inf')).scatter_reduce_(
+                0, valid_index, valid_val, 'amin').view(B, size)
+            processed.append(torch.where(has_other, min_.clamp(max=0.0), min_))
+
+        if self.is_used_max:
+            max_ = val.new_full((B * size,), np.float32('-inf')).scatter_reduce_(
+                0, valid_index, valid_val, 'amax').view(B, size)
+            processed.append(torch.where(has_other, max_.clamp(min=0.0), max_))
+        return processed
+
+    def _drop_ohe_buffers(self, state_dict, prefix, *args):
+        for col_embed in self.embeddings.keys():
+            state_dict.pop(f'{prefix}ohe_{col_embed}', None)
+
     @property
     def embedding_size(self):
         numeric_values = self.numeric_values
@@ -38,6 +38,12 @@ class RnnEncoder(AbsSeqEncoder):
         is_reduce_sequence:
             False - returns PaddedBatch with all transactions embeddings
             True - returns one embedding for sequence based on CLS token
+        packed:
+            False - rnn runs over full padded tensor, padding steps are processed too.
+            True - batch is packed with `torch.nn.utils.rnn.pack_padded_sequence` according `seq_lens`,
+                rnn runs over valid steps only. Padding steps of output are zeros.
+                Reducers take the true last step and exclude padding from pooling.
+                Backward direction of bidirectional rnn is correct in this mode.
 
     Examples:
         Used as:
@@ -65,7 +71,8 @@ class RnnEncoder(AbsSeqEncoder):
                  dropout=0,
                  trainable_starter='static',
                  is_reduce_sequence=False,  # previous default behavior RnnEncoder
-                 reducer='last_step'
+                 reducer='last_step',
+                 packed=False,
                  ):
         self.bidirectional = bidir
         self.trainable_starter = trainable_starter
@@ -73,13 +80,14 @@ class RnnEncoder(AbsSeqEncoder):
         self.rnn_type = type
         self.num_layers = num_layers
         self.reducer_name = reducer
+        self.packed = packed
         self.full_hidden_size = self.hidden_size if not self.bidirectional else self.hidden_size * 2
         self.model_params = dict(input_size=input_size, hidden_size=hidden_size, num_layers=num_layers,
                                  batch_first=True,
                                  bidirectional=self.bidirectional, dropout=dropout)
 
         super().__init__(is_reduce_sequence=is_reduce_sequence)
-        if self.bidirectional:
+        if self.bidirectional and not self.packed:
             warnings.warn("Backward direction in bidir RNN takes into account paddings at the end of sequences!")
         # initialize starter position if needed
         if self.trainable_starter == 'static':
@@ -91,7 +99,7 @@ class RnnEncoder(AbsSeqEncoder):
 
     @property
     def get_reducer(self):
-        return REDUCE_DICT[self.reducer_name]()
+        return REDUCE_DICT[self.reducer_name](use_seq_lens=self.packed)
 
     @property
     def embedding_size(self):
@@ -105,7 +113,7 @@ class RnnEncoder(AbsSeqEncoder):
                 h_0 = starter_h
             elif h_0 is not None and not self.training:
                 h_0 = torch.where(
-                    (h_0.squeeze(0).abs().sum(dim=1) == 0.0).unsqueeze(0).unsqueeze(2).expand(*starter_h.size()),
+                    (h_0.abs().sum(dim=(0, 2)) == 0.0).view(1, -1, 1).expand(*starter_h.size()),
                     starter_h,
                     h_0,
                 )
@@ -134,6 +142,38 @@ class RnnEncoder(AbsSeqEncoder):
             h_0 = self._init_static_state(shape=x.payload.size(), h_0=h_0)
 
         # pass-through rnn
-        out, _ = self.rnn(x.payload, h_0) if self.rnn_type == 'gru' else self.rnn(x.payload)
+        payload = x.payload
+        if self.packed:
+            payload = torch.nn.utils.rnn.pack_padded_sequence(
+                payload, x.seq_lens.cpu().clamp(min=1), batch_first=True, enforce_sorted=False)
+        out, _ = self.rnn(payload, h_0) if self.rnn_type == 'gru' else self.rnn(payload)
+        if self.packed:
+            out, _ = torch.nn.utils.rnn.pad_packed_sequence(out, batch_first=True, total_length=x.payload.size(1))
         out = PaddedBatch(out, x.seq_lens)
         return self.reducer(out) if self.is_reduce_sequence else out
+
+    def forward_state(self, x: PaddedBatch, h_0: torch.Tensor = None) -> torch.Tensor:
+        """
+        Final hidden state of each sequence. Used for incremental embedding calculation.
+
+        Batch is always packed, so state is taken after the last valid transaction.
+        Sequences with zero length keep `h_0` state.
+
+        Args:
+            x: PaddedBatch. Batch of transactions
+            h_0: None or [num_layers, B, H] float tensor, the same as for `forward`
+        Returns:
+            [num_layers, B, H] float tensor
+        """
+        if self.rnn_type != 'gru' or self.bidirectional:
+            raise NotImplementedError('Hidden state is supported for unidirectional gru only')
+
+        if self.trainable_starter == 'static':
+            h_0 = self._init_static_state(shape=x.payload.size(), h_0=h_0)
+
+        packed = torch.nn.utils.rnn.pack_padded_sequence(
+            x.payload, x.seq_lens.cpu().clamp(min=1), batch_first=True, enforce_sorted=False)
+        _, h_n = self.rnn(packed, h_0)
+        if h_0 is not None:
+            h_n = torch.where((x.seq_lens > 0).view(1, -1, 1), h_n, h_0)
+        return h_n
@@ -1,6 +1,8 @@
 import numpy as np
+import torch
 
 from ptls.nn.seq_encoder import RnnSeqEncoder
+from ptls.nn.seq_encoder.utils import masked_signed_sums, transform_inv_torch
 
 
 class RnnSeqEncoderDistributionTarget(RnnSeqEncoder):
@@ -20,34 +22,25 @@ class RnnSeqEncoderDistributionTarget(RnnSeqEncoder):
                  input_size=None,
                  ):
         super().__init__(
-            trx_encoder,
-            input_size,
-            hidden_size,
-            type,
-            bidir,
-            trainable_starter,
+            trx_encoder=trx_encoder,
+            input_size=input_size,
+            hidden_size=hidden_size,
+            type=type,
+            bidir=bidir,
+            trainable_starter=trainable_starter,
         )
         head_params = dict(head_layers).get('CombinedTargetHeadFromRnn', None)
         self.pass_samples = head_params.get('pass_samples', True)
-        self.numeric_name = list(trx_encoder.scalers.keys())[0]
+        self.numeric_name = list(trx_encoder.custom_embeddings.keys())[0]
         self.collect_pos, self.collect_neg = (head_params.get('pos', True), head_params.get('neg', True)) if head_params else (0, 0)
         self.eps = 1e-7
 
     def forward(self, x):
-        amount_col = []
-        for i, row in enumerate(x.payload[self.numeric_name]):
-            amount_col += [list(row[:x.seq_lens[i].item()].cpu().numpy())]
-        amount_col = np.array(amount_col, dtype=object)
-        neg_sums = []
-        pos_sums = []
-        for list_row in amount_col:
-            np_row = np.array(list_row)
-            if self.collect_neg:
-                neg_sums += [np.sum(self.transform_inv(np_row[np.where(np_row < 0)]))]
-            if self.collect_pos:
-                pos_sums += [np.sum(self.transform_inv(np_row[np.where(np_row >= 0)]))]
-        neg_sum_logs = np.log(np.abs(np.array(neg_sums)) + self.eps)
-        pos_sum_logs = np.log(np.array(pos_sums) + self.eps)
+        # signed log-sums are calculated on the input device, without host round-trip
+        neg_sums, pos_sums = masked_signed_sums(
+            x.payload[self.numeric_name].float(), x.seq_len_mask.bool(), transform_inv_torch)
+        neg_sum_logs = torch.log(torch.abs(neg_sums) + self.eps)
+        pos_sum_logs = torch.log(pos_sums + self.eps)
 
         x = super().forward(x)
         if (not self.pass_samples):
@@ -57,4 +50,4 @@ class RnnSeqEncoderDistributionTarget(RnnSeqEncoder):
         elif self.collect_neg:
             return x, neg_sum_logs
         elif self.collect_pos:
-            return x, pos_sum_logs
\ No newline at end of file
+            return x, pos_sum_logs
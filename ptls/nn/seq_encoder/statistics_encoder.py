@@ -1,11 +1,15 @@
-import numpy as np
 import torch
 
-from ptls.nn.seq_encoder.utils import get_distributions, transform_inv
+from ptls.nn.seq_encoder.utils import get_distributions_masked, transform_inv_torch
 from ptls.data_load.padded_batch import PaddedBatch
 
 
 class StatisticsEncoder(torch.nn.Module):
+    """Distribution statistics of the first numerical feature grouped by the first categorical feature.
+
+    Statistics are calculated with `get_distributions_masked` over padded tensors on the input device.
+    Output is differentiable with respect to numerical feature.
+    """
     def __init__(self,
                  pos=True,
                  neg=True,
@@ -26,25 +30,18 @@ class StatisticsEncoder(torch.nn.Module):
 
     def forward(self, x: PaddedBatch):
         eps = 1e-7
-        tr_type_col = []
-        amount_col = []
-        for i, row in enumerate(zip(x.payload[self.cat_names[0]], x.payload[self.num_values[0]])):
-            tr_type_col += [list(row[0][:x.seq_lens[i].item()].cpu().numpy())]
-            amount_col += [list(row[1][:x.seq_lens[i].item()].cpu().numpy())]
-
-        tr_type_col = np.array(tr_type_col, dtype=object)[:, None]
-        amount_col = np.array(amount_col, dtype=object)[:, None]
-        np_data = np.hstack((tr_type_col, amount_col))
-
-        distr = get_distributions(np_data, 1, 0, self.negative_items, self.positive_items, 5, 0, transform_inv)
+        distr = get_distributions_masked(
+            x.payload[self.cat_names[0]], x.payload[self.num_values[0]].float(), x.seq_lens,
+            self.negative_items, self.positive_items, 5, 0, transform_inv_torch,
+        )
 
         if self.collect_neg:
-            sums_of_negative_target = torch.tensor(distr[0])[:, None]
-            neg_distribution = torch.tensor(distr[2])
+            sums_of_negative_target = distr[0][:, None]
+            neg_distribution = distr[2]
             log_neg_sum = torch.log(torch.abs(sums_of_negative_target + eps))
         if self.collect_pos:
-            sums_of_positive_target = torch.tensor(distr[1])[:, None]
-            pos_distribution = torch.tensor(distr[3])
+            sums_of_positive_target = distr[1][:, None]
+            pos_distribution = distr[3]
             log_pos_sum = torch.log(sums_of_positive_target + eps)
 
         if self.collect_neg and self.collect_pos:
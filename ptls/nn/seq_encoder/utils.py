@@ -5,6 +5,7 @@ from torch import nn as nn
 from torch.nn import functional as tf
 
 from ptls.custom_layers import Squeeze
+from ptls.nn.masked_reduce import flatten_valid, last_valid, masked_mean
 from ptls.nn.seq_step import LastStepEncoder
 from ptls.nn.normalization import L2NormEncoder
 from ptls.data_load.padded_batch import PaddedBatch
@@ -45,7 +46,7 @@ class ConcatLenEncoder(nn.Module):
         lens = x.seq_lens.unsqueeze(-1).float().to(x.payload.device)
         lens_normed = lens / 200
 
-        h = x.payload[range(len(x.payload)), [l - 1 for l in x.seq_lens]]
+        h = last_valid(x)
 
         embeddings = torch.cat([h, lens_normed, -torch.log(lens_normed)], -1)
         return embeddings
@@ -53,8 +54,7 @@ class ConcatLenEncoder(nn.Module):
 
 class MeanStepEncoder(nn.Module):
     def forward(self, x: PaddedBatch):
-        means = torch.stack([e[0:l].mean(dim=0) for e, l in zip(x.payload, x.seq_lens)])
-        return means
+        return masked_mean(x)
 
 
 class PayloadEncoder(nn.Module):
@@ -78,9 +78,8 @@ class AllStepsMeanHead(nn.Module):
         self.head = head
 
     def forward(self, x: PaddedBatch):
-        out = self.head(x.payload)
-        means = torch.tensor([e[0:l].mean() for e, l in zip(out, x.seq_lens)])
-        return means
+        out = masked_mean(PaddedBatch(self.head(x.payload), x.seq_lens))
+        return out.flatten(1).mean(dim=1) if out.dim() > 1 else out
 
 
 class FlattenHead(nn.Module):
@@ -88,11 +87,7 @@ class FlattenHead(nn.Module):
         super().__init__()
 
     def forward(self, x: PaddedBatch):
-        mask = torch.zeros(x.payload.shape, dtype=bool)
-        for i, length in enumerate(x.seq_lens):
-            mask[i, :length] = True
-
-        return x.payload.flatten()[mask.flatten()]
+        return flatten_valid(x).flatten()
 
 
 def scoring_head(input_size, params):
@@ -268,3 +263,87 @@ def get_distributions(np_data, tr_amounts_col, tr_types_col=None,
 
     return sums_of_negative_target, sums_of_positive_target, neg_distribution, pos_distribution
 
+
+def transform_inv_torch(x: torch.Tensor):
+    """Torch version of `transform_inv`"""
+    return torch.sign(x) * torch.expm1(torch.abs(x))
+
+
+def masked_signed_sums(amounts: torch.Tensor, mask: torch.Tensor, f=None):
+    """Sums of negative and positive values over valid positions. Vectorized, differentiable and device-local.
+
+    Parameters
+    ----------
+    amounts: values of shape `(B, T)`
+    mask: bool mask of valid positions of shape `(B, T)`
+    f: transformation which is applied to amounts before sum, like `transform_inv_torch`
+
+    Returns
+    -------
+    negative sums and positive sums of shape `(B,)`. Zero values are positive
+    """
+    amounts = amounts.masked_fill(~mask, 0.0)
+    if f is not None:
+        amounts = f(amounts).masked_fill(~mask, 0.0)
+    is_neg = amounts < 0
+    neg_sums = amounts.masked_fill(~is_neg, 0.0).sum(dim=1)
+    pos_sums = amounts.masked_fill(is_neg | ~mask, 0.0).sum(dim=1)
+    return neg_sums, pos_sums
+
+
+def get_distributions_masked(tr_types: torch.Tensor, tr_amounts: torch.Tensor, seq_lens: torch.Tensor,
+                             negative_items=None, positive_items=None, top_thr=None,
+                             take_first_fraction=0, f=None):
+    """Vectorized `get_distributions` over padded tensors. Result is the same and stays on the input device.
+
+    Parameters
+    ----------
+    tr_types: categories of shape `(B, T)`
+    tr_amounts: values of shape `(B, T)`
+    seq_lens: sequence lengths of shape `(B,)`
+    negative_items, positive_items, top_thr, take_first_fraction: like in `get_distributions`
+    f: torch transformation for amounts, like `transform_inv_torch`
+
+    Returns
+    -------
+    sums_of_negative_target, sums_of_positive_target: tensors of shape `(B,)`
+    neg_distribution, pos_distribution: tensors of shape `(B, n_top + 1)`, last column is for other categories
+    """
+    B, T = tr_amounts.size()
+    device = tr_amounts.device
+    seq_lens = seq_lens.to(device)
+    positions = torch.arange(T, device=device).unsqueeze(0)
+    start = (seq_lens.double() * take_first_fraction).long().unsqueeze(1)
+    mask = (positions >= start) & (positions < seq_lens.unsqueeze(1))
+
+    amounts = tr_amounts.masked_fill(~mask, 0.0)
+    if f is not None:
+        amounts = f(amounts).masked_fill(~mask, 0.0)
+    is_neg = amounts < 0
+    neg_sums, pos_sums = masked_signed_sums(amounts, mask)
+
+    top_neg = torch.tensor(list(negative_items[:top_thr]), dtype=tr_types.dtype, device=device)
+    top_pos = torch.tensor(list(positive_items[:top_thr]), dtype=tr_types.dtype, device=device)
+    is_top_neg = torch.isin(tr_types, top_neg) & mask
+    # category from both lists is counted as negative
+    is_top_pos = torch.isin(tr_types, top_pos) & mask & ~is_top_neg
+    is_other = mask & ~is_top_neg & ~is_top_pos
+
+    def _distribution(top_items, is_top, is_other_sign, sums):
+        # sums and counts by unique top items with `index_add`, then columns in `top_items` order
+        unique_items, columns = torch.unique(top_items, sorted=True, return_inverse=True)
+        n_unique = len(unique_items)
+        slot = torch.searchsorted(unique_items, tr_types).clamp(max=max(n_unique - 1, 0))
+        row_slot = (torch.arange(B, device=device).unsqueeze(1) * n_unique + slot)[is_top]
+        item_sums = amounts.new_zeros(B * n_unique).index_add_(0, row_slot, amounts[is_top]).view(B, n_unique)
+        item_cnt = torch.zeros(B * n_unique, device=device).index_add_(
+            0, row_slot, torch.ones(len(row_slot), device=device)).view(B, n_unique)
+        p_items = torch.where(item_cnt > 0, item_sums / sums.unsqueeze(1), torch.zeros_like(item_sums))
+        other_sums = amounts.masked_fill(~(is_other & is_other_sign), 0.0).sum(dim=1)
+        safe_sums = torch.where(sums != 0, sums, torch.ones_like(sums))
+        p_other = torch.where(sums != 0, other_sums / safe_sums, torch.zeros_like(sums))
+        return torch.cat([p_items[:, columns], p_other.unsqueeze(1)], dim=1)
+
+    neg_distribution = _distribution(top_neg, is_top_neg, is_neg, neg_sums)
+    pos_distribution = _distribution(top_pos, is_top_pos, ~is_neg, pos_sums)
+    return neg_sums, pos_sums, neg_distribution, pos_distribution
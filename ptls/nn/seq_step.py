@@ -1,8 +1,8 @@
 import torch
-import numpy as np
 from torch import nn as nn
 
 from ptls.data_load.padded_batch import PaddedBatch
+from ptls.nn.masked_reduce import last_valid, masked_max, masked_mean, strided_select
 
 
 class TimeStepShuffle(nn.Module):
@@ -27,9 +27,20 @@ class LastStepEncoder(nn.Module):
     to embeddings tensor with shape (B, H). The last hidden state is used for embedding.
     
     Example of usage: seq_encoder = RnnSeqEncoder(..., reducer='last_step')
+
+    Parameters:
+        use_seq_lens:
+            False - the last position of padded tensor is used. Padding steps are also processed by RNN.
+            True - the last valid step of each sequence is gathered according `x.seq_lens`.
+                Used with packed RNN output, where padding steps are zeros.
     """
+    def __init__(self, use_seq_lens: bool = False):
+        super().__init__()
+        self.use_seq_lens = use_seq_lens
 
     def forward(self, x: PaddedBatch):
+        if self.use_seq_lens:
+            return last_valid(x)
         return x.payload[:, -1, :]
 
 
@@ -64,12 +75,26 @@ class LastMaxAvgEncoder(nn.Module):
         H - hidden RNN size
         
     Example of usage: seq_encoder = RnnSeqEncoder(..., reducer='last_max_avg')
+
+    Parameters:
+        use_seq_lens:
+            False - max and sum are calculated over all positions of padded tensor.
+            True - padding steps are excluded from max and average pooling.
+                Used with packed RNN output, where padding steps are zeros.
     """
+    def __init__(self, use_seq_lens: bool = False):
+        super().__init__()
+        self.use_seq_lens = use_seq_lens
 
     def forward(self, x: PaddedBatch):
-        rnn_max_pool = x.payload.max(dim=1)[0]
-        rnn_avg_pool = x.payload.sum(dim=1) / x.seq_lens.unsqueeze(-1)
-        h = x.payload[range(len(x.payload)), [l - 1 for l in x.seq_lens]]
+        payload = x.payload
+        if self.use_seq_lens:
+            rnn_max_pool = masked_max(x)
+            rnn_avg_pool = masked_mean(x)
+        else:
+            rnn_max_pool = payload.max(dim=1)[0]
+            rnn_avg_pool = payload.sum(dim=1) / x.seq_lens.unsqueeze(-1)
+        h = last_valid(x)
         h = torch.cat((h, rnn_max_pool, rnn_avg_pool), dim=-1)
         return h
 
@@ -80,19 +105,10 @@ class SkipStepEncoder(nn.Module):
         self.step_size = step_size
 
     def forward(self, x: PaddedBatch):
-        max_len = x.payload.shape[1] - 1
-        s = self.step_size
-
-        first_dim_idx = []
-        second_dim_idx = []
-        for i, l in enumerate(x.seq_lens):
-            idx_to_take = np.arange(min(l - 1, s - 1 + l % s), l, s)
-            pad_idx = np.array([max_len - 1] * (max_len // s - len(idx_to_take)), dtype=np.int32)
-            idx_to_take = np.concatenate([[-1], idx_to_take, pad_idx]) + 1
-            first_dim_idx.append(np.ones(len(idx_to_take)) * i)
-            second_dim_idx.append(idx_to_take)
-
-        out = x.payload[first_dim_idx, second_dim_idx]
-        out_lens = torch.tensor([min(1, l // self.step_size) for l in x.seq_lens])
+        # the first step is kept, strided steps are selected from the rest of sequence
+        seq_lens = torch.as_tensor(x.seq_lens, device=x.payload.device)
+        steps = strided_select(PaddedBatch(x.payload[:, 1:], seq_lens), self.step_size)
+        out = torch.cat([x.payload[:, :1], steps.payload], dim=1)
+        out_lens = (seq_lens // self.step_size).clamp(max=1)
 
         return PaddedBatch(out, out_lens)
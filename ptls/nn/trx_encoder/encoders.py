@@ -2,11 +2,53 @@ import torch
 import torch.nn as nn
 
 
+def flat_to_padded(values: torch.Tensor, offsets: torch.Tensor, max_len: int) -> torch.Tensor:
+    """Scatter flat values of shape `(N, ...)` into zero padded tensor of shape `(B, max_len, ...)`.
+    Sequence `b` is `values[offsets[b]:offsets[b + 1]]`.
+    """
+    seq_lens = offsets[1:] - offsets[:-1]
+    mask = torch.arange(max_len, device=offsets.device).unsqueeze(0) < seq_lens.unsqueeze(1)
+    out = values.new_zeros((len(seq_lens), max_len) + values.size()[1:])
+    out[mask.to(values.device)] = values
+    return out
+
+
+def per_row_forward_batch(embedder, values, offsets: torch.Tensor, max_len: int) -> torch.Tensor:
+    """Adapter for per-row embedders. `embedder` is called for each sequence and results are padded"""
+    bounds = offsets.tolist()
+    embeddings = [embedder(values[start:end]) for start, end in zip(bounds[:-1], bounds[1:])]
+    out = torch.nn.utils.rnn.pad_sequence(embeddings, batch_first=True)
+    if out.size(1) < max_len:
+        out = torch.nn.functional.pad(out, (0, 0) * (out.dim() - 2) + (0, max_len - out.size(1)))
+    return out
+
+
 class BaseEncoder(nn.Module):
+    """Base class for custom embedders of `TrxEncoder`.
+
+    `forward` gets a single sequence. `forward_batch` gets valid transactions of the whole batch
+    and returns padded tensor. Default `forward_batch` calls `forward` for each sequence,
+    override it with vectorized implementation.
+    """
     def __init__(self, col_name: str = None):
         super().__init__()
         self.col_name = col_name
 
+    def forward_batch(self, values, offsets: torch.Tensor, max_len: int) -> torch.Tensor:
+        """Embeddings for all sequences of batch
+
+        Parameters
+        ----------
+        values: valid transactions of all sequences, concatenated. Tensor or numpy array of shape `(N, ...)`
+        offsets: tensor of shape `(B + 1,)`. Sequence `b` is `values[offsets[b]:offsets[b + 1]]`
+        max_len: padded sequence length
+
+        Returns
+        -------
+        Zero padded tensor of shape `(B, max_len, output_size)`
+        """
+        return per_row_forward_batch(self, values, offsets, max_len)
+
     @property
     def output_size(self) -> int:
         raise NotImplementedError()
@@ -20,6 +62,9 @@ class IdentityEncoder(BaseEncoder):
     def forward(self, x: torch.Tensor) -> torch.Tensor:
         return x
 
+    def forward_batch(self, values, offsets, max_len):
+        return flat_to_padded(torch.as_tensor(values), offsets, max_len)
+
     @property
     def output_size(self) -> int:
         return self.__output_size
@@ -0,0 +1,191 @@
+from typing import Dict
+
+import torch
+from torch import nn as nn
+from torch.nn import functional as F
+
+from ptls.nn.trx_encoder.noisy_embedding import NoisyEmbedding
+
+
+class FusedEmbeddingTable:
+    """View of one table in `FusedNoisyEmbedding`. Provides `nn.Embedding` attributes.
+    Call makes a plain lookup without noise and dropout.
+    """
+    def __init__(self, fused, name):
+        self._fused = fused
+        self.name = name
+        self.num_embeddings, self.embedding_dim = fused.table_shapes[name]
+        self.padding_idx = fused.table_padding_idx[name]
+
+    @property
+    def weight(self):
+        return self._fused.table_weight(self.name)
+
+    def __call__(self, x):
+        return F.embedding(x, self.weight, self.padding_idx)
+
+
+class FusedNoisyEmbedding(nn.Module):
+    """All categorical embedding tables in one weight matrix.
+
+    Tables are stacked by rows with per-feature row offsets. Tables narrower than the widest one
+    are padded with zero columns. Indexes of shape `(B, T, F)` are shifted by row offsets and embeddings
+    of all features are gathered with single `embedding` call. Padding columns are removed with
+    one `gather` when tables have different sizes. Out-of-index processing is vectorized over features.
+    This removes per-feature python and kernel launch overhead when there are a lot of small tables.
+
+    Semantics of `NoisyEmbedding` are kept:
+        - padding indexes of all tables are mapped to a shared zero row 0, which isn't updated by gradient.
+          Own padding rows of tables are kept in weight for checkpoint compatibility,
+        - dropout (spatial or not) is applied to output,
+        - gaussian noise with per-feature scale is added to output in train mode.
+
+    `state_dict` has per-table keys `{name}.weight`, the same as `ModuleDict` with `nn.Embedding`,
+    so checkpoints are compatible with not fused layout in both directions.
+    Mapping interface (`keys`, `items`, `[name]`) returns `FusedEmbeddingTable` views.
+
+    Parameters
+        embeddings:
+            dict with `nn.Embedding` or `NoisyEmbedding` tables. Weights are copied.
+            Dropout parameters should be the same for all tables.
+        out_of_index:
+            'clip' or 'assert', like in `TrxEncoderBase`
+    """
+    def __init__(self, embeddings: Dict[str, nn.Embedding], out_of_index: str = 'clip'):
+        super().__init__()
+        if out_of_index not in ('clip', 'assert'):
+            raise AttributeError(f'Unknown out_of_index value: {out_of_index}')
+        self.out_of_index = out_of_index
+
+        dropout_params = set()
+        for name, emb in embeddings.items():
+            if not isinstance(emb, nn.Embedding):
+                raise AttributeError(f'Only `nn.Embedding` tables can be fused, found {type(emb)} for "{name}"')
+            if emb.max_norm is not None or emb.scale_grad_by_freq or emb.sparse:
+                raise AttributeError(f'`max_norm`, `scale_grad_by_freq` and `sparse` are not supported '
+                                     f'for fused embeddings, found in "{name}"')
+            if isinstance(emb, NoisyEmbedding):
+                dropout_params.add((emb.dropout.p, emb.spatial_dropout))
+            else:
+                dropout_params.add((0.0, False))
+        if len(dropout_params) > 1:
+            raise AttributeError(f'All tables should have the same dropout, found {dropout_params}')
+        dropout, self.spatial_dropout = dropout_params.pop() if dropout_params else (0.0, False)
+        self.dropout = nn.Dropout2d(dropout) if self.spatial_dropout else nn.Dropout(dropout)
+
+        self.names = list(embeddings.keys())
+        self.table_shapes = {name: tuple(emb.weight.size()) for name, emb in embeddings.items()}
+        self.table_padding_idx = {name: emb.padding_idx for name, emb in embeddings.items()}
+        self.table_offsets = {}
+        self.width = max((dim for _, dim in self.table_shapes.values()), default=0)
+
+        # row 0 is a shared padding row
+        offset = 1
+        row_offset, padding, columns, col_noise = [], [], [], []
+        weight = [torch.zeros(1, self.width)]
+        for i, (name, emb) in enumerate(embeddings.items()):
+            num_embeddings, embedding_dim = self.table_shapes[name]
+            self.table_offsets[name] = offset
+            row_offset.append(offset)
+            padding.append(-1 if emb.padding_idx is None else emb.padding_idx)
+            columns.extend(i * self.width + j for j in range(embedding_dim))
+            col_noise.extend([getattr(emb, 'scale', 0.0)] * embedding_dim)
+            weight.append(F.pad(emb.weight.detach(), (0, self.width - embedding_dim)))
+            offset += num_embeddings
+
+        self.weight = nn.Parameter(torch.cat(weight))
+        self.register_buffer('max_index', torch.tensor(
+            [self.table_shapes[name][0] - 1 for name in self.names], dtype=torch.long), persistent=False)
+        self.register_buffer('row_offset', torch.tensor(row_offset, dtype=torch.long), persistent=False)
+        self.register_buffer('padding_idx', torch.tensor(padding, dtype=torch.long), persistent=False)
+        self.register_buffer('columns', torch.tensor(columns, dtype=torch.long), persistent=False)
+        self.register_buffer('col_noise', torch.tensor(col_noise, dtype=torch.float), persistent=False)
+        self.has_noise = any(v > 0 for v in col_noise)
+        self.is_same_size = all(dim == self.width for _, dim in self.table_shapes.values())
+
+    @property
+    def embedding_dim(self):
+        return len(self.columns)
+
+    def table_weight(self, name):
+        """`(num_embeddings, embedding_dim)` view of table weight"""
+        num_embeddings, embedding_dim = self.table_shapes[name]
+        offset = self.table_offsets[name]
+        return self.weight[offset:offset + num_embeddings, :embedding_dim]
+
+    def keys(self):
+        return list(self.names)
+
+    def values(self):
+        return [self[name] for name in self.names]
+
+    def items(self):
+        return [(name, self[name]) for name in self.names]
+
+    def __getitem__(self, name):
+        if name not in self.table_shapes:
+            raise KeyError(name)
+        return FusedEmbeddingTable(self, name)
+
+    def __contains__(self, name):
+        return name in self.table_shapes
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def get_indexes(self, payload: Dict[str, torch.Tensor]):
+        """Stacked indexes of shape `(B, T, F)` with out-of-index processing for all features"""
+        indexes = torch.stack([payload[name].long() for name in self.names], dim=-1)
+        if self.out_of_index == 'clip':
+            return indexes.clamp(min=torch.zeros_like(self.max_index), max=self.max_index)
+        out_of_index = ((indexes < 0) | (indexes > self.max_index)).flatten(0, -2).any(dim=0)
+        if out_of_index.any():
+            names = [self.names[i] for i in out_of_index.nonzero()[:, 0].tolist()]
+            raise IndexError(f'Found indexes greater than dictionary size for {names}')
+        return indexes
+
+    def forward(self, payload: Dict[str, torch.Tensor]):
+        """Concatenated embeddings of shape `(B, T, H)` for features from payload dict"""
+        indexes = self.get_indexes(payload)
+        rows = torch.where(indexes == self.padding_idx, 0, indexes + self.row_offset)
+        x = F.embedding(rows, self.weight, padding_idx=0).flatten(-2)  # B, T, F * W
+        if not self.is_same_size:
+            x = x.gather(-1, self.columns.expand(*x.size()[:-1], -1))
+
+        if self.spatial_dropout:
+            x = self.dropout(x.permute(0, 2, 1).unsqueeze(3)).squeeze(3).permute(0, 2, 1)
+        else:
+            x = self.dropout(x)
+        if self.training and self.has_noise:
+            x = x + torch.randn_like(self.col_noise) * self.col_noise
+        return x
+
+    def _save_to_state_dict(self, destination, prefix, keep_vars):
+        for name in self.names:
+            weight = self.table_weight(name)
+            destination[prefix + name + '.weight'] = weight if keep_vars else weight.detach()
+
+    def _load_from_state_dict(self, state_dict, prefix, local_metadata, strict,
+                              missing_keys, unexpected_keys, error_msgs):
+        expected = set()
+        for name in self.names:
+            key = prefix + name + '.weight'
+            expected.add(key)
+            if key not in state_dict:
+                missing_keys.append(key)
+                continue
+            value = state_dict[key]
+            weight = self.table_weight(name)
+            if value.size() != weight.size():
+                error_msgs.append(f'size mismatch for {key}: copying a param with shape {tuple(value.size())} '
+                                  f'from checkpoint, the shape in current model is {tuple(weight.size())}.')
+                continue
+            with torch.no_grad():
+                weight.copy_(value)
+        if strict:
+            for key in state_dict.keys():
+                if key.startswith(prefix) and key not in expected:
+                    unexpected_keys.append(key)
@@ -5,6 +5,7 @@ import torch
 from ptls.constant_repository import TORCH_EMB_DTYPE
 from ptls.data_load.padded_batch import PaddedBatch
 from ptls.nn.trx_encoder.batch_norm import RBatchNorm, RBatchNormWithLens
+from ptls.nn.trx_encoder.fused_embedding import FusedNoisyEmbedding
 from ptls.nn.trx_encoder.noisy_embedding import NoisyEmbedding
 from ptls.nn.trx_encoder.trx_encoder_base import TrxEncoderBase
 
@@ -61,6 +62,11 @@ class TrxEncoder(TrxEncoderBase):
             'clip' - values will be collapsed to maximum index. This works well for frequency encoded categories.
                 We join infrequent categories to one.
             'assert' - raise an error of invalid index appear.
+        fused_embeddings:
+            if True then all categorical tables are stored in one `FusedNoisyEmbedding` and
+            looked up with a single call. Faster on CPU with a lot of categorical features and small batches,
+            and when all embeddings have the same size. Checkpoints are compatible with default per-table layout.
+            `embeddings[name]` returns a table view instead of `NoisyEmbedding` module in this mode.
 
         norm_embeddings: keep default value for this parameter
         clip_replace_value: Not useed. keep default value for this parameter
@@ -97,6 +103,7 @@ class TrxEncoder(TrxEncoderBase):
                  orthogonal_init=False,
                  linear_projection_size=0,
                  out_of_index: str = 'clip',
+                 fused_embeddings: bool = False,
                  ):
         if clip_replace_value is not None:
             warnings.warn('`clip_replace_value` attribute is deprecated. Always "clip to max" used. '
@@ -155,6 +162,9 @@ class TrxEncoder(TrxEncoderBase):
                 if n == 'linear_projection_head.weight':
                     torch.nn.init.orthogonal_(p.data)
 
+        if fused_embeddings:
+            self.embeddings = FusedNoisyEmbedding(self.embeddings, out_of_index=out_of_index)
+
     def forward(self, x: PaddedBatch, names=None, seq_len=None):
         if isinstance(x, PaddedBatch) is False:
             pre_x = dict()
@@ -162,8 +172,11 @@ class TrxEncoder(TrxEncoderBase):
                 pre_x[field_name] = x[i]
             x = PaddedBatch(pre_x, seq_len)
 
-        processed_embeddings = [self.get_category_embeddings(x, field_name)
-                                for field_name in self.embeddings.keys()]
+        if isinstance(self.embeddings, FusedNoisyEmbedding):
+            processed_embeddings = [self.embeddings(x.payload)] if len(self.embeddings) > 0 else []
+        else:
+            processed_embeddings = [self.get_category_embeddings(x, field_name)
+                                    for field_name in self.embeddings.keys()]
         processed_custom_embeddings = [self.get_custom_embeddings(x, field_name)
                                        for field_name in self.custom_embeddings.keys()]
         if len(processed_custom_embeddings):
@@ -3,11 +3,40 @@ from typing import Dict, Union
 import numpy as np
 import torch
 from ptls.data_load.padded_batch import PaddedBatch
-from ptls.nn.trx_encoder.encoders import BaseEncoder
+from ptls.nn.trx_encoder.encoders import BaseEncoder, IdentityEncoder, per_row_forward_batch
 from ptls.nn.trx_encoder.scalers import IdentityScaler, scaler_by_name
 from torch import nn as nn
 
 
+def flatten_seq_feature(v, seq_lens: torch.Tensor):
+    """Valid transactions of all sequences for batched custom embedders.
+
+    Parameters
+    ----------
+    v: padded tensor of shape `(B, T, ...)` or list with `B` variable length arrays or tensors
+    seq_lens: sequence lengths, used for padded tensor
+
+    Returns
+    -------
+    values: concatenated valid transactions of shape `(N, ...)`. Numpy array when `v` is a list of numpy arrays
+    offsets: tensor of shape `(B + 1,)`. Sequence `b` is `values[offsets[b]:offsets[b + 1]]`
+    max_len: padded length
+    """
+    if isinstance(v, torch.Tensor):
+        seq_lens = seq_lens.to(v.device)
+        mask = torch.arange(v.size(1), device=v.device).unsqueeze(0) < seq_lens.unsqueeze(1)
+        lens, values, max_len = seq_lens, v[mask], v.size(1)
+    else:
+        lens = torch.tensor([len(row) for row in v], dtype=torch.long, device=seq_lens.device)
+        if all(isinstance(row, torch.Tensor) for row in v):
+            values = torch.cat(list(v))
+        else:
+            values = np.concatenate(v, axis=0)
+        max_len = int(lens.max()) if len(lens) > 0 else 0
+    offsets = torch.cat([lens.new_zeros(1), lens.cumsum(0)])
+    return values, offsets, max_len
+
+
 class TrxEncoderBase(nn.Module):
     """Base class for TrxEncoders.
 
@@ -117,7 +146,10 @@ class TrxEncoderBase(nn.Module):
 
     def get_custom_embeddings(self, x: PaddedBatch, col_name: str):
         """Returns embeddings given by custom embedder
-        
+
+        Valid transactions of all sequences are passed to `embedder.forward_batch` in one call.
+        Embedders without `forward_batch` are called for each sequence.
+
         Parameters
         ----------
         x: PaddedBatch with feature dict. Each value is `(B, T)` size
@@ -127,12 +159,13 @@ class TrxEncoderBase(nn.Module):
         col_name = col_name if embedder.col_name is None else embedder.col_name
         if isinstance(embedder, IdentityScaler):
             return embedder(x.payload[col_name])
-        
-        embeddings = torch.nn.utils.rnn.pad_sequence([
-            embedder(trx_value)
-            for trx_value in x.payload[col_name]], batch_first=True
-        )
-        return embeddings
+        if isinstance(embedder, IdentityEncoder) and isinstance(x.payload[col_name], torch.Tensor):
+            return x.payload[col_name]
+
+        values, offsets, max_len = flatten_seq_feature(x.payload[col_name], x.seq_lens)
+        if hasattr(embedder, 'forward_batch'):
+            return embedder.forward_batch(values, offsets, max_len)
+        return per_row_forward_batch(embedder, values, offsets, max_len)
 
     def _get_custom_embeddings(self, x: PaddedBatch, col_name: str):
         """Returns embeddings given by custom embedder
@@ -181,12 +214,10 @@ class TrxEncoderBase(nn.Module):
 
     @property
     def category_names(self):
-        """Returns set of used feature names
+        """Returns set of used feature names. `numeric_values` are stored in `custom_embeddings`
         """
         return set(list(self.embeddings.keys()) +
-                   list(self.numeric_values.keys()) +
-                   list(self.custom_embeddings.keys()) +
-                   list(self.identity_embeddings.keys())
+                   list(self.custom_embeddings.keys())
                    )
 
     @property
@@ -4,6 +4,7 @@ import torch
 from torch import nn as nn
 
 from ptls.data_load.padded_batch import PaddedBatch
+from ptls.nn.masked_reduce import masked_mean
 from ptls.nn.trx_encoder.scalers import scaler_by_name
 
 
@@ -27,8 +28,8 @@ class TrxMeanEncoder(nn.Module):
             processed.append(self.embeddings[field_name](x.payload[field_name]).detach())
 
         for value_name, scaler in self.scalers.items():
-            var = scaler(x.payload[value_name].unsqueeze(-1).float())
-            means = torch.tensor([e[:l].mean() for e, l in zip(var, x.seq_lens)]).unsqueeze(-1)
+            var = scaler(x.payload[value_name].float())  # B, T, 1
+            means = masked_mean(PaddedBatch(var, x.seq_lens))
             processed.append(means)
 
         out = torch.cat(processed, -1)
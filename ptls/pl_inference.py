@@ -9,7 +9,9 @@ from omegaconf import DictConfig
 from torch.utils.data.dataloader import DataLoader
 
 from ptls.data_load.utils import collate_feature_dict
+from ptls.frames.incremental_inference import HiddenStateStore, IncrementalRnnEncoder
 from ptls.frames.inference_module import InferenceModule
+from ptls.frames.prediction_sink import PredictionSink, FILE_EXTENSIONS
 
 logger = logging.getLogger(__name__)
 
@@ -45,9 +47,42 @@ def main(conf: DictConfig):
         pl_module = hydra.utils.instantiate(conf.pl_module)
         pl_module.load_state_dict(torch.load(seq_encoder['f'])['state_dict'])
         seq_encoder = pl_module.seq_encoder
+
+    # incremental mode: `RnnSeqEncoder` hidden states are kept between runs, only new transactions are processed
+    state_store = None
+    state_store_conf = conf.inference.get('state_store', None)
+    if state_store_conf is not None:
+        state_store = HiddenStateStore(
+            state_store_conf.path,
+            state_shape=(seq_encoder.seq_encoder.num_layers, seq_encoder.seq_encoder.hidden_size),
+        )
+        logger.info(f'Loaded {len(state_store)} hidden states from "{state_store_conf.path}"')
+        seq_encoder = IncrementalRnnEncoder(
+            seq_encoder, state_store,
+            col_id=state_store_conf.get('col_id', 'client_id'),
+            col_time=state_store_conf.get('col_time', 'event_time'),
+        )
+
+    # streaming mode: batches are written by `PredictionSink` callback, predictions aren't collected in memory
+    output_conf = conf.inference.output
+    sink = None
+    if output_conf.get('streaming', False):
+        if output_conf.format not in FILE_EXTENSIONS:
+            raise AttributeError(f'Format "{output_conf.format}" is not supported with `streaming: true`. '
+                                 f'One of {list(FILE_EXTENSIONS)} expected')
+        sink = PredictionSink(
+            f'{output_conf.path}.{FILE_EXTENSIONS[output_conf.format]}',
+            format=output_conf.format,
+            row_group_size=output_conf.get('row_group_size', 100000),
+            max_rows_per_file=output_conf.get('max_rows_per_file', 1000000),
+            resume=output_conf.get('resume', False),
+            col_id=output_conf.get('col_id', None),
+        )
+
     model = InferenceModule(
         model=seq_encoder,
         pandas_output=True, model_out_name='emb',
+        arrow_output=sink is not None,
     )
     model.model.is_reduce_sequence = True
 
@@ -74,7 +109,20 @@ def main(conf: DictConfig):
         else:
             accelerator = "cpu"
             devices = 0
-    df_scores = pl.Trainer(accelerator=accelerator, devices=devices, max_epochs=-1).predict(model, inference_dl)
+    if state_store is not None and devices not in (0, 1):
+        logger.warning('Hidden state store supports single process inference. Used `devices=1`')
+        devices = 1
+    trainer = pl.Trainer(accelerator=accelerator, devices=devices, max_epochs=-1,
+                         callbacks=[sink] if sink is not None else None)
+    if sink is not None:
+        inference_dl = sink.skip_existing(inference_dl)
+    df_scores = trainer.predict(model, inference_dl, return_predictions=sink is None)
+    if state_store is not None:
+        state_store.flush()
+        logger.info(f'{len(state_store)} hidden states saved to "{state_store_conf.path}"')
+    if sink is not None:
+        return
+
     df_scores = pd.concat(df_scores, axis=0)
     logger.info(f'df_scores examples: {df_scores.shape}:')
 
@@ -84,7 +84,6 @@ class DataPreprocessor(BaseEstimator, TransformerMixin):
             col_name_original=self.cl_id,
             cols_first_item=self.cols_first_item,
             return_records=self.return_records,
-            n_jobs=self.n_jobs,
         ) if isinstance(self.t_user_group, str) or self.t_user_group is None else self.t_user_group
 
         if isinstance(self.ct_event_time, str):  # use as is
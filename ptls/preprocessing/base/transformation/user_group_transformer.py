@@ -1,10 +1,13 @@
+import warnings
 from typing import List
 
-import joblib
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import torch
-from joblib import delayed, Parallel
 
+from ptls.data_load.datasets.flat_array_dataset import FlatArrayWriter
 from ptls.preprocessing.base.transformation.col_numerical_transformer import ColTransformer
 
 
@@ -12,14 +15,25 @@ class UserGroupTransformer(ColTransformer):
     """Groups transactions by user. Splits it by features.
     'event_time' column should be in dataset. We use it to order transactions
 
+    Grouping is vectorized: rows are sorted by (user_id, event_time) with `np.lexsort`,
+    user boundaries are found with `np.flatnonzero(np.diff(...))` and each column is split by offsets.
+    Users are processed by chunks of `chunk_size`. Use `transform_to_flat_array` or `transform_to_parquet`
+    to stream chunks to disk without list of dicts for all users.
+
+    Input is a dataframe or an iterable of dataframes (like `pd.read_csv(..., chunksize=...)`
+    or parquet batches). Only one input chunk is sorted at once with iterable input, so memory is limited
+    by chunk size. All rows of each user should be in one chunk or in consecutive chunks in this case,
+    e.g. source is sorted or partitioned by user id. Rows of the last user of a chunk are joined with the next chunk.
+    `ValueError` is raised when a user appears in not consecutive chunks.
+
     Args:
         col_name_original: Column name with user_id - key for grouping
         cols_first_item: Only first value will be taken for these columns.
                 All values as tensor will be taken for other columns
         return_records: False: Result is a dataframe. Use `.to_dict(orient='records')` to transform
             it to `ptls` format. True: Result is a list of dicts - `ptls` format
-        n_jobs: Number of workers requested by the callers. Passing n_jobs=-1 means requesting all
-            available workers for instance matching the number of CPU cores on the worker host(s).
+        n_jobs: Deprecated, not used. Grouping is vectorized and runs in one process
+        chunk_size: Number of users which are converted together
 
     """
 
@@ -28,16 +42,20 @@ class UserGroupTransformer(ColTransformer):
         col_name_original: str,
         cols_first_item: List[str] = None,
         return_records: bool = False,
-        n_jobs: int = -1,
+        n_jobs: int = None,
+        chunk_size: int = 100000,
     ):
         super().__init__(
             col_name_original=col_name_original,
             col_name_target=None,
             is_drop_original_col=False,
         )
+        if n_jobs is not None:
+            warnings.warn('`n_jobs` is not used by `UserGroupTransformer` and will be removed', DeprecationWarning)
         self.cols_first_item = cols_first_item if cols_first_item is not None else []
         self.return_records = return_records
         self.n_jobs = n_jobs
+        self.chunk_size = chunk_size
 
     def __repr__(self):
         return "Aggregate transformation"
@@ -53,59 +71,133 @@ class UserGroupTransformer(ColTransformer):
                 f'"event_time" not in source dataframe. ' f"Found {x.columns}"
             )
 
-    def _convert_type(self, group_name, group_df):
-        group = {}
-
-        for k, v in group_df.to_dict(orient="series").items():
-            if k in self.cols_first_item:
-                v = v.iloc[0]
-            elif isinstance(v.iloc[0], torch.Tensor):
-                v = torch.vstack(tuple(v))
-            elif v.dtype == "object":
-                v = v.values
-            else:
-                v = torch.from_numpy(v.values)
-            group[k] = v
-        group[self.col_name_original] = group_name
-        return group
-
     def fit(self, x):
-        self._event_time_exist(x)
+        if isinstance(x, pd.DataFrame):
+            self._event_time_exist(x)
         return self
 
-    # def df_to_feature_arrays(self, df):
-    #     with joblib.parallel_backend(backend="threading", n_jobs=self.n_jobs):
-    #         parallel = Parallel(verbose=1)
-    #         result_dict = parallel(
-    #             delayed(self._convert_type)(group_name, df_group)
-    #             for group_name, df_group in df
-    #         )
-    #
-    #     return result_dict
-
-    def df_to_feature_arrays(self, df):
-        def decide(k, v):
-            if k in self.cols_first_item:
-                return v.iloc[0]
-            elif isinstance(v.iloc[0], torch.Tensor):
-                return torch.vstack(tuple(v))
-            elif v.dtype == 'object':
-                return v.values
+    def _sort_index(self, ids: np.ndarray, event_time: np.ndarray):
+        """Row order sorted by (user_id, event_time) and user offsets in this order.
+        Rows with null user_id are dropped like `groupby` does.
+        """
+        codes, uniques = pd.factorize(ids, sort=True)
+        valid_ix = np.flatnonzero(codes >= 0)
+        order = valid_ix[np.lexsort((event_time[valid_ix], codes[valid_ix]))]
+        starts = np.flatnonzero(np.diff(codes[order])) + 1
+        offsets = np.concatenate([[0], starts, [len(order)]]).astype(np.int64)
+        return order, np.asarray(uniques), offsets
+
+    def _iter_input_arrays(self, x):
+        """Input chunks as dicts with numpy array for each column. Each column is converted once per chunk.
+        Rows of the last user of each chunk are moved to the next chunk
+        """
+        if isinstance(x, pd.DataFrame):
+            self._event_time_exist(x)
+            yield {col: x[col].to_numpy() for col in x.columns}
+            return
+
+        carry = None
+        for chunk in x:
+            self._event_time_exist(chunk)
+            arrays = {col: chunk[col].to_numpy() for col in chunk.columns}
+            if carry is not None:
+                arrays = {col: np.concatenate([carry[col], v]) for col, v in arrays.items()}
+            ids = arrays[self.col_name_original]
+            if len(ids) == 0:
+                continue
+            is_last_user = ids == ids[-1]
+            carry = {col: v[is_last_user] for col, v in arrays.items()}
+            if not is_last_user.all():
+                yield {col: v[~is_last_user] for col, v in arrays.items()}
+        if carry is not None:
+            yield carry
+
+    def _iter_groups(self, x):
+        """`iter_columns` with output column list"""
+        emitted_ids = None if isinstance(x, pd.DataFrame) else set()
+        for arrays in self._iter_input_arrays(x):
+            columns = [self.col_name_original] + [col for col in arrays if col != self.col_name_original]
+            order, uniques, offsets = self._sort_index(arrays[self.col_name_original], arrays["event_time"])
+            if emitted_ids is not None:
+                repeated = emitted_ids.intersection(uniques.tolist())
+                if len(repeated) > 0:
+                    raise ValueError(f'Users {sorted(repeated)[:10]} are found in not consecutive input chunks')
+                emitted_ids.update(uniques.tolist())
+
+            for start in range(0, len(uniques), self.chunk_size):
+                end = min(start + self.chunk_size, len(uniques))
+                row_ix = order[offsets[start]:offsets[end]]
+                chunk_starts = offsets[start:end] - offsets[start]
+                lengths = np.diff(offsets[start:end + 1])
+
+                seq_arrays, scalar_arrays = {}, {self.col_name_original: uniques[start:end]}
+                for col in columns[1:]:
+                    values = arrays[col][row_ix]
+                    if col in self.cols_first_item:
+                        scalar_arrays[col] = values[chunk_starts]
+                    else:
+                        seq_arrays[col] = values
+                yield columns, seq_arrays, {col: lengths for col in seq_arrays}, scalar_arrays
+
+    def iter_columns(self, x):
+        """Grouped data in columnar format by chunks of `chunk_size` users.
+
+        Args:
+            x: dataframe or iterable of dataframes, see class description
+
+        Yields:
+            tuple with `seq_arrays` (flat values of sequential features for all users in chunk),
+            `seq_lengths` (sequence length of each user) and `scalar_arrays` (user id and `cols_first_item`).
+            Compatible with `ptls.data_load.datasets.FlatArrayWriter.write_columns`
+        """
+        for _, seq_arrays, seq_lengths, scalar_arrays in self._iter_groups(x):
+            yield seq_arrays, seq_lengths, scalar_arrays
+
+    def _columns_to_frame(self, columns, seq_arrays, seq_lengths, scalar_arrays):
+        data = {k: pd.Series(v) for k, v in scalar_arrays.items()}
+        for k, v in seq_arrays.items():
+            lengths = seq_lengths[k]
+            if len(v) > 0 and isinstance(v[0], torch.Tensor):
+                bounds = np.concatenate([[0], np.cumsum(lengths)])
+                groups = [torch.vstack(tuple(v[s:e])) for s, e in zip(bounds[:-1], bounds[1:])]
+            elif v.dtype == "object":
+                groups = np.split(v, np.cumsum(lengths)[:-1])
             else:
-                return torch.from_numpy(v.values)
-
-        return pd.Series({k: decide(k, v)
-                          for k, v in df.to_dict(orient='series').items()})
-
-    def transform(self, x: pd.DataFrame):
-        x["et_index"] = x.loc[:, "event_time"]
-        x = (
-            x.set_index([self.col_name_original, "et_index"])
-            .sort_index()
-            .groupby(self.col_name_original)
-        )
-        # x = self.df_to_feature_arrays(x)
-        x = x.apply(self.df_to_feature_arrays).reset_index()
-
-        # x = x if self.return_records else pd.Series(x)
+                groups = torch.from_numpy(v).split(lengths.tolist())
+            data[k] = pd.Series(list(groups), dtype=object)
+        return pd.DataFrame(data)[columns]
+
+    def transform(self, x):
+        chunks = [self._columns_to_frame(*chunk) for chunk in self._iter_groups(x)]
+        if len(chunks) > 0:
+            x = pd.concat(chunks, ignore_index=True)
+        else:
+            columns = [self.col_name_original] + [col for col in x.columns if col != self.col_name_original] \
+                if isinstance(x, pd.DataFrame) else []
+            x = pd.DataFrame(columns=columns)
         return x.to_dict(orient="records") if self.return_records else x
+
+    def transform_to_flat_array(self, x, path: str):
+        """Group users and save them in `ptls.data_load.datasets.FlatArrayDataset` format by chunks
+        """
+        writer = FlatArrayWriter(path)
+        for chunk in self.iter_columns(x):
+            writer.write_columns(*chunk)
+        writer.close()
+
+    def transform_to_parquet(self, x, path: str):
+        """Group users and save them to parquet file with list columns by chunks.
+        The file can be read with `ptls.data_load.datasets.ParquetDataset`
+        """
+        writer = None
+        for columns, seq_arrays, seq_lengths, scalar_arrays in self._iter_groups(x):
+            arrays = {k: pa.array(v) for k, v in scalar_arrays.items()}
+            for k, v in seq_arrays.items():
+                offsets = np.concatenate([[0], np.cumsum(seq_lengths[k])]).astype(np.int64)
+                arrays[k] = pa.LargeListArray.from_arrays(pa.array(offsets), pa.array(v))
+            table = pa.table({k: arrays[k] for k in columns})
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+        if writer is not None:
+            writer.close()
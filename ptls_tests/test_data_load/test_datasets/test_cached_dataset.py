@@ -0,0 +1,119 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+import torch
+
+from ptls.data_load.datasets import ParquetDataset, CachedIterableDataset
+from ptls.data_load.iterable_processing import SeqLenFilter
+
+
+def get_parquet_file(tmp_path, n=50):
+    rs = np.random.RandomState(42)
+    seq_lens = rs.randint(1, 12, n)
+    df = pd.DataFrame({
+        'client_id': np.arange(n),
+        'mcc': [rs.randint(0, 10, l) for l in seq_lens],
+        'amount': [rs.rand(l) for l in seq_lens],
+    })
+    path = str(tmp_path / 'data.parquet')
+    df.to_parquet(path)
+    return path
+
+
+def get_dataset(path, cache_path, min_seq_len=5):
+    return CachedIterableDataset(ParquetDataset([path], i_filters=[SeqLenFilter(min_seq_len=min_seq_len)]),
+                                 cache_path, batch_size=7)
+
+
+def test_cached_dataset(tmp_path):
+    path = get_parquet_file(tmp_path)
+    cache_path = str(tmp_path / 'cache')
+    dataset = get_dataset(path, cache_path)
+    expected = list(dataset)
+    assert len(os.listdir(os.path.join(cache_path, dataset.cache_key))) == 1
+
+    os.remove(path)  # second pass doesn't read source
+    records = list(dataset)
+    assert len(records) == len(expected) > 0
+    for rec, exp in zip(records, expected):
+        assert rec['client_id'] == exp['client_id']
+        torch.testing.assert_close(rec['mcc'], exp['mcc'])
+        torch.testing.assert_close(rec['amount'], exp['amount'])
+
+
+def test_cached_dataset_invalidation(tmp_path):
+    path = get_parquet_file(tmp_path)
+    cache_path = str(tmp_path / 'cache')
+    key = get_dataset(path, cache_path).cache_key
+    assert get_dataset(path, cache_path).cache_key == key
+    assert get_dataset(path, cache_path, min_seq_len=6).cache_key != key
+
+    pd.read_parquet(path).iloc[:40].to_parquet(path)
+    assert get_dataset(path, cache_path).cache_key != key
+
+
+def test_cached_dataset_interrupted(tmp_path):
+    path = get_parquet_file(tmp_path)
+    cache_path = str(tmp_path / 'cache')
+    dataset = get_dataset(path, cache_path)
+    gen = iter(dataset)
+    next(gen)
+    gen.close()
+    assert os.listdir(os.path.join(cache_path, dataset.cache_key)) == []
+
+
+def test_cached_dataset_workers(tmp_path):
+    path = get_parquet_file(tmp_path)
+    paths = [str(tmp_path / f'part_{i}.parquet') for i in range(2)]
+    df = pd.read_parquet(path)
+    df.iloc[:25].to_parquet(paths[0])
+    df.iloc[25:].to_parquet(paths[1])
+    dataset = CachedIterableDataset(ParquetDataset(paths), str(tmp_path / 'cache'))
+    for _ in range(2):
+        dl = torch.utils.data.DataLoader(dataset, batch_size=None, num_workers=2)
+        assert sorted(rec['client_id'] for rec in dl) == list(range(50))
+    assert len(os.listdir(str(tmp_path / 'cache' / dataset.cache_key))) == 2
+
+
+def test_cached_dataset_value_types(tmp_path):
+    records = [{'client_id': np.int64(i), 'name': f'c{i}', 'mcc': torch.arange(i + 1),
+                'amount': np.arange(i + 1, dtype=np.float32)} for i in range(5)]
+    dataset = CachedIterableDataset(records, str(tmp_path / 'cache'))
+    for _ in range(2):
+        for rec, exp in zip(dataset, records):
+            assert {k: type(v) for k, v in rec.items()} == {k: type(v) for k, v in exp.items()}
+            assert rec['client_id'] == exp['client_id'] and rec['name'] == exp['name']
+            assert not isinstance(rec['amount'], np.memmap)
+            np.testing.assert_equal(rec['amount'], exp['amount'])
+
+
+def test_cached_dataset_dir_invalidation(tmp_path):
+    data_path = tmp_path / 'data'
+    data_path.mkdir()
+    path = get_parquet_file(data_path)
+    cache_path = str(tmp_path / 'cache')
+    key = CachedIterableDataset(ParquetDataset(str(data_path)), cache_path).cache_key
+    assert CachedIterableDataset(ParquetDataset(str(data_path)), cache_path).cache_key == key
+
+    pd.read_parquet(path).iloc[:40].to_parquet(data_path / 'data_2.parquet')
+    assert CachedIterableDataset(ParquetDataset(str(data_path)), cache_path).cache_key != key
+
+
+def test_fingerprint_runtime_attributes(tmp_path):
+    from ptls.data_load.datasets.cached_dataset import fingerprint
+
+    path = get_parquet_file(tmp_path)
+    dataset = ParquetDataset([path], i_filters=[SeqLenFilter(min_seq_len=5)])
+    key = fingerprint(dataset)
+    list(dataset)
+    assert fingerprint(dataset) == key
+
+
+def test_cached_dataset_list_field(tmp_path):
+    records = [{'client_id': i, 'lst': [1, 2], 'mcc': torch.arange(i + 1)} for i in range(5)]
+    dataset = CachedIterableDataset(records, str(tmp_path / 'cache'))
+    with pytest.raises(TypeError):
+        list(dataset)
+    assert os.listdir(os.path.join(str(tmp_path / 'cache'), dataset.cache_key)) == []
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import torch
+
+from ptls.data_load.datasets import FlatArrayDataset, ParquetDataset, save_flat_array_dataset, \
+    parquet_to_flat_array_dataset
+from ptls.data_load.length_bucket_sampler import get_dataset_seq_lens
+
+
+def get_records():
+    return [{
+        'client_id': i,
+        'name': f'c{i}',
+        'target': 0.5 * i,
+        'event_time': torch.arange(seq_len),
+        'amount': torch.rand(seq_len),
+        'emb': torch.rand(seq_len, 3),
+    } for i, seq_len in enumerate([3, 0, 5, 1, 7])]
+
+
+def test_save_and_read(tmp_path):
+    records = get_records()
+    save_flat_array_dataset(records, str(tmp_path / 'flat'), batch_size=2)
+    dataset = FlatArrayDataset(str(tmp_path / 'flat'))
+    assert len(dataset) == len(records)
+    for i, expected in enumerate(records):
+        rec = dataset[i]
+        assert rec.keys() == expected.keys()
+        for k, v in expected.items():
+            if isinstance(v, torch.Tensor):
+                torch.testing.assert_close(rec[k], v)
+            else:
+                assert rec[k] == v
+    np.testing.assert_equal(get_dataset_seq_lens(dataset), [3, 0, 5, 1, 7])
+
+
+def test_parquet_to_flat_array(tmp_path):
+    rs = np.random.RandomState(42)
+    seq_lens = rs.randint(1, 12, 30)
+    df = pd.DataFrame({
+        'client_id': np.arange(30),
+        'mcc': [rs.randint(0, 10, l) for l in seq_lens],
+        'amount': [rs.rand(l) for l in seq_lens],
+    })
+    df.to_parquet(str(tmp_path / 'data.parquet'), row_group_size=8)
+    parquet_to_flat_array_dataset(str(tmp_path / 'data.parquet'), str(tmp_path / 'flat'), batch_size=7)
+
+    dataset = FlatArrayDataset(str(tmp_path / 'flat'))
+    records = list(ParquetDataset([str(tmp_path / 'data.parquet')]))
+    assert len(dataset) == len(records)
+    for expected, rec in zip(records, (dataset[i] for i in range(len(dataset)))):
+        assert rec['client_id'] == expected['client_id']
+        torch.testing.assert_close(rec['mcc'], expected['mcc'])
+        torch.testing.assert_close(rec['amount'], expected['amount'])
@@ -0,0 +1,221 @@
+import numpy as np
+import pandas as pd
+import torch
+
+from ptls.data_load.columnar_batch import collate_columnar_batch
+from ptls.data_load.datasets import ParquetDataset
+from ptls.data_load.utils import collate_feature_dict
+
+
+def get_parquet_file(tmp_path, n=30):
+    rs = np.random.RandomState(42)
+    seq_lens = rs.randint(1, 12, n)
+    df = pd.DataFrame({
+        'client_id': np.arange(n),
+        'target': rs.rand(n),
+        'mcc': [rs.randint(0, 10, l) for l in seq_lens],
+        'amount': [rs.rand(l) for l in seq_lens],
+        'trans_time': [np.sort(rs.randint(0, 10 ** 9, l)).astype('datetime64[s]') for l in seq_lens],
+    })
+    path = str(tmp_path / 'data.parquet')
+    df.to_parquet(path, row_group_size=8)
+    return path
+
+
+def test_parquet_dataset_records(tmp_path):
+    path = get_parquet_file(tmp_path)
+    records = list(ParquetDataset([path]))
+    assert len(records) == 30
+    assert records[0]['client_id'] == 0
+    assert type(records[0]['mcc']) is torch.Tensor
+    assert 'trans_time' not in records[0]
+    assert len(records[0]['hour']) == len(records[0]['mcc'])
+
+
+def test_parquet_dataset_columnar_same_as_collate(tmp_path):
+    path = get_parquet_file(tmp_path)
+    records = list(ParquetDataset([path]))
+    batches = list(ParquetDataset([path], columnar=True, columnar_batch_size=7))
+    assert sum(len(b) for b in batches) == 30
+
+    expected = collate_feature_dict(records[:7])
+    pb = collate_columnar_batch(batches[0])
+    torch.testing.assert_close(pb.seq_lens, expected.seq_lens)
+    assert pb.payload.keys() == expected.payload.keys()
+    for k, v in expected.payload.items():
+        torch.testing.assert_close(pb.payload[k], v)
+
+
+def test_columnar_batch_slice(tmp_path):
+    path = get_parquet_file(tmp_path)
+    records = list(ParquetDataset([path]))
+    batch = next(iter(ParquetDataset([path], columnar=True, columnar_batch_size=8)))
+    pb = batch.slice(3, 6).to_padded_batch()
+    expected = collate_feature_dict(records[3:6])
+    torch.testing.assert_close(pb.payload['mcc'], expected.payload['mcc'])
+    torch.testing.assert_close(pb.payload['client_id'], expected.payload['client_id'])
+
+
+def test_plan_parquet_shards(tmp_path):
+    from ptls.data_load.datasets.parquet_sharding import get_parquet_work_units, plan_parquet_shards, shard_num_rows
+
+    path = get_parquet_file(tmp_path, n=100)
+    units = get_parquet_work_units([path])
+    assert len(units) == 13
+    assert sum(unit.num_rows for unit in units) == 100
+
+    shards = plan_parquet_shards(units, 4)
+    assert sorted(unit for shard in shards for unit in shard) == sorted(units)
+    assert [shard_num_rows(shard) for shard in shards] == [28, 24, 24, 24]
+
+
+def test_parquet_dataset_row_group_sharding(tmp_path):
+    path = get_parquet_file(tmp_path, n=100)
+    dataset = ParquetDataset([path], row_group_sharding=True, shuffle_files=True)
+    dl = torch.utils.data.DataLoader(dataset, batch_size=None, num_workers=3)
+    client_ids = sorted(rec['client_id'] for rec in dl)
+    assert client_ids == list(range(100))
+
+    batches = list(ParquetDataset([path], row_group_sharding=True, columnar=True, columnar_batch_size=5))
+    assert sum(len(b) for b in batches) == 100
+
+
+def test_parquet_dataset_columns(tmp_path):
+    from ptls.nn import TrxEncoder
+
+    path = get_parquet_file(tmp_path)
+    records = list(ParquetDataset([path], columns=['client_id', 'hour']))
+    assert set(records[0].keys()) == {'client_id', 'local_day', 'local_month', 'local_weekday', 'hour'}
+
+    trx_encoder = TrxEncoder(embeddings={'mcc': {'in': 10, 'out': 4}})
+    records = list(ParquetDataset([path], trx_encoder=trx_encoder, columns=['client_id']))
+    assert set(records[0].keys()) == {'client_id', 'mcc', 'target'}
+
+
+def test_parquet_dataset_columns_scaler_alias(tmp_path):
+    from ptls.nn import TrxEncoder
+    from ptls.nn.trx_encoder.scalers import LogScaler
+
+    path = get_parquet_file(tmp_path)
+    trx_encoder = TrxEncoder(embeddings={'mcc': {'in': 10, 'out': 4}},
+                             numeric_values={'amount_log': LogScaler(col_name='amount')})
+    records = list(ParquetDataset([path], trx_encoder=trx_encoder, columns=['client_id']))
+    assert set(records[0].keys()) == {'client_id', 'mcc', 'amount', 'target'}
+    assert trx_encoder(collate_feature_dict(records[:4])).payload.size(2) == 5
+
+
+def test_parquet_dataset_filter_pushdown(tmp_path):
+    from ptls.data_load.iterable_processing import IdFilter, SeqLenFilter, FeatureFilter
+    from ptls.data_load.datasets.parquet_pushdown import get_filter_expression, get_matching_row_groups
+    import pyarrow.parquet as pq
+
+    path = get_parquet_file(tmp_path, n=100)
+    i_filters = [
+        IdFilter(id_col='client_id', relevant_ids=list(np.arange(10, 30))),
+        SeqLenFilter(min_seq_len=4),
+        FeatureFilter(drop_feature_names=['amount'], keep_feature_names=['client_id']),
+    ]
+    expression = get_filter_expression(pq.read_schema(path), i_filters)
+    assert get_matching_row_groups(path, expression) == [1, 2, 3]
+
+    expected = list(ParquetDataset([path], i_filters=i_filters, filter_pushdown=False))
+    records = list(ParquetDataset([path], i_filters=i_filters))
+    assert len(records) == len(expected) > 0
+    for rec, exp in zip(records, expected):
+        assert rec.keys() == exp.keys()
+        assert 'amount' not in rec
+        for k, v in exp.items():
+            np.testing.assert_equal(np.asarray(rec[k]), np.asarray(v))
+
+    dataset = ParquetDataset([path], i_filters=i_filters, row_group_sharding=True)
+    assert len(dataset._get_work_units()) == 3
+    records = list(dataset)
+    assert len(records) == len(expected)
+    for rec, exp in zip(records, expected):
+        np.testing.assert_equal(rec['mcc'].numpy(), exp['mcc'].numpy())
+
+
+def test_parquet_dataset_read_ahead(tmp_path):
+    path = get_parquet_file(tmp_path, n=100)
+    expected = list(ParquetDataset([path]))
+    dataset = ParquetDataset([path], read_ahead=2, read_ahead_max_bytes=2 ** 20)
+    records = list(dataset)
+    assert dataset.read_ahead_stats.n_items == 13
+    assert len(records) == len(expected)
+    for rec, exp in zip(records, expected):
+        assert rec.keys() == exp.keys()
+        torch.testing.assert_close(rec['amount'], exp['amount'])
+
+    batches = list(ParquetDataset([path], read_ahead=2, columnar=True, columnar_batch_size=5))
+    assert sum(len(b) for b in batches) == 100
+
+    dl = torch.utils.data.DataLoader(ParquetDataset([path], row_group_sharding=True, read_ahead=3),
+                                     batch_size=None, num_workers=2)
+    assert sorted(rec['client_id'] for rec in dl) == list(range(100))
+
+
+def test_parquet_dataset_interleave_files(tmp_path):
+    df = pd.read_parquet(get_parquet_file(tmp_path, n=100))
+    paths = []
+    for i in range(4):
+        paths.append(str(tmp_path / f'part_{i}.parquet'))
+        df.iloc[i * 25:(i + 1) * 25].to_parquet(paths[-1])
+
+    records = list(ParquetDataset(paths, interleave_files=2))
+    client_ids = [rec['client_id'] for rec in records]
+    assert sorted(client_ids) == list(range(100))
+    assert client_ids != list(range(100))
+    assert set(client_ids[:20]) <= set(range(50))
+
+
+def test_parquet_dataset_interleave_files_epoch(tmp_path):
+    from ptls.data_load.iterable_processing import IterableShuffle
+
+    df = pd.read_parquet(get_parquet_file(tmp_path, n=100))
+    paths = []
+    for i in range(4):
+        paths.append(str(tmp_path / f'part_{i}.parquet'))
+        df.iloc[i * 25:(i + 1) * 25].to_parquet(paths[-1])
+
+    i_filter = IterableShuffle(buffer_size=10, seed=1)
+    dataset = ParquetDataset(paths, interleave_files=2, i_filters=[i_filter])
+    # non-persistent workers iterate over a fresh copy of dataset each epoch
+    dl = torch.utils.data.DataLoader(dataset, batch_size=None, num_workers=1)
+    epochs = []
+    for epoch in [0, 1, 0]:
+        dataset.set_epoch(epoch)
+        torch.manual_seed(0)
+        epochs.append([rec['client_id'] for rec in dl])
+    assert i_filter._epoch == 0
+    assert sorted(epochs[0]) == sorted(epochs[1]) == list(range(100))
+    assert epochs[0] != epochs[1]
+    assert epochs[0] == epochs[2]
+
+
+def test_iter_with_max_num_zero():
+    from ptls.data_load.datasets.parquet_dataset import iter_with_max_num, iter_columnar_with_max_num
+
+    assert list(iter_with_max_num(range(5), 0)) == []
+    assert list(iter_with_max_num(range(5), 2)) == [0, 1]
+    assert list(iter_columnar_with_max_num(iter([[1, 2]]), 0)) == []
+
+
+def test_distributed_row_group_sharding_empty_shards(tmp_path):
+    import pytest
+    from ptls.data_load.datasets import DistributedParquetDataset
+
+    path = get_parquet_file(tmp_path, n=100)
+    dataset = DistributedParquetDataset([path], row_group_sharding=True)
+    dataset.real_worker_id, dataset.real_num_workers = 0, 20
+    with pytest.warns(UserWarning, match='no row groups'):
+        assert dataset._calc_min_items_per_worker() == 0
+
+
+def test_distributed_filters_without_repeat_items(tmp_path):
+    import pytest
+    from ptls.data_load.datasets import DistributedParquetDataset
+    from ptls.data_load.iterable_processing import SeqLenFilter
+
+    path = get_parquet_file(tmp_path)
+    with pytest.warns(UserWarning, match='repeat_items'):
+        DistributedParquetDataset([path], i_filters=[SeqLenFilter(min_seq_len=4)], repeat_items=False)
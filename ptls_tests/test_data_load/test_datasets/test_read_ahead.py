@@ -0,0 +1,49 @@
+import time
+
+import numpy as np
+import pytest
+
+from ptls.data_load.datasets.read_ahead import ReadAheadIterator
+
+
+def test_read_ahead_order():
+    it = ReadAheadIterator(range(20), lambda x: x * 2, depth=3)
+    assert list(it) == list(range(0, 40, 2))
+    assert it.stats.n_items == 20
+
+
+def test_read_ahead_error():
+    def load(x):
+        if x == 3:
+            raise ValueError('bad item')
+        return x
+
+    it = iter(ReadAheadIterator(range(10), load))
+    assert [next(it) for _ in range(3)] == [0, 1, 2]
+    with pytest.raises(ValueError):
+        next(it)
+
+
+def test_read_ahead_early_stop():
+    loaded = []
+
+    def load(x):
+        loaded.append(x)
+        return x
+
+    it = iter(ReadAheadIterator(range(1000), load, depth=2))
+    assert next(it) == 0
+    it.close()
+    assert len(loaded) < 10
+
+
+def test_read_ahead_max_bytes():
+    it = ReadAheadIterator(range(10), lambda x: np.zeros(100, dtype=np.int8), depth=5, max_bytes=250)
+    for _ in it:
+        time.sleep(0.01)
+    assert it.stats.max_queue_bytes <= 250
+    assert it.stats.producer_wait_time > 0
+
+    it = ReadAheadIterator(range(3), lambda x: np.zeros(100, dtype=np.int8), depth=5, max_bytes=50)
+    assert len(list(it)) == 3
+    assert it.stats.max_queue_bytes == 100
@@ -63,3 +63,44 @@ def test_simple_processing():
     recs = [rec for rec in ds]
 
     assert str(recs) == expected
+
+
+def test_multiple_workers():
+    source = f"""
+        (SELECT range % 17 AS id, range AS dt, range * 2 AS sum FROM range(200))
+        """
+    ds = DuckDbDataset(
+        data_read_func=source,
+        col_id='id',
+        col_event_time='dt',
+        col_event_fields=['sum'],
+        rows_per_batch=5,
+    )
+    expected = {rec['id']: rec['sum'].tolist() for rec in ds}
+    assert len(expected) == 17
+
+    dl = torch.utils.data.DataLoader(ds, batch_size=None, num_workers=2)
+    recs = [rec for rec in dl]
+    assert len(recs) == 17
+    assert {rec['id']: rec['sum'].tolist() for rec in recs} == expected
+
+
+def test_default_connection_view():
+    import warnings
+
+    import duckdb
+
+    duckdb.sql('CREATE OR REPLACE VIEW test_duckdb_dataset_view AS '
+               'SELECT range % 3 AS id, range AS dt, range * 2 AS sum FROM range(12)')
+    ds = DuckDbDataset(
+        data_read_func='test_duckdb_dataset_view',
+        col_id='id',
+        col_event_time='dt',
+        col_event_fields=['sum'],
+    )
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', DeprecationWarning)
+        recs = list(ds)
+    assert {rec['id']: rec['sum'].tolist() for rec in recs} == {
+        0: [0, 6, 12, 18], 1: [2, 8, 14, 20], 2: [4, 10, 16, 22]}
+    duckdb.sql('DROP VIEW test_duckdb_dataset_view')
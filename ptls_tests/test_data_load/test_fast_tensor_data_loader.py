@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+import torch
+
+from ptls.data_load.fast_tensor_data_loader import FastTensorDataLoader, save_padded_buckets, \
+    PaddedBucketDataLoader
+
+
+def get_data(n=50):
+    rs = np.random.RandomState(42)
+    return [{
+        'client_id': i,
+        'mcc': torch.from_numpy(rs.randint(1, 10, l)),
+        'amount': torch.from_numpy(rs.rand(l)).float(),
+        'target': float(i % 2),
+    } for i, l in enumerate(rs.randint(1, 30, n))]
+
+
+def test_fast_tensor_data_loader():
+    dl = FastTensorDataLoader(torch.arange(10), torch.arange(10) * 2, batch_size=4)
+    batches = list(dl)
+    assert len(batches) == len(dl) == 3
+    torch.testing.assert_close(batches[-1][1], torch.tensor([16, 18]))
+
+
+def test_padded_bucket_data_loader(tmp_path):
+    data = get_data()
+    save_padded_buckets(data, str(tmp_path), n_buckets=3, max_bucket_records=10)
+    dl = PaddedBucketDataLoader(str(tmp_path), batch_size=4)
+    batches = list(dl)
+    assert len(batches) == len(dl)
+
+    index = dl.get_index()
+    assert sorted(index.tolist()) == list(range(50))
+    i = 0
+    for pb in batches:
+        assert pb.payload['mcc'].size(1) == pb.seq_lens.max()
+        for j in range(len(pb)):
+            rec = data[index[i]]
+            assert pb.payload['client_id'][j] == rec['client_id']
+            l = pb.seq_lens[j]
+            torch.testing.assert_close(pb.payload['mcc'][j, :l], rec['mcc'])
+            torch.testing.assert_close(pb.payload['amount'][j, :l], rec['amount'])
+            assert (pb.payload['mcc'][j, l:] == 0).all()
+            i += 1
+    assert i == 50
+
+    dl = PaddedBucketDataLoader(str(tmp_path), batch_size=4, shuffle=True)
+    assert sorted(pb.payload['client_id'][j].item() for pb in dl for j in range(len(pb))) == list(range(50))
+
+    with pytest.raises(AttributeError):
+        save_padded_buckets(data[:10], str(tmp_path), n_buckets=3)
+
+
+def test_padded_bucket_data_loader_old_torch_load(tmp_path, monkeypatch):
+    torch_load = torch.load
+
+    def old_torch_load(f, map_location=None):
+        """`torch.load` signature without `mmap` and `weights_only`"""
+        return torch_load(f, map_location=map_location, weights_only=False)
+
+    save_padded_buckets(get_data(), str(tmp_path), n_buckets=3, max_bucket_records=10)
+    monkeypatch.setattr(torch, 'load', old_torch_load)
+    dl = PaddedBucketDataLoader(str(tmp_path), batch_size=4)
+    assert sorted(dl.get_index().tolist()) == list(range(50))
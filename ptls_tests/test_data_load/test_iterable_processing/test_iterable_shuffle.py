@@ -57,3 +57,34 @@ def test_small_buffer_with_target():
     assert sum(data) == 45
     data = sorted(data)
     assert data == [0, 1, 2, 3, 4, 5, 6, 7, 8, 9]
+
+
+def test_seed_and_epoch():
+    i_filter = IterableShuffle(buffer_size=50, seed=1)
+    epoch_0 = list(i_filter(range(1000)))
+    epoch_1 = list(i_filter(range(1000)))
+    assert sorted(epoch_0) == sorted(epoch_1) == list(range(1000))
+    assert epoch_0 != epoch_1
+
+    same_seed = IterableShuffle(buffer_size=50, seed=1)
+    assert list(same_seed(range(1000))) == epoch_0
+
+
+def test_set_epoch():
+    i_filter = IterableShuffle(buffer_size=50, seed=1)
+    epoch_0 = list(i_filter(range(1000)))
+    i_filter.set_epoch(1)
+    epoch_1 = list(i_filter(range(1000)))
+    i_filter.set_epoch(0)
+    assert list(i_filter(range(1000))) == epoch_0
+    assert epoch_0 != epoch_1
+
+
+def test_interleave():
+    from ptls.data_load.iterable_processing.iterable_shuffle import interleave
+
+    sources = [range(i * 100, (i + 1) * 100) for i in range(5)]
+    data = list(interleave(sources, n_open=3, rng=np.random.default_rng(0)))
+    assert sorted(data) == list(range(500))
+    assert set(data[:10]) - set(range(300)) == set()
+    assert len({x // 100 for x in data[:10]}) > 1
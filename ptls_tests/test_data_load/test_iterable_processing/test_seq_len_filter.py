@@ -89,3 +89,20 @@ def test_with_target():
     data = i_filter(get_data_with_target())
     data = [rec[0]['uid'] for rec in data]
     assert data == ['1']
+
+
+def test_to_arrow_filter():
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    table = pa.table({'seq_len': [2, 5, 8], 'a': [[1, 2], [1] * 5, [1] * 8]})
+    i_filter = SeqLenFilter(min_seq_len=3, max_seq_len=6, seq_len_col='seq_len')
+    assert i_filter.required_columns() == ['seq_len']
+    expression = i_filter.to_arrow_filter(table.column_names)
+    assert ds.dataset(table).to_table(filter=expression)['seq_len'].to_pylist() == [5]
+
+    i_filter = SeqLenFilter(min_seq_len=3)
+    assert i_filter.required_columns() == []
+    assert i_filter.to_arrow_filter(table.column_names) is None
+    expression = i_filter.to_arrow_filter(table.column_names, default_sequence_col='a')
+    assert ds.dataset(table).to_table(filter=expression)['seq_len'].to_pylist() == [5, 8]
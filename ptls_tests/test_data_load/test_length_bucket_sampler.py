@@ -0,0 +1,71 @@
+import numpy as np
+import torch
+
+from ptls.data_load.length_bucket_sampler import LengthBucketBatchSampler, get_dataset_seq_lens
+from ptls.frames import PtlsDataModule
+from ptls.frames.coles import ColesDataset
+from ptls.frames.coles.split_strategy import SampleSlices
+
+
+def get_seq_lens():
+    return np.random.RandomState(42).randint(1, 200, 1000)
+
+
+def test_all_samples_once():
+    seq_lens = get_seq_lens()
+    sampler = LengthBucketBatchSampler(seq_lens, max_tokens=2000, bucket_size=300)
+    indexes = [i for batch in sampler for i in batch]
+    assert sorted(indexes) == list(range(1000))
+    assert len(sampler) == len(list(sampler))
+
+
+def test_token_budget():
+    seq_lens = get_seq_lens()
+    sampler = LengthBucketBatchSampler(seq_lens, max_tokens=2000, batch_size=16)
+    for batch in sampler:
+        assert len(batch) <= 16
+        assert len(batch) == 1 or len(batch) * seq_lens[batch].max() <= 2000
+
+
+def test_long_sequence_alone():
+    sampler = LengthBucketBatchSampler([5, 500, 5, 5], max_tokens=100, shuffle=False)
+    assert list(sampler) == [[0, 2, 3], [1]]
+
+
+def test_drop_last():
+    sampler = LengthBucketBatchSampler([10] * 25, max_tokens=100, shuffle=False, drop_last=True)
+    assert [len(b) for b in sampler] == [10, 10]
+    sampler = LengthBucketBatchSampler([10] * 25, max_tokens=100, shuffle=False, drop_last=False)
+    assert [len(b) for b in sampler] == [10, 10, 5]
+    sampler = LengthBucketBatchSampler([10] * 25, max_tokens=1000, batch_size=5, shuffle=False, drop_last=True)
+    assert [len(b) for b in sampler] == [5] * 5
+
+
+def test_epoch_shuffle():
+    sampler = LengthBucketBatchSampler(get_seq_lens(), max_tokens=2000)
+    epoch_0 = list(sampler)
+    assert epoch_0 == list(sampler)
+    sampler.set_epoch(1)
+    assert epoch_0 != list(sampler)
+
+
+def test_ddp_shards():
+    seq_lens = get_seq_lens()
+    shards = [list(LengthBucketBatchSampler(seq_lens, max_tokens=2000, num_replicas=3, rank=rank))
+              for rank in range(3)]
+    assert len(shards[0]) == len(shards[1]) == len(shards[2])
+    indexes = [i for shard in shards for batch in shard for i in batch]
+    assert set(indexes) == set(range(1000))
+
+
+def test_ptls_data_module_max_tokens():
+    data = [{'mcc': torch.arange(seq_len), 'event_time': torch.arange(seq_len)} for seq_len in get_seq_lens()[:100]]
+    dataset = ColesDataset(data, splitter=SampleSlices(split_count=2, cnt_min=1, cnt_max=50))
+    np.testing.assert_equal(get_dataset_seq_lens(dataset), get_seq_lens()[:100])
+
+    dl = PtlsDataModule(train_data=dataset, train_batch_size=8, train_max_tokens=400).train_dataloader()
+    assert isinstance(dl.batch_sampler, LengthBucketBatchSampler)
+    n_clients = 0
+    for x, y in dl:
+        n_clients += len(y.unique())
+    assert n_clients == 100
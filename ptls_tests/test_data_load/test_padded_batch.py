@@ -194,3 +194,37 @@ def test_padded_batch_keep_seq_features():
         ('target_array', False),
     ]:
         assert is_seq == (col in y.payload)
+
+
+def test_pickle_arena():
+    import pickle
+
+    pb = get_pb()
+    pb2 = pickle.loads(pickle.dumps(pb))
+    arena, header, views = pb2._arena
+    assert len(header) == 7
+    for k, v in pb.payload.items():
+        if type(v) is torch.Tensor:
+            torch.testing.assert_close(pb2.payload[k], v)
+            assert pb2.payload[k].untyped_storage().data_ptr() == arena.untyped_storage().data_ptr()
+        else:
+            np.testing.assert_equal(pb2.payload[k], v)
+    torch.testing.assert_close(pb2.seq_lens, pb.seq_lens)
+
+    pb2.payload['mcc'] = pb2.payload['mcc'] + 1
+    pb3 = pb2.to('cpu')
+    torch.testing.assert_close(pb3.payload['mcc'], pb.payload['mcc'] + 1)
+    torch.testing.assert_close(pb3.payload['event_time'], pb.payload['event_time'])
+
+
+def test_pickle_arena_data_loader():
+    dl = torch.utils.data.DataLoader([get_pb() for _ in range(4)], batch_size=None, num_workers=2)
+    for pb in dl:
+        assert pb._arena is not None
+        torch.testing.assert_close(pb.payload['mcc'], get_pb().payload['mcc'])
+
+
+def test_to_tensor_payload():
+    pb = PaddedBatch(torch.randn(2, 4, 3), torch.LongTensor([2, 4]))
+    pb2 = pb.to('cpu')
+    torch.testing.assert_close(pb2.payload, pb.payload)
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+import torch
+
+from ptls.data_load.partitioned_dataset import PartitionedDataset, PartitionedDataFiles
+
+
+def get_partitioned_data(tmp_path, n=40, sort=True):
+    rs = np.random.RandomState(42)
+    for mon in ['2014-01-31', '2014-02-28', '2014-03-31']:
+        for hash_id in range(2):
+            client_ids = np.arange(hash_id, n, 2)
+            client_ids = client_ids[rs.rand(len(client_ids)) < 0.7]
+            if not sort:
+                client_ids = client_ids[::-1]
+            seq_lens = rs.randint(1, 5, len(client_ids))
+            df = pd.DataFrame({
+                'client_id': client_ids,
+                'mcc': [rs.randint(0, 10, l) for l in seq_lens],
+                'amount': [rs.rand(l) for l in seq_lens],
+            })
+            path = tmp_path / f'mon={mon}' / f'hash_id={hash_id}'
+            path.mkdir(parents=True)
+            df.to_parquet(str(path / 'part1.parquet'), row_group_size=4)
+    return PartitionedDataFiles(str(tmp_path), dt_dtype='numpy.datetime64')
+
+
+def get_dataset(files, **params):
+    return PartitionedDataset(files.data_path, files.dt_parts, files.hash_parts, col_id='client_id', **params)
+
+
+def test_merge_sorted_same_as_in_memory(tmp_path):
+    files = get_partitioned_data(tmp_path)
+    expected = sorted(get_dataset(files), key=lambda rec: rec['client_id'])
+    records = list(get_dataset(files, merge_sorted=True))
+    ids = [rec['client_id'] for rec in records]
+    n_hash_0 = sum(_id % 2 == 0 for _id in ids)
+    assert ids[:n_hash_0] == sorted(_id for _id in ids if _id % 2 == 0)
+    assert ids[n_hash_0:] == sorted(_id for _id in ids if _id % 2 == 1)
+    records = sorted(records, key=lambda rec: rec['client_id'])
+    assert [rec['client_id'] for rec in records] == [rec['client_id'] for rec in expected]
+    for rec, exp in zip(records, expected):
+        torch.testing.assert_close(rec['mcc'], exp['mcc'])
+        torch.testing.assert_close(rec['amount'], exp['amount'])
+
+
+def test_merge_sorted_not_sorted(tmp_path):
+    files = get_partitioned_data(tmp_path, sort=False)
+    with pytest.raises(ValueError):
+        list(get_dataset(files, merge_sorted=True))
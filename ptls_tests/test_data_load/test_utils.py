@@ -108,3 +108,23 @@ def test_collate_feature_dict_inconsistent_missing():
     ]
     with pytest.raises(AssertionError):
         _ = collate_feature_dict(batch)
+
+
+def test_collate_feature_dict_same_as_pad_sequence():
+    g = torch.Generator().manual_seed(42)
+    batch = []
+    for seq_len in [5, 0, 3, 7]:
+        batch.append({
+            'mcc': torch.randint(0, 10, (seq_len,), generator=g),
+            'currency': torch.randint(0, 10, (seq_len,), generator=g),
+            'amount': torch.rand(seq_len, generator=g),
+            'event_time': torch.arange(seq_len).float(),
+            'emb': torch.rand(seq_len, 3, generator=g),
+            'short': torch.arange(seq_len // 2),
+        })
+    pb = collate_feature_dict(batch, pin_memory=True)
+    torch.testing.assert_close(pb.seq_lens, torch.LongTensor([5, 0, 3, 7]))
+    for k in batch[0].keys():
+        expected = torch.nn.utils.rnn.pad_sequence([x[k] for x in batch], batch_first=True)
+        assert pb.payload[k].dtype == expected.dtype
+        torch.testing.assert_close(pb.payload[k], expected)
@@ -2,7 +2,7 @@ import math
 import torch
 
 from ptls.frames.coles.metric import outer_cosine_similarity, outer_pairwise_distance, metric_recall_top_K, \
-    BatchRecallTopK
+    BatchRecallTopK, outer_distance_topk
 
 
 def test_outer_cosine_similarity1():
@@ -49,6 +49,28 @@ def test_outer_pairwise_distance2():
     assert torch.allclose(dists, true_dists, atol=1e-5)
 
 
+def test_outer_pairwise_distance_tiles():
+    torch.manual_seed(42)
+    x = torch.randn(50, 8)
+    y = torch.randn(30, 8)
+    true_dists = (x.unsqueeze(1) - y.unsqueeze(0)).pow(2).sum(dim=2).sqrt()
+    assert torch.allclose(outer_pairwise_distance(x, y, max_size=100), true_dists, atol=1e-5)
+    assert torch.allclose(outer_pairwise_distance(x, max_size=100).diag(), torch.zeros(50), atol=1e-5)
+
+
+def test_outer_distance_topk():
+    torch.manual_seed(42)
+    x = torch.randn(50, 8)
+    labels = torch.arange(10).repeat(5)
+    dists = outer_pairwise_distance(x)
+    dists[labels.view(-1, 1) == labels.view(1, -1)] = float('inf')
+    true_values, true_indices = dists.topk(3, dim=0, largest=False)
+
+    values, indices = outer_distance_topk(x, k=3, labels_A=labels, max_size=100)
+    assert torch.equal(indices, true_indices)
+    assert torch.allclose(values, true_values, atol=1e-5)
+
+
 def get_ml_data():
     b, c, h = 3, 2, 2  # Batch, num Classes, Hidden size
     x = torch.tensor([[0., 1.],       # 0
@@ -93,3 +115,11 @@ def test_batch_recall_top2_steps():
     res = metric.compute()
     true_value = 17 / 48
     assert abs(res - true_value) < 1e-6
+
+
+def test_outer_pairwise_distance_self_gradient():
+    x = torch.randn(6, 4, requires_grad=True)
+    dists = outer_pairwise_distance(x)
+    assert (dists.diagonal() > 0).all()
+    dists.sum().backward()
+    assert torch.isfinite(x.grad).all()
@@ -82,6 +82,21 @@ def test_hard_pair_selector():
     assert torch.equal(negative_pairs, true_negative_pairs)
 
 
+def test_hard_pair_selector_tiles():
+    torch.manual_seed(42)
+    x = torch.randn(40, 4)
+    y = torch.randint(0, 6, (40,))
+    positive_pairs, negative_pairs = HardNegativePairSelector(neg_count=3).get_pairs(x, y)
+    positive_pairs_tiles, negative_pairs_tiles = HardNegativePairSelector(neg_count=3, max_size=50).get_pairs(x, y)
+    check_positive_pairs(positive_pairs, y)
+    check_negative_pairs(negative_pairs, y)
+
+    true_positive_pairs = torch.triu((y.view(-1, 1) == y.view(1, -1)).int(), diagonal=1).nonzero()
+    assert torch.equal(positive_pairs, true_positive_pairs)
+    assert torch.equal(positive_pairs_tiles, true_positive_pairs)
+    assert torch.equal(negative_pairs_tiles, negative_pairs)
+
+
 def test_distance_weighted_pair_selector():
     x, y = get_data()
     sampling_strategy = DistanceWeightedPairSelector(batch_k=3)
@@ -0,0 +1,48 @@
+import numpy as np
+import torch
+
+from ptls.frames.coles import ColesDataset
+from ptls.frames.coles.split_strategy import NoSplit, SampleSlices, SampleUniform, SampleUniformBySplitCount
+
+SEQ_LENS = np.array([0, 1, 3, 7, 10, 25, 50, 101])
+
+
+def test_split_batch_same_as_split():
+    for splitter in [NoSplit(), SampleUniform(split_count=3, seq_len=5), SampleUniformBySplitCount(split_count=4)]:
+        start_pos, lengths = splitter.split_batch(SEQ_LENS)
+        for i, seq_len in enumerate(SEQ_LENS):
+            expected = splitter.split(np.arange(seq_len))
+            assert len(expected) == start_pos.shape[1]
+            for ix, s, l in zip(expected, start_pos[i], lengths[i]):
+                np.testing.assert_equal(ix, np.arange(s, s + l))
+
+
+def test_sample_slices_split_batch():
+    splitter = SampleSlices(split_count=5, cnt_min=3, cnt_max=20, is_sorted=True)
+    start_pos, lengths = splitter.split_batch(SEQ_LENS)
+    assert start_pos.shape == (len(SEQ_LENS), 5)
+    assert (start_pos >= 0).all()
+    assert (start_pos + lengths <= SEQ_LENS.reshape(-1, 1)).all()
+    assert (np.diff(start_pos, axis=1) >= 0).all()
+    long_lengths = lengths[SEQ_LENS > 20]
+    assert ((long_lengths >= 3) & (long_lengths <= 20)).all()
+    np.testing.assert_equal(lengths[SEQ_LENS <= 3], SEQ_LENS[SEQ_LENS <= 3].reshape(-1, 1).repeat(5, axis=1))
+
+
+def test_coles_dataset_batch_split():
+    data = [{
+        'event_time': torch.arange(seq_len).float(),
+        'mcc': torch.randint(0, 10, (seq_len,)),
+        'client_id': i,
+    } for i, seq_len in enumerate([3, 10, 25, 40])]
+    splitter = SampleUniform(split_count=3, seq_len=8)
+    dataset = ColesDataset(data, splitter)
+    dataset_batch_split = ColesDataset(data, splitter, batch_split=True)
+
+    expected, expected_labels = dataset.collate_fn([dataset[i] for i in range(len(data))])
+    pb, labels = dataset_batch_split.collate_fn([dataset_batch_split[i] for i in range(len(data))])
+    torch.testing.assert_close(labels, expected_labels)
+    torch.testing.assert_close(pb.seq_lens, expected.seq_lens)
+    assert pb.payload.keys() == expected.payload.keys()
+    for k, v in expected.payload.items():
+        torch.testing.assert_close(pb.payload[k], v)
@@ -0,0 +1,63 @@
+from types import SimpleNamespace
+
+import torch
+
+from ptls.data_load.iterable_processing import IterableShuffle
+from ptls.frames.dataset_epoch import DatasetEpochCallback
+
+
+class EpochDataset(torch.utils.data.IterableDataset):
+    def __init__(self):
+        super().__init__()
+        self.epoch = None
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def __iter__(self):
+        return iter(range(4))
+
+
+def test_dataset_epoch_callback():
+    datasets = [EpochDataset() for _ in range(3)]
+    dataloaders = {'a': torch.utils.data.DataLoader(datasets[0]),
+                   'b': [torch.utils.data.DataLoader(datasets[1]), torch.utils.data.DataLoader(datasets[2])]}
+    trainer = SimpleNamespace(train_dataloader=dataloaders, current_epoch=3)
+    DatasetEpochCallback().on_train_epoch_start(trainer, None)
+    assert [d.epoch for d in datasets] == [3, 3, 3]
+
+
+def test_dataset_epoch_callback_with_trainer():
+    import pytorch_lightning as pl
+
+    class Model(pl.LightningModule):
+        def __init__(self):
+            super().__init__()
+            self.linear = torch.nn.Linear(1, 1)
+            self.seen = []
+
+        def training_step(self, batch, batch_idx):
+            self.seen.append(int(batch))
+            return self.linear(torch.ones(1, 1)).sum()
+
+        def configure_optimizers(self):
+            return torch.optim.SGD(self.parameters(), lr=0.01)
+
+    class ShuffledRange(torch.utils.data.IterableDataset):
+        def __init__(self):
+            super().__init__()
+            self.i_filter = IterableShuffle(buffer_size=5, seed=1)
+
+        def set_epoch(self, epoch):
+            self.i_filter.set_epoch(epoch)
+
+        def __iter__(self):
+            return self.i_filter(range(20))
+
+    model = Model()
+    dl = torch.utils.data.DataLoader(ShuffledRange(), batch_size=None, num_workers=1)
+    trainer = pl.Trainer(max_epochs=2, callbacks=[DatasetEpochCallback()], logger=False,
+                         enable_checkpointing=False, enable_progress_bar=False, enable_model_summary=False)
+    trainer.fit(model, dl)
+    assert sorted(model.seen[:20]) == sorted(model.seen[20:]) == list(range(20))
+    assert model.seen[:20] != model.seen[20:]
@@ -0,0 +1,65 @@
+import numpy as np
+import torch
+
+from ptls.data_load.utils import collate_feature_dict
+from ptls.frames.incremental_inference import HiddenStateStore, IncrementalRnnEncoder
+from ptls.nn import RnnSeqEncoder, TrxEncoder
+
+
+def get_seq_encoder():
+    torch.manual_seed(42)
+    return RnnSeqEncoder(
+        trx_encoder=TrxEncoder(
+            embeddings={'mcc': {'in': 10, 'out': 3}},
+            numeric_values={'amount': 'identity'},
+        ),
+        hidden_size=8,
+        packed=True,
+    ).eval()
+
+
+def get_data(seq_lens=(5, 3, 8, 1, 6)):
+    data = []
+    for i, seq_len in enumerate(seq_lens):
+        g = torch.Generator().manual_seed(i)
+        data.append({
+            'client_id': i,
+            'mcc': torch.randint(1, 10, (seq_len,), generator=g),
+            'amount': torch.rand(seq_len, generator=g),
+            'event_time': torch.arange(seq_len).float(),
+        })
+    return data
+
+
+def test_hidden_state_store(tmp_path):
+    store = HiddenStateStore(str(tmp_path), state_shape=(1, 4), capacity=2)
+    states, watermarks = store.get(['a', 'b'])
+    assert (states == 0).all()
+    assert np.isneginf(watermarks).all()
+
+    store.put(['a', 'b', 'c'], np.ones((3, 1, 4)) * np.array([1, 2, 3]).reshape(3, 1, 1), np.array([10, 20, 30]))
+    store.flush()
+
+    store = HiddenStateStore(str(tmp_path))
+    assert len(store) == 3
+    states, watermarks = store.get(['c', 'x', 'a'])
+    np.testing.assert_equal(states[:, 0, 0], [3, 0, 1])
+    np.testing.assert_equal(watermarks, [30, -np.inf, 10])
+
+
+def test_incremental_same_as_full(tmp_path):
+    seq_encoder = get_seq_encoder()
+    data = get_data()
+    with torch.no_grad():
+        emb_full = seq_encoder(collate_feature_dict(data))
+
+        first_part = [{k: v[:max(1, len(rec['mcc']) // 2)] if k != 'client_id' else v for k, v in rec.items()}
+                      for rec in data]
+        store = HiddenStateStore(str(tmp_path), state_shape=(1, 8))
+        IncrementalRnnEncoder(seq_encoder, store)(collate_feature_dict(first_part))
+        store.flush()
+
+        store = HiddenStateStore(str(tmp_path))
+        emb_incremental = IncrementalRnnEncoder(seq_encoder, store)(collate_feature_dict(data))
+
+    torch.testing.assert_close(emb_incremental, emb_full, atol=1e-2, rtol=0)
@@ -5,6 +5,7 @@ import pandas as pd
 from sklearn.metrics import roc_auc_score
 from itertools import chain
 import numpy as np
+import pyarrow as pa
 
 from ptls.data_load import PaddedBatch
 from ptls.data_load.utils import collate_feature_dict
@@ -181,3 +182,53 @@ def test_inference_module_record_drop_seq():
     df_out = pd.concat(pl.Trainer(accelerator="cpu", max_epochs=-1).predict(rnn_model, valid_loader))
     assert df_out.shape == (1000, 17)
     assert list(df_out.target)[0] == trx_data[0]['target']
+
+
+def _check_arrow_same_as_pandas(is_reduce_sequence, drop_seq_features):
+    lengths = (torch.rand(200)*30+1).long()
+    trx_data = gen_trx_data(lengths, target_type='multi_cls', use_feature_arrays_key=False)
+    valid_loader = torch.utils.data.DataLoader(trx_data, batch_size=64, collate_fn=collate_feature_dict)
+    seq_enc = get_rnn_seq_encoder_emb()
+    seq_enc.is_reduce_sequence = is_reduce_sequence
+    model = InferenceModule(model=seq_enc, drop_seq_features=drop_seq_features, model_out_name='pred')
+    trainer = pl.Trainer(accelerator="cpu", max_epochs=-1)
+    df_expected = pd.concat(trainer.predict(model, valid_loader)).reset_index(drop=True)
+
+    model.arrow_output = True
+    batches = trainer.predict(model, valid_loader)
+    assert all(type(b) is pa.RecordBatch for b in batches)
+    df_out = pa.Table.from_batches(batches).to_pandas()
+    assert sorted(df_out.columns) == sorted(df_expected.columns)
+    for col in df_expected.columns:
+        if df_expected[col].dtype.kind == 'O':
+            for a, b in zip(df_out[col], df_expected[col]):
+                np.testing.assert_array_almost_equal(a, b)
+        else:
+            np.testing.assert_array_almost_equal(df_out[col].values, df_expected[col].values, decimal=5)
+
+    model.embedding_format = 'list'
+    table = pa.Table.from_batches(trainer.predict(model, valid_loader))
+    assert pa.types.is_fixed_size_list(table.schema.field('pred').type)
+    assert len(table) == len(df_expected)
+
+
+def test_inference_module_arrow_record():
+    _check_arrow_same_as_pandas(is_reduce_sequence=True, drop_seq_features=True)
+    _check_arrow_same_as_pandas(is_reduce_sequence=True, drop_seq_features=False)
+
+
+def test_inference_module_arrow_sequence():
+    _check_arrow_same_as_pandas(is_reduce_sequence=False, drop_seq_features=True)
+    _check_arrow_same_as_pandas(is_reduce_sequence=False, drop_seq_features=False)
+
+
+def test_inference_module_multimodal_arrow():
+    from ptls.frames.inference_module import InferenceModuleMultimodal
+
+    x_out = {'epk_id': ['a', 'b', 'c'], 'emb': torch.rand(3, 4)}
+    model = InferenceModuleMultimodal(model=None, model_out_name='emb', arrow_output=True)
+    df_expected = InferenceModuleMultimodal.to_pandas(x_out)
+    df_out = model.to_arrow(x_out).to_pandas()
+    assert list(df_out.columns) == list(df_expected.columns)
+    np.testing.assert_array_almost_equal(df_out.iloc[:, 1:].values, df_expected.iloc[:, 1:].values)
+    assert df_out['epk_id'].tolist() == ['a', 'b', 'c']
@@ -0,0 +1,170 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+import pytorch_lightning as pl
+import torch
+
+from ptls.data_load.utils import collate_feature_dict
+from ptls.frames.inference_module import InferenceModule
+from ptls.frames.prediction_sink import PredictionSink
+from ptls_tests.test_frames.test_inference_module import get_rnn_seq_encoder_emb
+from ptls_tests.utils.data_generation import gen_trx_data
+
+
+def get_data(n=200):
+    lengths = (torch.rand(n) * 30 + 1).long()
+    trx_data = gen_trx_data(lengths, target_type='multi_cls', use_feature_arrays_key=False)
+    for i, rec in enumerate(trx_data):
+        rec['client_id'] = i
+    return trx_data
+
+
+def get_loader(data):
+    return torch.utils.data.DataLoader(data, batch_size=16, collate_fn=collate_feature_dict)
+
+
+def get_model():
+    seq_enc = get_rnn_seq_encoder_emb()
+    return InferenceModule(model=seq_enc, model_out_name='emb', arrow_output=True)
+
+
+def read_ipc(path):
+    from glob import glob
+    tables = []
+    for file_name in sorted(glob(f'{path}/part-*.arrows')):
+        with pa.OSFile(file_name, 'rb') as f:
+            tables.append(pa.ipc.open_stream(f).read_all())
+    return pa.concat_tables(tables).to_pandas()
+
+
+def test_sink_parquet_same_as_concat(tmp_path):
+    data = get_data()
+    model = get_model()
+    trainer = pl.Trainer(accelerator='cpu', max_epochs=-1)
+    df_expected = pa.Table.from_batches(trainer.predict(model, get_loader(data))).to_pandas()
+
+    path = str(tmp_path / 'scores.parquet')
+    sink = PredictionSink(path, row_group_size=50)
+    trainer = pl.Trainer(accelerator='cpu', max_epochs=-1, callbacks=[sink])
+    assert trainer.predict(model, get_loader(data), return_predictions=False) is None
+
+    assert sink.n_rows == 200
+    df = pd.read_parquet(path)
+    assert list(df.columns) == list(df_expected.columns)
+    np.testing.assert_array_almost_equal(df.drop(columns='client_id').values,
+                                         df_expected.drop(columns='client_id').values, decimal=5)
+    meta = pq.ParquetFile(next((tmp_path / 'scores.parquet').iterdir())).metadata
+    assert meta.num_row_groups == 4
+    assert all(meta.row_group(i).num_rows == 50 for i in range(4))
+
+
+def test_sink_max_rows_per_file(tmp_path):
+    path = str(tmp_path / 'scores.parquet')
+    sink = PredictionSink(path, row_group_size=32, max_rows_per_file=64)
+    trainer = pl.Trainer(accelerator='cpu', max_epochs=-1, callbacks=[sink])
+    trainer.predict(get_model(), get_loader(get_data()), return_predictions=False)
+    assert len(list((tmp_path / 'scores.parquet').iterdir())) == 4
+    assert len(pd.read_parquet(path)) == 200
+
+
+def test_sink_ipc(tmp_path):
+    path = str(tmp_path / 'scores.arrows')
+    sink = PredictionSink(path, format='ipc', row_group_size=40)
+    trainer = pl.Trainer(accelerator='cpu', max_epochs=-1, callbacks=[sink])
+    trainer.predict(get_model(), get_loader(get_data()), return_predictions=False)
+    df = read_ipc(path)
+    assert df['client_id'].tolist() == list(range(200))
+
+
+def test_sink_not_empty(tmp_path):
+    path = str(tmp_path / 'scores.parquet')
+    sink = PredictionSink(path)
+    sink.on_predict_start(pl.Trainer(accelerator='cpu'), None)
+    sink.write(pd.DataFrame({'client_id': [1, 2], 'emb': [0.1, 0.2]}))
+    sink.close()
+    with pytest.raises(AttributeError):
+        PredictionSink(path)
+
+
+@pytest.mark.parametrize('format', ['parquet', 'ipc'])
+def test_sink_resume(tmp_path, format):
+    data = get_data()
+    model = get_model()
+    path = str(tmp_path / 'scores')
+
+    sink = PredictionSink(path, format=format, col_id='client_id')
+    trainer = pl.Trainer(accelerator='cpu', max_epochs=-1, callbacks=[sink])
+    trainer.predict(model, get_loader(data[:120]), return_predictions=False)
+
+    sink = PredictionSink(path, format=format, resume=True, col_id='client_id')
+    assert sink.existing_ids == set(range(120))
+    loader = sink.skip_existing(get_loader(data))
+    assert len(loader.dataset) == 80
+    trainer = pl.Trainer(accelerator='cpu', max_epochs=-1, callbacks=[sink])
+    trainer.predict(model, loader, return_predictions=False)
+    assert sink.n_rows == 80
+
+    df = pd.read_parquet(path) if format == 'parquet' else read_ipc(path)
+    assert sorted(df['client_id'].tolist()) == list(range(200))
+
+
+def test_sink_resume_drops_existing_rows(tmp_path):
+    path = str(tmp_path / 'scores.parquet')
+    sink = PredictionSink(path, col_id='client_id')
+    sink.on_predict_start(pl.Trainer(accelerator='cpu'), None)
+    sink.write(pd.DataFrame({'client_id': [1, 2], 'emb': [0.1, 0.2]}))
+    sink.close()
+
+    sink = PredictionSink(path, resume=True, col_id='client_id')
+    sink.on_predict_start(pl.Trainer(accelerator='cpu'), None)
+    sink.write(pd.DataFrame({'client_id': [2, 3], 'emb': [0.2, 0.3]}))
+    sink.close()
+    assert sorted(pd.read_parquet(path)['client_id'].tolist()) == [1, 2, 3]
+
+
+def test_sink_resume_incomplete_file(tmp_path):
+    path = tmp_path / 'scores.parquet'
+    path.mkdir()
+    (path / 'part-00000-00000.parquet').write_bytes(b'PAR1broken')
+    sink = PredictionSink(str(path), resume=True, col_id='client_id')
+    assert sink.existing_ids == set()
+    assert (path / '_part-00000-00000.parquet.incomplete').exists()
+    assert sink._new_file_name().endswith('part-00000-00001.parquet')
+
+
+def test_sink_skip_existing_loader_params(tmp_path):
+    path = str(tmp_path / 'scores.parquet')
+    sink = PredictionSink(path, col_id='client_id')
+    sink.on_predict_start(pl.Trainer(accelerator='cpu'), None)
+    sink.write(pd.DataFrame({'client_id': [0, 1], 'emb': [0.1, 0.2]}))
+    sink.close()
+
+    sink = PredictionSink(path, resume=True, col_id='client_id')
+    data = get_data(20)
+    loader = torch.utils.data.DataLoader(data, batch_size=4, shuffle=True, drop_last=True,
+                                         collate_fn=collate_feature_dict, timeout=5)
+    loader = sink.skip_existing(loader)
+    assert len(loader.dataset) == 18
+    assert isinstance(loader.sampler, torch.utils.data.RandomSampler)
+    assert loader.drop_last and loader.timeout == 5 and len(loader) == 4
+
+    batch_sampler = torch.utils.data.BatchSampler(range(20), batch_size=4, drop_last=False)
+    with pytest.raises(AttributeError):
+        sink.skip_existing(torch.utils.data.DataLoader(data, batch_sampler=batch_sampler))
+
+
+def test_sink_resume_incomplete_file_renamed_by_other_rank(tmp_path, monkeypatch):
+    path = tmp_path / 'scores.parquet'
+    path.mkdir()
+    file_name = path / 'part-00000-00000.parquet'
+    file_name.write_bytes(b'PAR1broken')
+
+    def rename_by_other_rank(self, name):
+        file_name.rename(path / '_part-00000-00000.parquet.incomplete')
+        return pq.read_table(name)
+
+    monkeypatch.setattr(PredictionSink, '_read_file_ids', rename_by_other_rank)
+    sink = PredictionSink(str(path), resume=True, col_id='client_id')
+    assert sink.existing_ids == set()
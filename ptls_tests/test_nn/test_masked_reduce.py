@@ -0,0 +1,111 @@
+import numpy as np
+import pytest
+import torch
+
+from ptls.data_load.padded_batch import PaddedBatch
+from ptls.nn import masked_reduce
+from ptls.nn.seq_encoder.utils import AllStepsMeanHead, FlattenHead, MeanStepEncoder
+from ptls.nn.seq_step import LastMaxAvgEncoder, SkipStepEncoder
+
+
+def get_batch(B=6, T=9, H=(3,)):
+    seq_lens = torch.tensor([9, 1, 4, 7, 2, 5])[:B]
+    return PaddedBatch(torch.randn(B, T, *H), seq_lens)
+
+
+@pytest.mark.parametrize('H', [(), (3,), (2, 3)])
+@pytest.mark.parametrize('name, reduce', [
+    ('masked_sum', lambda e: e.sum(dim=0)),
+    ('masked_mean', lambda e: e.mean(dim=0)),
+    ('masked_max', lambda e: e.max(dim=0).values),
+    ('masked_min', lambda e: e.min(dim=0).values),
+    ('masked_std', lambda e: e.std(dim=0)),
+    ('last_valid', lambda e: e[-1]),
+])
+def test_reduce_same_as_loop(H, name, reduce):
+    x = get_batch(H=H)
+    expected = torch.stack([reduce(e[:l]) for e, l in zip(x.payload, x.seq_lens)])
+    torch.testing.assert_close(getattr(masked_reduce, name)(x), expected, equal_nan=True)
+
+
+def test_reduce_ignores_padding():
+    x = get_batch()
+    x_garbage = PaddedBatch(x.payload.masked_fill(~masked_reduce.valid_mask(x), 1e6), x.seq_lens)
+    for f in [masked_reduce.masked_mean, masked_reduce.masked_max, masked_reduce.masked_min,
+              masked_reduce.masked_std, masked_reduce.last_valid, masked_reduce.flatten_valid]:
+        torch.testing.assert_close(f(x_garbage), f(x), equal_nan=True)
+
+
+@pytest.mark.parametrize('fill', [float('nan'), float('inf')])
+def test_reduce_ignores_non_finite_padding(fill):
+    x = get_batch()
+    x_padded = PaddedBatch(x.payload.masked_fill(~masked_reduce.valid_mask(x), fill), x.seq_lens)
+    for f in [masked_reduce.masked_sum, masked_reduce.masked_mean, masked_reduce.masked_std,
+              masked_reduce.masked_max, masked_reduce.masked_min]:
+        torch.testing.assert_close(f(x_padded), f(x), equal_nan=True)
+    torch.testing.assert_close(MeanStepEncoder()(x_padded), MeanStepEncoder()(x))
+    torch.testing.assert_close(LastMaxAvgEncoder(use_seq_lens=True)(x_padded), LastMaxAvgEncoder(use_seq_lens=True)(x))
+
+
+def test_integer_max_min():
+    x = PaddedBatch(torch.tensor([[3, 1, 9], [-2, 5, 7]]), torch.tensor([2, 3]))
+    assert masked_reduce.masked_max(x).tolist() == [3, 7]
+    assert masked_reduce.masked_min(x).tolist() == [1, -2]
+
+
+def test_empty_sequence():
+    x = PaddedBatch(torch.randn(2, 4, 3), torch.tensor([0, 2]))
+    assert torch.isnan(masked_reduce.masked_mean(x)[0]).all()
+    assert torch.isneginf(masked_reduce.masked_max(x)[0]).all()
+    assert masked_reduce.strided_select(x, 2).seq_lens.tolist() == [0, 1]
+
+
+def test_mean_gradient():
+    x = get_batch()
+    x.payload.requires_grad_(True)
+    masked_reduce.masked_mean(x).sum().backward()
+    torch.testing.assert_close(x.payload.grad[:, :, 0], x.seq_len_mask.float() / x.seq_lens[:, None])
+
+
+def test_flatten_valid():
+    x = get_batch(H=())
+    expected = torch.cat([e[:l] for e, l in zip(x.payload, x.seq_lens)])
+    torch.testing.assert_close(masked_reduce.flatten_valid(x), expected)
+    torch.testing.assert_close(FlattenHead()(x), expected)
+
+
+def skip_step_indexes(seq_lens, max_len, s):
+    """Indexes of previous loop implementation of `SkipStepEncoder`"""
+    indexes = []
+    for l in seq_lens:
+        idx_to_take = np.arange(min(l - 1, s - 1 + l % s), l, s)
+        indexes.append(np.concatenate([[-1], idx_to_take]) + 1)
+    return indexes
+
+
+@pytest.mark.parametrize('step_size', [1, 2, 3, 4])
+def test_skip_step_encoder_same_as_loop(step_size):
+    x = PaddedBatch(torch.randn(8, 11, 2), torch.tensor([10, 9, 8, 7, 3, 2, 1, 0]))
+    out = SkipStepEncoder(step_size)(x)
+    assert out.payload.size() == (8, 1 + 10 // step_size, 2)
+    for i, idx in enumerate(skip_step_indexes(x.seq_lens.tolist(), 10, step_size)):
+        if x.seq_lens[i] > 0:
+            torch.testing.assert_close(out.payload[i, :len(idx)], x.payload[i, idx])
+    assert out.seq_lens.tolist() == [min(1, l // step_size) for l in x.seq_lens.tolist()]
+
+
+def test_mean_heads():
+    x = get_batch()
+    expected = torch.stack([e[:l].mean(dim=0) for e, l in zip(x.payload, x.seq_lens)])
+    torch.testing.assert_close(MeanStepEncoder()(x), expected)
+
+    head = torch.nn.Linear(3, 2)
+    expected = torch.stack([e[:l].mean() for e, l in zip(head(x.payload), x.seq_lens)])
+    torch.testing.assert_close(AllStepsMeanHead(head)(x), expected)
+
+
+def test_last_max_avg_encoder():
+    x = get_batch()
+    expected = torch.stack([torch.cat([e[l - 1], e[:l].max(dim=0).values, e[:l].mean(dim=0)])
+                            for e, l in zip(x.payload, x.seq_lens)])
+    torch.testing.assert_close(LastMaxAvgEncoder(use_seq_lens=True)(x), expected)
@@ -1,3 +1,4 @@
+import pytest
 import torch
 from pyhocon import ConfigFactory
 
@@ -50,3 +51,46 @@ def test_model():
     model = AggFeatureSeqEncoder(**get_conf())
     out = model(get_data())
     assert out.size() == (3, 24)
+
+
+def get_random_data(B=16, T=50, size=20):
+    # padding isn't zero, statistics should be the same anyway
+    seq_lens = torch.randint(1, T + 1, (B,))
+    return PaddedBatch(
+        payload={
+            'cat1': torch.randint(0, size + 5, (B, T)),
+            'cat2': torch.randint(1, 4, (B, T)),
+            'num1': torch.randn(B, T),
+            'num2': torch.rand(B, T) * 5,
+        },
+        length=seq_lens,
+    )
+
+
+@pytest.mark.parametrize('params', [
+    dict(),
+    dict(is_used_min=True, is_used_max=True, use_topk_cnt=2),
+    dict(was_logified=True, log_scale_factor=0.5, logify_sum_mean_seqlens=True),
+    dict(distribution_target_task=True, is_used_count=False),
+])
+def test_scatter_same_as_ohe(params):
+    conf = dict(
+        numeric_values={'num1': 'identity', 'num2': {'was_logified': True}, '#ones': {}},
+        embeddings={'cat1': {'in': 20}, 'cat2': {'in': 4}},
+        was_logified=False,
+    )
+    conf.update(params)
+    x = get_random_data()
+    out_ohe = AggFeatureSeqEncoder(**conf, engine='ohe')(x)
+    out_scatter = AggFeatureSeqEncoder(**conf, engine='scatter')(x)
+    assert out_scatter.size() == out_ohe.size()
+    assert out_scatter.size(1) == AggFeatureSeqEncoder(**conf).embedding_size
+    torch.testing.assert_close(out_scatter, out_ohe, rtol=1e-4, atol=1e-4)
+
+
+def test_scatter_loads_ohe_state_dict():
+    model_ohe = AggFeatureSeqEncoder(**get_conf(), engine='ohe')
+    model = AggFeatureSeqEncoder(**get_conf())
+    assert len(model.state_dict()) == 0
+    model.load_state_dict(model_ohe.state_dict())
+    torch.testing.assert_close(model(get_data()), model_ohe(get_data()))
@@ -79,3 +79,50 @@ def test_last_step():
 
     h = model(x)
     assert h.shape == (4, 6)
+
+
+def test_packed_same_as_padded():
+    torch.manual_seed(42)
+    model = RnnEncoder(
+        input_size=5,
+        hidden_size=6,
+        is_reduce_sequence=False,
+    )
+    x = get_data()
+    out_padded = model(x).payload
+    model.packed = True
+    out_packed = model(x).payload
+
+    mask = x.seq_len_mask.bool()
+    torch.testing.assert_close(out_packed[mask], out_padded[mask])
+    assert (out_packed[~mask] == 0).all()
+
+
+def test_packed_last_step():
+    torch.manual_seed(42)
+    model = RnnEncoder(
+        input_size=5,
+        hidden_size=6,
+        type='lstm',
+        is_reduce_sequence=True,
+        packed=True,
+    )
+    x = get_data()
+    h = model(x)
+    model.is_reduce_sequence = False
+    out = model(x).payload
+    torch.testing.assert_close(h, out[torch.arange(4), x.seq_lens - 1])
+
+
+def test_packed_last_max_avg():
+    model = RnnEncoder(
+        input_size=5,
+        hidden_size=6,
+        bidir=True,
+        is_reduce_sequence=True,
+        reducer='last_max_avg',
+        packed=True,
+    )
+    x = get_data()
+    h = model(x)
+    assert h.shape == (4, 36)
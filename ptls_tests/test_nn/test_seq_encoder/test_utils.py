@@ -1,9 +1,11 @@
+import numpy as np
 import pytest
 import torch
 from omegaconf import OmegaConf
 
 from ptls.nn.seq_encoder.rnn_encoder import RnnEncoder
-from ptls.nn.seq_encoder.utils import PerTransHead, scoring_head
+from ptls.nn.seq_encoder.utils import PerTransHead, scoring_head, get_distributions, get_distributions_masked, \
+    transform_inv, transform_inv_torch
 from ptls.data_load.padded_batch import PaddedBatch
 
 
@@ -413,3 +415,37 @@ def test_rnn_iterative_with_starter():
 
     out_b_merged = out_2.payload[GRP_A_CLIENT_COUNT:]
     assert ((out_b.payload - out_b_merged).abs() < 1e-4).all()
+
+
+@pytest.mark.parametrize('take_first_fraction', [0, 0.3])
+def test_get_distributions_masked(take_first_fraction):
+    B, T = 20, 15
+    seq_lens = torch.randint(1, T + 1, (B,))
+    seq_lens[0] = 3
+    # padding is not zero, it should be ignored
+    tr_types = torch.randint(0, 10, (B, T))
+    tr_amounts = torch.randn(B, T) * 3
+    tr_amounts[0, :3] = 1.0  # no negative values
+    negative_items = [1, 2, 3, 4, 5, 6]
+    positive_items = [6, 3, 7, 8]  # 6 and 3 are counted as negative
+
+    np_data = np.empty((B, 2), dtype=object)
+    for i, l in enumerate(seq_lens.tolist()):
+        np_data[i, 0], np_data[i, 1] = tr_types[i, :l].numpy(), tr_amounts[i, :l].numpy()
+    expected = get_distributions(np_data, 1, 0, negative_items, positive_items, 5, take_first_fraction, transform_inv)
+    out = get_distributions_masked(tr_types, tr_amounts, seq_lens, negative_items, positive_items, 5,
+                                   take_first_fraction, transform_inv_torch)
+
+    for o, e in zip(out, expected):
+        torch.testing.assert_close(o, torch.tensor(np.array(e, dtype=np.float32)), rtol=1e-4, atol=1e-5)
+    assert out[2].size() == (B, 6)
+    assert out[3].size() == (B, 5)
+
+
+def test_get_distributions_masked_grad():
+    tr_amounts = torch.randn(4, 6, requires_grad=True)
+    out = get_distributions_masked(torch.randint(0, 5, (4, 6)), tr_amounts, torch.tensor([6, 2, 4, 1]),
+                                   [1, 2], [3, 4], 5, 0, transform_inv_torch)
+    (out[0].sum() + out[1].sum()).backward()
+    assert tr_amounts.grad[1, 2:].abs().sum() == 0
+    assert tr_amounts.grad[0].abs().sum() > 0
@@ -0,0 +1,99 @@
+import pytest
+import torch
+
+from ptls.data_load.padded_batch import PaddedBatch
+from ptls.nn.trx_encoder import TrxEncoder
+from ptls.nn.trx_encoder.fused_embedding import FusedNoisyEmbedding
+
+
+def get_params(n_features=5, **params):
+    return dict(
+        embeddings={f'cat_{i}': {'in': 5 + i * 3, 'out': 2 + i % 3} for i in range(n_features)},
+        numeric_values={'amount': 'log'},
+        **params,
+    )
+
+
+def get_batch(n_features=5, B=4, T=12, high=30):
+    payload = {f'cat_{i}': torch.randint(0, high, (B, T)) for i in range(n_features)}
+    payload['amount'] = torch.randn(B, T)
+    return PaddedBatch(payload, torch.randint(1, T, (B,)))
+
+
+def test_fused_same_as_per_table():
+    te = TrxEncoder(**get_params(orthogonal_init=True)).eval()
+    te_fused = TrxEncoder(**get_params(fused_embeddings=True)).eval()
+    te_fused.load_state_dict(te.state_dict())
+    assert isinstance(te_fused.embeddings, FusedNoisyEmbedding)
+    assert te_fused.output_size == te.output_size
+    assert te_fused.category_max_size == te.category_max_size
+    assert te_fused.category_names == te.category_names
+
+    x = get_batch()
+    torch.testing.assert_close(te_fused(x).payload, te(x).payload)
+
+
+def test_state_dict_compatible():
+    te = TrxEncoder(**get_params())
+    te_fused = TrxEncoder(**get_params(fused_embeddings=True))
+    assert te_fused.state_dict().keys() == te.state_dict().keys()
+
+    te_fused.load_state_dict(te.state_dict())
+    for name, table in te_fused.embeddings.items():
+        torch.testing.assert_close(table.weight, te.embeddings[name].weight)
+
+    te2 = TrxEncoder(**get_params())
+    te2.load_state_dict(te_fused.state_dict())
+    x = get_batch()
+    torch.testing.assert_close(te2.eval()(x).payload, te_fused.eval()(x).payload)
+
+
+def test_state_dict_shape_mismatch():
+    te = TrxEncoder(**get_params(n_features=2))
+    te_fused = TrxEncoder(embeddings={'cat_0': {'in': 7, 'out': 2}, 'cat_1': {'in': 8, 'out': 3}},
+                          numeric_values={'amount': 'log'}, fused_embeddings=True)
+    with pytest.raises(RuntimeError):
+        te_fused.load_state_dict(te.state_dict())
+
+
+def test_out_of_index_assert():
+    te = TrxEncoder(**get_params(fused_embeddings=True, out_of_index='assert'))
+    with pytest.raises(IndexError, match='cat_0'):
+        te(get_batch(high=30))
+    te(get_batch(high=5))
+
+
+def test_padding_gradient():
+    te = TrxEncoder(**get_params(fused_embeddings=True))
+    x = get_batch()
+    x.payload['cat_1'][:, :3] = 0
+    te(x).payload.sum().backward()
+    grad = te.embeddings.weight.grad
+    offset = te.embeddings.table_offsets['cat_1']
+    assert (grad[offset] == 0).all()
+    assert (grad[0] == 0).all()
+    assert te.embeddings['cat_1'].weight[0].abs().sum() == 0
+
+
+def test_noise_and_dropout():
+    te = TrxEncoder(**get_params(fused_embeddings=True, embeddings_noise=0.1, emb_dropout=0.5))
+    x = get_batch()
+    te.train()
+    assert not torch.equal(te(x).payload, te(x).payload)
+    te.eval()
+    assert torch.equal(te(x).payload, te(x).payload)
+
+
+def test_spatial_dropout():
+    te = TrxEncoder(**get_params(fused_embeddings=True, emb_dropout=0.5, spatial_dropout=True)).train()
+    x = get_batch(T=200)
+    for i in range(5):
+        x.payload[f'cat_{i}'] = torch.randint(1, 3, (4, 200))
+    out = te(x).payload[:, :, :te.embedding_size]
+    nonzero = torch.count_nonzero(out, dim=1)
+    assert torch.all((nonzero == 200) + (nonzero == 0)).item()
+
+
+def test_no_embeddings():
+    te = TrxEncoder(numeric_values={'amount': 'log'}, fused_embeddings=True)
+    assert te(get_batch()).payload.size() == (4, 12, 1)
@@ -1,9 +1,11 @@
+import numpy as np
 import pytest
 import torch
 
 from ptls.data_load import PaddedBatch
+from ptls.nn.trx_encoder.encoders import BaseEncoder, IdentityEncoder, flat_to_padded
 from ptls.nn.trx_encoder.scalers import IdentityScaler
-from ptls.nn.trx_encoder.trx_encoder_base import TrxEncoderBase
+from ptls.nn.trx_encoder.trx_encoder_base import TrxEncoderBase, flatten_seq_feature
 
 
 def test_get_category_indexes_clip():
@@ -154,3 +156,62 @@ def test_category_max_size():
     assert category_max_size['mcc'] == 4
     assert category_max_size['currency'] == 5
 
+
+
+class RowLinearEncoder(BaseEncoder):
+    """Per-row embedder, default `forward_batch` is used"""
+    def __init__(self, col_name=None):
+        super().__init__(col_name)
+        self.linear = torch.nn.Linear(3, 2)
+
+    def forward(self, x):
+        return self.linear(torch.as_tensor(x).float())
+
+    @property
+    def output_size(self):
+        return 2
+
+
+class BatchedLinearEncoder(RowLinearEncoder):
+    def forward_batch(self, values, offsets, max_len):
+        return flat_to_padded(self(values), offsets, max_len)
+
+
+def test_custom_embeddings_batched_same_as_per_row():
+    row_encoder = RowLinearEncoder()
+    batched_encoder = BatchedLinearEncoder()
+    batched_encoder.load_state_dict(row_encoder.state_dict())
+    x = PaddedBatch({'vec': torch.randn(3, 6, 3)}, torch.tensor([6, 2, 4]))
+
+    out_row = TrxEncoderBase(custom_embeddings={'vec': row_encoder}).get_custom_embeddings(x, 'vec')
+    out_batched = TrxEncoderBase(custom_embeddings={'vec': batched_encoder}).get_custom_embeddings(x, 'vec')
+    assert out_batched.size() == (3, 6, 2)
+    torch.testing.assert_close(out_row, out_batched)
+    torch.testing.assert_close(out_batched[0], row_encoder(x.payload['vec'][0]))
+    assert (out_batched[1, 2:] == 0).all()
+
+
+def test_custom_embeddings_identity_encoder():
+    v = torch.randn(3, 6, 4)
+    x = PaddedBatch({'vec': v}, torch.tensor([6, 2, 4]))
+    out = TrxEncoderBase(custom_embeddings={'vec': IdentityEncoder(4)}).get_custom_embeddings(x, 'vec')
+    torch.testing.assert_close(out, v)
+
+    values, offsets, max_len = flatten_seq_feature(v, x.seq_lens)
+    out = IdentityEncoder(4).forward_batch(values, offsets, max_len)
+    mask = (torch.arange(6).unsqueeze(0) < x.seq_lens.unsqueeze(1)).float()
+    torch.testing.assert_close(out, v * mask.unsqueeze(2))
+
+
+def test_custom_embeddings_list_of_arrays():
+    rows = [np.random.randn(n, 3).astype(np.float32) for n in (5, 2, 3)]
+    x = PaddedBatch({'vec': rows}, torch.tensor([5, 2, 3]))
+    out = TrxEncoderBase(custom_embeddings={'vec': IdentityEncoder(3)}).get_custom_embeddings(x, 'vec')
+    assert out.size() == (3, 5, 3)
+    for i, row in enumerate(rows):
+        np.testing.assert_allclose(out[i, :len(row)].numpy(), row)
+
+    values, offsets, max_len = flatten_seq_feature(rows, x.seq_lens)
+    assert values.shape == (10, 3)
+    assert offsets.tolist() == [0, 5, 7, 10]
+    assert max_len == 5
@@ -41,3 +41,57 @@ def test_group_with_target():
     torch.testing.assert_close(rec['event_time'], torch.LongTensor([-1, 0, 1, 3]))
     torch.testing.assert_close(rec['mcc'], torch.LongTensor([5, 3, 4, 6]))
     assert rec['target'] == 15
+
+
+def test_group_chunks(data):
+    expected = UserGroupTransformer(col_name_original='user_id').fit_transform(data).to_dict(orient='records')
+    records = UserGroupTransformer(col_name_original='user_id', chunk_size=2, return_records=True).fit_transform(data)
+    assert len(records) == len(expected)
+    for rec, exp in zip(records, expected):
+        assert rec['user_id'] == exp['user_id']
+        torch.testing.assert_close(rec['mcc'], exp['mcc'])
+        torch.testing.assert_close(rec['amount'], exp['amount'])
+
+
+def test_group_to_flat_array_and_parquet(data, tmp_path):
+    from ptls.data_load.datasets import FlatArrayDataset, ParquetDataset
+
+    t = UserGroupTransformer(col_name_original='user_id', chunk_size=2)
+    t.transform_to_flat_array(data, str(tmp_path / 'flat'))
+    t.transform_to_parquet(data, str(tmp_path / 'data.parquet'))
+
+    flat_records = [rec for rec in FlatArrayDataset(str(tmp_path / 'flat'))]
+    parquet_records = list(ParquetDataset([str(tmp_path / 'data.parquet')]))
+    for records in (flat_records, parquet_records):
+        assert [rec['user_id'] for rec in records] == [0, 1, 2]
+        torch.testing.assert_close(records[1]['mcc'], torch.LongTensor([3, 4, 5, 6]))
+        torch.testing.assert_close(records[1]['amount'], torch.DoubleTensor([13, 14, 15, 16]))
+
+
+def test_group_input_chunks(data, tmp_path):
+    from ptls.data_load.datasets import ParquetDataset
+
+    t = UserGroupTransformer(col_name_original='user_id', chunk_size=2)
+    expected = t.transform(data).to_dict(orient='records')
+    # user 1 is split between chunks
+    chunks = [data.iloc[0:5], data.iloc[5:6], data.iloc[6:9]]
+    records = t.transform(iter(chunks)).to_dict(orient='records')
+    assert [rec['user_id'] for rec in records] == [0, 1, 2]
+    for rec, exp in zip(records, expected):
+        torch.testing.assert_close(rec['mcc'], exp['mcc'])
+        torch.testing.assert_close(rec['amount'], exp['amount'])
+
+    t.transform_to_parquet(iter(chunks), str(tmp_path / 'data.parquet'))
+    parquet_records = list(ParquetDataset([str(tmp_path / 'data.parquet')]))
+    torch.testing.assert_close(parquet_records[1]['mcc'], torch.LongTensor([3, 4, 5, 6]))
+
+
+def test_group_input_chunks_not_consecutive(data):
+    t = UserGroupTransformer(col_name_original='user_id')
+    with pytest.raises(ValueError):
+        t.transform([data.iloc[0:2], data.iloc[3:5], data.iloc[2:3]])
+
+
+def test_n_jobs_deprecated():
+    with pytest.warns(DeprecationWarning):
+        UserGroupTransformer(col_name_original='user_id', n_jobs=4)
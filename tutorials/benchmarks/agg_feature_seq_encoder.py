@@ -0,0 +1,86 @@
+"""Time and memory of `AggFeatureSeqEncoder` with one hot ('ohe') and scatter ('scatter') engines.
+
+Synthetic batch with one large categorical feature (like mcc) and one small, two numerical features.
+Peak memory is measured with CUDA allocator stats on GPU and with tensor sizes of one hot product on CPU.
+
+Usage:
+    python tutorials/benchmarks/agg_feature_seq_encoder.py --device cpu --batch_size 64 --max_len 1000 --n_categories 2000
+"""
+import argparse
+import time
+
+import torch
+
+from ptls.data_load.padded_batch import PaddedBatch
+from ptls.nn.seq_encoder.agg_feature_seq_encoder import AggFeatureSeqEncoder
+
+
+def gen_batch(batch_size, max_len, n_categories, device):
+    seq_lens = torch.randint(max_len // 2, max_len + 1, (batch_size,))
+    seq_lens[0] = max_len
+    return PaddedBatch(
+        payload={
+            'mcc_code': torch.randint(0, n_categories, (batch_size, max_len), device=device),
+            'tr_type': torch.randint(0, 50, (batch_size, max_len), device=device),
+            'amount': torch.randn(batch_size, max_len, device=device),
+            'balance': torch.randn(batch_size, max_len, device=device),
+        },
+        length=seq_lens.to(device),
+    )
+
+
+def run(model, x, n_repeats):
+    device = x.device
+    with torch.no_grad():
+        out = model(x)  # warmup
+        if device.type == 'cuda':
+            torch.cuda.synchronize()
+            torch.cuda.reset_peak_memory_stats()
+        t = time.perf_counter()
+        for _ in range(n_repeats):
+            model(x)
+        if device.type == 'cuda':
+            torch.cuda.synchronize()
+    peak = torch.cuda.max_memory_allocated() if device.type == 'cuda' else None
+    return out, (time.perf_counter() - t) / n_repeats, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--device', default='cpu')
+    parser.add_argument('--batch_size', type=int, default=64)
+    parser.add_argument('--max_len', type=int, default=1000)
+    parser.add_argument('--n_categories', type=int, default=2000)
+    parser.add_argument('--n_repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    device = torch.device(args.device)
+    x = gen_batch(args.batch_size, args.max_len, args.n_categories, device)
+    params = dict(
+        embeddings={'mcc_code': {'in': args.n_categories}, 'tr_type': {'in': 50}},
+        numeric_values={'amount': 'identity', 'balance': 'identity'},
+        was_logified=False,
+        is_used_min=True,
+        is_used_max=True,
+        use_topk_cnt=3,
+    )
+    # one hot product of size (B, T, n_categories) is allocated several times per numerical feature
+    ohe_tensor_mb = args.batch_size * args.max_len * args.n_categories * 4 / 2 ** 20
+    print(f'B={args.batch_size}, T={args.max_len}, categories={args.n_categories}, '
+          f'one (B, T, categories) tensor is {ohe_tensor_mb:.0f} MB')
+
+    outputs = {}
+    print(f'{"engine":>8} {"time, ms":>9} {"peak memory, MB":>16}')
+    for engine in ['ohe', 'scatter']:
+        model = AggFeatureSeqEncoder(**params, engine=engine).to(device)
+        out, t, peak = run(model, x, args.n_repeats)
+        outputs[engine] = out
+        peak = f'{peak / 2 ** 20:16.0f}' if peak is not None else f'{"n/a":>16}'
+        print(f'{engine:>8} {t * 1000:9.1f} {peak}')
+
+    max_diff = (outputs['ohe'] - outputs['scatter']).abs().div(outputs['ohe'].abs() + 1).max().item()
+    print(f'max relative difference: {max_diff:.2e}')
+
+
+if __name__ == '__main__':
+    main()
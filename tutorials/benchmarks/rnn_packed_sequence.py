@@ -0,0 +1,84 @@
+"""Throughput of `RnnEncoder` with padded and packed execution.
+
+Synthetic batches with different sequence length distributions are encoded by the same model
+in padded (`packed=False`) and packed (`packed=True`) mode.
+
+Usage:
+    python tutorials/benchmarks/rnn_packed_sequence.py --device cpu --batch_size 64 --max_len 1000
+"""
+import argparse
+import time
+
+import numpy as np
+import torch
+
+from ptls.data_load.padded_batch import PaddedBatch
+from ptls.nn.seq_encoder.rnn_encoder import RnnEncoder
+
+
+def gen_seq_lens(distribution, batch_size, max_len, rs):
+    if distribution == 'uniform':
+        seq_lens = rs.randint(1, max_len + 1, batch_size)
+    elif distribution == 'lognormal':
+        seq_lens = rs.lognormal(mean=np.log(max_len) - 3, sigma=1.0, size=batch_size)
+    elif distribution == 'one_long':
+        seq_lens = rs.randint(1, max_len // 20 + 1, batch_size)
+        seq_lens[0] = max_len
+    elif distribution == 'full':
+        seq_lens = np.full(batch_size, max_len)
+    else:
+        raise AttributeError(f'Unknown distribution "{distribution}"')
+    seq_lens = np.clip(seq_lens, 1, max_len).astype(np.int64)
+    seq_lens[0] = max_len
+    return torch.from_numpy(seq_lens)
+
+
+def run(model, x, n_repeats):
+    with torch.no_grad():
+        model(x)  # warmup
+        if x.device.type == 'cuda':
+            torch.cuda.synchronize()
+        t = time.perf_counter()
+        for _ in range(n_repeats):
+            model(x)
+        if x.device.type == 'cuda':
+            torch.cuda.synchronize()
+    return (time.perf_counter() - t) / n_repeats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--device', default='cpu')
+    parser.add_argument('--batch_size', type=int, default=64)
+    parser.add_argument('--max_len', type=int, default=1000)
+    parser.add_argument('--input_size', type=int, default=64)
+    parser.add_argument('--hidden_size', type=int, default=256)
+    parser.add_argument('--type', default='gru')
+    parser.add_argument('--reducer', default='last_step')
+    parser.add_argument('--n_repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    rs = np.random.RandomState(42)
+    model = RnnEncoder(input_size=args.input_size, hidden_size=args.hidden_size, type=args.type,
+                       is_reduce_sequence=True, reducer=args.reducer).to(args.device).eval()
+
+    print(f'{"distribution":>12} {"fill rate":>9} {"padded, ms":>11} {"packed, ms":>11} {"speedup":>8}')
+    for distribution in ['full', 'uniform', 'lognormal', 'one_long']:
+        seq_lens = gen_seq_lens(distribution, args.batch_size, args.max_len, rs)
+        x = PaddedBatch(torch.randn(args.batch_size, args.max_len, args.input_size, device=args.device),
+                        seq_lens.to(args.device))
+
+        model.packed = False
+        model.reducer = model.get_reducer
+        t_padded = run(model, x, args.n_repeats)
+        model.packed = True
+        model.reducer = model.get_reducer
+        t_packed = run(model, x, args.n_repeats)
+
+        fill_rate = seq_lens.sum().item() / (args.batch_size * args.max_len)
+        print(f'{distribution:>12} {fill_rate:9.3f} {t_padded * 1000:11.1f} {t_packed * 1000:11.1f} '
+              f'{t_padded / t_packed:8.2f}')
+
+
+if __name__ == '__main__':
+    main()